@@ -0,0 +1,185 @@
+import time
+from collections import deque
+import numpy as np
+
+# Controle adaptativo em malha fechada: a cada janela mede vazão, latência ponta a ponta
+# e a ocupação das threads de inferência e de render, e mexe em um botão por vez
+# (imgsz, passo de frames, taxa de render) para segurar o FPS alvo.
+
+# Degraus de imgsz (múltiplos de 32, exigência do YOLO)
+IMGSZ_STEPS = [192, 224, 256, 288, 320, 384, 416, 480, 512, 576, 640]
+
+# Ocupação (fração do tempo da janela) a partir da qual a thread é o gargalo
+BUSY_UTIL = 0.85
+
+
+class AdaptiveController:
+    """
+    Segura `target_fps` por fluxo dentro dos limites dados.
+
+    Degrada quando a vazão fica abaixo do alvo (ou a latência passa do limite) com a
+    thread gargalo ocupada, por `down_patience` janelas seguidas: render mais espaçado
+    se o gargalo é o render; senão imgsz menor e, no mínimo, passo de frames maior.
+
+    Melhora na ordem inversa só quando o modelo de custo prevê folga depois da mudança
+    (ocupação prevista <= `up_util`, ou vazão prevista acima do alvo + histerese) por
+    `up_patience` janelas e passou o `cooldown` desde a última decisão. A diferença entre
+    os limiares de subir e descer é a histerese que evita oscilação.
+    """
+
+    def __init__(self, engines, target_fps, imgsz=None, min_imgsz=256, max_imgsz=None, resizable=True,
+                 max_stride=3, render_every=1, max_render_every=4, max_latency_ms=None, interval=1.0,
+                 hysteresis=0.1, up_util=0.7, down_patience=2, up_patience=5, cooldown=3.0, log=print):
+        self.engines = engines
+        self.target_fps = target_fps
+        self.interval = interval
+        self.hysteresis = hysteresis
+        self.up_util = up_util
+        self.down_patience = down_patience
+        self.up_patience = up_patience
+        self.cooldown = cooldown
+        self.max_latency_ms = max_latency_ms or 3000.0 / target_fps
+        self.log = log
+
+        # imgsz None = nativo do modelo (640); exportação estática não pode mudar
+        start = imgsz or 640
+        self.resizable = resizable
+        max_imgsz = max_imgsz or start
+        self.imgsz_steps = sorted({s for s in IMGSZ_STEPS if min_imgsz <= s <= max_imgsz} | {start}) if resizable else [start]
+        self.imgsz = start
+        self.stride = 1
+        self.max_stride = max_stride
+        # render_every 0 = render desligado pelo usuário: o controle não mexe
+        self.render_every = render_every
+        self.max_render_every = max(max_render_every, render_every)
+
+        self._prev = None
+        self._latencies = deque(maxlen=2048)
+        self._down = 0
+        self._up = 0
+        self._last_change = time.monotonic()
+        self.changes = 0
+        self.last_decision = None
+        self.window = {}
+        self._apply()
+
+    def _apply(self):
+        for engine in self.engines:
+            if self.resizable:
+                engine.imgsz = self.imgsz
+            engine.frame_stride = self.stride
+
+    def observe(self, latency_s):
+        """ Latência ponta a ponta de um pacote (captura -> render), chamada a cada frame """
+        self._latencies.append(latency_s * 1000)
+
+    def update(self, now, frames, drops, infer_busy_s, render_busy_s, n_streams=1):
+        """
+        Contadores acumulados do pipeline (frames entregues ao render, descartes, tempo
+        ocupado das threads). Fecha uma janela a cada `interval` s e decide; True se mudou algo.
+        """
+        sample = (now, frames, drops, infer_busy_s, render_busy_s)
+        if self._prev is None:
+            self._prev = sample
+            return False
+        dt = now - self._prev[0]
+        if dt < self.interval:
+            return False
+        _, frames0, drops0, infer0, render0 = self._prev
+        self._prev = sample
+
+        latencies = np.asarray(self._latencies, dtype=np.float64)
+        self._latencies.clear()
+        w = {
+            "fps": (frames - frames0) / dt / max(n_streams, 1),
+            "drops": drops - drops0,
+            "infer_util": (infer_busy_s - infer0) / dt,
+            "render_util": (render_busy_s - render0) / dt,
+            "latency_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        }
+        self.window = w
+        return self._decide(w, time.monotonic())
+
+    def _decide(self, w, now):
+        busy = max(w["infer_util"], w["render_util"]) >= BUSY_UTIL
+        slow = w["fps"] < self.target_fps * (1 - self.hysteresis)
+        late = w["latency_ms"] > self.max_latency_ms
+        if busy and (slow or late or w["drops"] > 0):
+            self._up = 0
+            self._down += 1
+            if self._down >= self.down_patience:
+                self._down = 0
+                return self._degrade(w, "latência" if late and not slow else "fps")
+            return False
+
+        self._down = 0
+        step = self._upgrade_candidate(w)
+        if step is None:
+            self._up = 0
+            return False
+        self._up += 1
+        if self._up >= self.up_patience and now - self._last_change >= self.cooldown:
+            self._up = 0
+            knob, value, reason = step
+            return self._change(knob, value, reason)
+        return False
+
+    def _degrade(self, w, cause):
+        reason = (f"{cause}: {w['fps']:.1f}/{self.target_fps:g} fps, latência {w['latency_ms']:.0f} ms, "
+                  f"descartes {w['drops']}, ocupação inferência {w['infer_util']:.0%} render {w['render_util']:.0%}")
+        if w["render_util"] >= w["infer_util"] and 0 < self.render_every < self.max_render_every:
+            return self._change("render_every", self.render_every + 1, reason)
+        i = self.imgsz_steps.index(self.imgsz)
+        if i > 0:
+            return self._change("imgsz", self.imgsz_steps[i - 1], reason)
+        if self.stride < self.max_stride:
+            return self._change("stride", self.stride + 1, reason)
+        if 0 < self.render_every < self.max_render_every:
+            return self._change("render_every", self.render_every + 1, reason)
+        if self.last_decision != "limite":
+            self.log(f"[ADAPTATIVO] no limite (imgsz {self.imgsz}, passo {self.stride}, render 1/{self.render_every}) e ainda abaixo do alvo: {reason}")
+            self.last_decision = "limite"
+        return False
+
+    def _upgrade_candidate(self, w):
+        """ Próximo passo para cima e se o custo previsto cabe: (botão, valor, motivo) ou None """
+        if self.stride > 1:
+            knob, value, factor, util = "stride", self.stride - 1, self.stride / (self.stride - 1), w["infer_util"]
+        elif self.imgsz != self.imgsz_steps[-1]:
+            value = self.imgsz_steps[self.imgsz_steps.index(self.imgsz) + 1]
+            # Custo da inferência ~ número de pixels
+            knob, factor, util = "imgsz", (value / self.imgsz) ** 2, w["infer_util"]
+        elif self.render_every > 1:
+            knob, value, factor, util = "render_every", self.render_every - 1, self.render_every / (self.render_every - 1), w["render_util"]
+        else:
+            return None
+
+        predicted_util = util * factor
+        # Pipeline saturado (vídeo sem descarte): a vazão cai na proporção do custo
+        predicted_fps = w["fps"] / factor if util >= BUSY_UTIL else w["fps"]
+        if predicted_util <= self.up_util or (util >= BUSY_UTIL and predicted_fps >= self.target_fps * (1 + self.hysteresis)):
+            reason = (f"folga: {w['fps']:.1f}/{self.target_fps:g} fps, ocupação {util:.0%} -> prevista {predicted_util:.0%}")
+            return knob, value, reason
+        return None
+
+    def _change(self, knob, value, reason):
+        old = getattr(self, knob)
+        setattr(self, knob, value)
+        self._apply()
+        self._last_change = time.monotonic()
+        self.changes += 1
+        self.last_decision = f"{knob} {old}->{value}"
+        self.log(f"[ADAPTATIVO] {self.last_decision} ({reason})")
+        return True
+
+    def snapshot(self):
+        """ Ponto de operação atual + última janela medida (vai para o estado publicado) """
+        return {
+            "imgsz": self.imgsz,
+            "stride": self.stride,
+            "render_every": self.render_every,
+            "target_fps": self.target_fps,
+            "changes": self.changes,
+            "last_decision": self.last_decision,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.window.items()},
+        }
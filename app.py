@@ -1,10 +1,17 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+import asyncio
+import json
 import subprocess
 import os
 import sys
+import time
+import threading
+from typing import Optional
+import cv2
+from shared_frames import FrameRingReader, DEFAULT_SHM_NAME
 
 app = FastAPI(title="Vision System Dashboard")
 
@@ -21,14 +28,60 @@ class StartConfig(BaseModel):
     source: str = "0"
     model: str = "best_seg.pt"
     conf: float = 0.65
+    headless: bool = False
+    # In-process worker: the model stays loaded between start/stop (see vision_worker.py)
+    worker: bool = False
+    # Evidence clips (main.py only): off | count | manual
+    evidence: str = "off"
+
+class WorkerParams(BaseModel):
+    conf: Optional[float] = None
+    source: Optional[str] = None
 
 # Keep track of processes (simple implementation)
 processes = {}
 
+# Resident vision worker, created on first use (importing it pulls in torch/ultralytics)
+_vision_worker = None
+_vision_worker_lock = threading.Lock()
+
+def get_vision_worker(create=True):
+    global _vision_worker
+    with _vision_worker_lock:
+        if _vision_worker is None and create:
+            from vision_worker import VisionWorker
+            _vision_worker = VisionWorker()
+        return _vision_worker
+
+def worker_running():
+    worker = get_vision_worker(create=False)
+    return worker is not None and worker.running
+
+# main.py exits cleanly when this file shows up (see --stop-file)
+STOP_FILE = os.path.join("state", "parar_main")
+STOP_GRACE_S = 15.0
+
 @app.post("/api/start-system")
 def start_system(config: StartConfig):
-    """Launches the main vision system (main.py)"""
+    """Launches the main vision system (main.py, or the resident worker when config.worker is set)"""
+    if config.worker:
+        if "system" in processes and processes["system"].poll() is None:
+            return {"status": "error", "message": "System already running"}
+        try:
+            # First start loads and warms the model; later starts only open the source
+            get_vision_worker().start(config.source, conf=config.conf, model_name=config.model)
+            return {"status": "success", "message": "System started (resident worker)", "pid": os.getpid()}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
     cmd = [sys.executable, "main.py", "--source", config.source, "--model", config.model, "--conf", str(config.conf)]
+    if config.headless:
+        # No window: frames and counters are published in shared memory (see /api/live-state)
+        cmd += ["--headless", "--shm-name", DEFAULT_SHM_NAME]
+    if config.evidence != "off":
+        cmd += ["--evidence", config.evidence, "--evidence-dir", EVIDENCE_DIR]
+    # Graceful stop on every platform (terminate() on Windows skips main.py's cleanup)
+    cmd += ["--stop-file", STOP_FILE]
     # Use Popen to run in background
     # Note: On Windows with shell=True/False depending on how we want the window to appear
     # We want a NEW window for the vision system usually, but subprocess might hide it by default.
@@ -36,10 +89,12 @@ def start_system(config: StartConfig):
     # usually spawns a console window if python is used.
     
     # Let's try direct execution. If it blocks or hides window, we might need creationflags.
-    if "system" in processes and processes["system"].poll() is None:
+    if ("system" in processes and processes["system"].poll() is None) or worker_running():
         return {"status": "error", "message": "System already running"}
 
     try:
+        if os.path.exists(STOP_FILE):
+            os.remove(STOP_FILE)  # left over from a previous run
         # start_new_session=True helps detach it somewhat
         proc = subprocess.Popen(cmd, cwd=os.getcwd()) 
         processes["system"] = proc
@@ -47,6 +102,502 @@ def start_system(config: StartConfig):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.post("/api/stop-system")
+def stop_system():
+    """Stops the vision system started by /api/start-system"""
+    if worker_running():
+        # The model stays loaded for the next start
+        get_vision_worker().stop()
+        return {"status": "success", "message": "System stopped"}
+
+    proc = processes.get("system")
+    if proc is None or proc.poll() is not None:
+        return {"status": "error", "message": "System not running"}
+
+    # Ask main.py to stop through the stop file so the checkpoint, the journal and open clips
+    # are flushed; terminate/kill only if it does not exit in time
+    os.makedirs(os.path.dirname(STOP_FILE), exist_ok=True)
+    with open(STOP_FILE, "w") as f:
+        f.write(str(proc.pid))
+    try:
+        proc.wait(timeout=STOP_GRACE_S)
+    except subprocess.TimeoutExpired:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if os.path.exists(STOP_FILE):
+        os.remove(STOP_FILE)
+    return {"status": "success", "message": "System stopped"}
+
+@app.post("/api/system/params")
+def update_system_params(params: WorkerParams):
+    """Changes conf/source of the resident worker without reloading the model"""
+    if not worker_running():
+        return {"status": "error", "message": "Resident worker not running"}
+    try:
+        get_vision_worker().update(conf=params.conf, source=params.source)
+        return {"status": "success", "worker": get_vision_worker().status()}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.post("/api/system/reload-model")
+def reload_model():
+    """Reloads the model file in the background; frames keep flowing with the old model until the swap"""
+    worker = get_vision_worker(create=False)
+    if worker is None or worker.model is None:
+        return {"status": "error", "message": "No model loaded in the resident worker"}
+    worker.reload_async()
+    return {"status": "success", "message": "Model reload started"}
+
+@app.get("/api/system/worker")
+def worker_status():
+    worker = get_vision_worker(create=False)
+    if worker is None:
+        return {"status": "idle"}
+    return {"status": "running" if worker.running else "idle", **worker.status()}
+
+@app.on_event("shutdown")
+def shutdown_worker():
+    worker = get_vision_worker(create=False)
+    if worker is not None:
+        worker.shutdown()
+
+# Shared-memory reader for the headless vision process (attached lazily)
+_frame_reader = None
+
+def get_frame_reader():
+    global _frame_reader
+    if _frame_reader is not None and _frame_reader.closed:
+        _frame_reader.close()
+        _frame_reader = None
+    if _frame_reader is None:
+        _frame_reader = FrameRingReader.attach(DEFAULT_SHM_NAME)
+    return _frame_reader
+
+@app.get("/api/live-state")
+def live_state():
+    """Latest counters and timings published by main.py --headless"""
+    reader = get_frame_reader()
+    if reader is None:
+        return {"status": "offline"}
+    state = reader.read_state()
+    if state is None:
+        return {"status": "starting"}
+    return {"status": "running", **state}
+
+# --- Live metrics: main.py publishes its state in shared memory, one hub fans it out ---
+
+MAX_STREAMS = 8          # multi-source runs publish visioncount_frames_0 .. _7
+HUB_POLL_S = 0.05        # shared-memory poll period (new state detected by sequence number)
+HUB_DISCOVERY_S = 1.0    # how often streams that are not attached yet are looked up
+HUB_STALE_S = 5.0        # a stream without new state for this long is detached (killed process)
+HUB_HEARTBEAT_S = 1.0    # an event goes out at least this often (process status, offline streams)
+CLIENT_BUFFER = 4        # events buffered per browser before the oldest one is dropped
+DEFAULT_EVENT_HZ = 5
+MAX_EVENT_HZ = 20
+
+def stream_shm_names():
+    return [DEFAULT_SHM_NAME] + [f"{DEFAULT_SHM_NAME}_{i}" for i in range(MAX_STREAMS)]
+
+class LiveHub:
+    """
+    Reads the state of every running stream once per poll and fans it out to all
+    connected browsers. Each client gets a small bounded queue: a slow client loses
+    its oldest events instead of growing memory. Polling only runs while someone listens.
+    """
+
+    def __init__(self):
+        self.readers = {}
+        self.seqs = {}
+        self.states = {}
+        self.last_change = {}
+        self.subscribers = set()
+        self._task = None
+        self._last_discovery = 0.0
+
+    def _detach(self, name):
+        self.readers.pop(name).close()
+        for table in (self.seqs, self.states, self.last_change):
+            table.pop(name, None)
+
+    def refresh(self):
+        """Polls every stream; returns True if anything changed"""
+        now = time.monotonic()
+        changed = False
+        for name, reader in list(self.readers.items()):
+            if reader.closed or now - self.last_change.get(name, now) > HUB_STALE_S:
+                self._detach(name)
+                changed = True
+        if now - self._last_discovery >= HUB_DISCOVERY_S:
+            self._last_discovery = now
+            for name in stream_shm_names():
+                if name not in self.readers:
+                    reader = FrameRingReader.attach(name)
+                    if reader is not None:
+                        self.readers[name] = reader
+                        self.last_change[name] = now
+        for name, reader in self.readers.items():
+            seq = reader.state_seq
+            if seq == self.seqs.get(name):
+                continue
+            state = reader.read_state()
+            if state is not None:
+                self.states[name] = state
+                self.seqs[name] = seq
+                self.last_change[name] = now
+                changed = True
+        return changed
+
+    def snapshot(self):
+        return {"time": time.time(), "processes": process_status(), "streams": dict(self.states)}
+
+    def publish(self, data):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def run(self):
+        last_sent = 0.0
+        try:
+            while self.subscribers:
+                now = time.monotonic()
+                if self.refresh() or now - last_sent >= HUB_HEARTBEAT_S:
+                    # Encoded once, shared by every client
+                    self.publish(json.dumps(self.snapshot(), separators=(",", ":")))
+                    last_sent = now
+                await asyncio.sleep(HUB_POLL_S)
+        finally:
+            self._task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=CLIENT_BUFFER)
+        self.subscribers.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+live_hub = LiveHub()
+
+@app.get("/api/live-events")
+async def live_events(hz: float = DEFAULT_EVENT_HZ):
+    """Server-Sent Events with counters and pipeline metrics, at most `hz` events per second"""
+    interval = 1.0 / min(max(hz, 0.2), MAX_EVENT_HZ)
+    queue = live_hub.subscribe()
+
+    async def events():
+        try:
+            while True:
+                data = await queue.get()
+                # Rate limit: whatever piled up during the interval collapses into the newest event
+                while not queue.empty():
+                    data = queue.get_nowait()
+                yield f"data: {data}\n\n"
+                await asyncio.sleep(interval)
+        finally:
+            live_hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Live view: annotated frames published by main.py / the worker, JPEG-encoded once for every viewer ---
+
+LIVE_VIEW_FPS = 10        # default viewer frame rate, independent of the inference rate
+LIVE_VIEW_MAX_FPS = 25
+LIVE_VIEW_WIDTH = 960     # frames wider than this are downscaled before encoding
+LIVE_VIEW_QUALITY = 70
+
+class FrameHub:
+    """
+    Live view of one stream. While someone watches, the newest frame is downscaled and
+    JPEG-encoded once per tick (at the fastest rate any viewer asked for) and shared by
+    all viewers. Each viewer keeps only the latest JPEG: a slow client skips frames
+    instead of buffering them, so ten viewers cost one encode plus ten socket writes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.reader = None
+        self.seq = 0
+        self.last_frame = 0.0
+        self.subscribers = {}
+        self.encoded = 0
+        self.encode_ms = 0.0
+        self._task = None
+
+    def _grab(self):
+        """Runs in a worker thread: newest frame as a downscaled JPEG, or None if there is nothing new"""
+        now = time.monotonic()
+        if self.reader is not None and (self.reader.closed or now - self.last_frame > HUB_STALE_S):
+            # Closed or killed writer: attach again (a restarted process creates a new block)
+            self.reader.close()
+            self.reader = None
+        if self.reader is None:
+            self.reader = FrameRingReader.attach(self.name)
+            self.last_frame = now
+            if self.reader is None:
+                return None
+        if self.reader.slots == 0 or self.reader.frame_seq == self.seq:
+            return None
+        view = self.reader.latest_frame()
+        if view is None:
+            return None
+        t0 = time.perf_counter()
+        img = view.array
+        height, width = img.shape[:2]
+        if width > LIVE_VIEW_WIDTH:
+            img = cv2.resize(img, (LIVE_VIEW_WIDTH, round(height * LIVE_VIEW_WIDTH / width)), interpolation=cv2.INTER_AREA)
+        else:
+            img = img.copy()
+        if not view.valid():
+            return None
+        ok, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, LIVE_VIEW_QUALITY])
+        if not ok:
+            return None
+        self.seq = view.frame_seq
+        self.last_frame = now
+        self.encoded += 1
+        self.encode_ms = (time.perf_counter() - t0) * 1000
+        return jpeg.tobytes()
+
+    def publish(self, jpeg):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(jpeg)
+
+    async def run(self):
+        try:
+            while self.subscribers:
+                t0 = time.monotonic()
+                # Resize + encode off the event loop
+                jpeg = await asyncio.to_thread(self._grab)
+                if jpeg is not None:
+                    self.publish(jpeg)
+                interval = 1.0 / max(self.subscribers.values(), default=LIVE_VIEW_FPS)
+                await asyncio.sleep(max(interval - (time.monotonic() - t0), HUB_POLL_S / 5))
+        finally:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            self._task = None
+
+    def subscribe(self, fps):
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers[queue] = fps
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.pop(queue, None)
+
+frame_hubs = {}
+
+@app.get("/api/live-view")
+async def live_view(stream: str = DEFAULT_SHM_NAME, fps: float = LIVE_VIEW_FPS):
+    """MJPEG of the annotated frames (usable as an <img> src), at most `fps` frames per second"""
+    if stream not in stream_shm_names():
+        return {"status": "error", "message": "Unknown stream"}
+    fps = min(max(fps, 0.5), LIVE_VIEW_MAX_FPS)
+    hub = frame_hubs.setdefault(stream, FrameHub(stream))
+    queue = hub.subscribe(fps)
+
+    async def frames():
+        try:
+            while True:
+                jpeg = await queue.get()
+                yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode()
+                       + b"\r\n\r\n" + jpeg + b"\r\n")
+                # Rate limit: frames encoded meanwhile collapse into the newest one
+                await asyncio.sleep(1.0 / fps)
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(frames(), media_type="multipart/x-mixed-replace; boundary=frame",
+                             headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"})
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+def prometheus_text(streams, processes, now, views=None):
+    """Prometheus text exposition format (0.0.4) for the published stream states"""
+    families = {}
+
+    def sample(name, kind, help_text, labels, value):
+        family = families.setdefault(name, (kind, help_text, []))
+        family[2].append(f"{name}{_prom_labels(labels)} {value}")
+
+    for name, hub in (views or {}).items():
+        stream = {"stream": name}
+        sample("visioncount_live_view_clients", "gauge", "Browsers watching the live view", stream, len(hub.subscribers))
+        sample("visioncount_live_view_encoded_total", "counter", "Live view frames encoded (once for all viewers)",
+               stream, hub.encoded)
+        sample("visioncount_live_view_encode_ms", "gauge", "Last live view resize + JPEG encode time", stream,
+               round(hub.encode_ms, 3))
+
+    for process, status in processes.items():
+        sample("visioncount_process_running", "gauge", "Child process started by the dashboard is running",
+               {"process": process}, int(status == "running"))
+    for name, state in streams.items():
+        stream = {"stream": name}
+        sample("visioncount_stream_up", "gauge", "Stream is publishing state",
+               {**stream, "source": state.get("source", "")}, 1)
+        sample("visioncount_state_age_seconds", "gauge", "Seconds since the frame behind the last published state was captured",
+               stream, round(max(now - state.get("timestamp", now), 0.0), 3))
+        sample("visioncount_fps", "gauge", "Displayed frames per second", stream, round(state.get("fps", 0.0), 3))
+        sample("visioncount_infer_fps", "gauge", "Inference results per second", stream, round(state.get("infer_fps", 0.0), 3))
+        for stage in state.get("stages", []):
+            labels = {**stream, "stage": stage["stage"]}
+            sample("visioncount_stage_latency_ms", "gauge", "Average time per item in a pipeline stage", labels, round(stage["avg_ms"], 3))
+            sample("visioncount_stage_queue_depth", "gauge", "Items waiting in the stage input queue", labels, stage["queue_depth"])
+            sample("visioncount_stage_processed_total", "counter", "Items processed by the stage", labels, stage["processed"])
+            sample("visioncount_stage_dropped_total", "counter", "Items dropped before the stage", labels, stage["dropped"])
+        for step, ms in (state.get("engine_ms") or {}).items():
+            sample("visioncount_engine_step_ms", "gauge", "Last duration of an inference engine step",
+                   {**stream, "step": step}, round(ms, 3))
+        tracks = state.get("tracks") or {}
+        sample("visioncount_tracks_live", "gauge", "Active tracks", stream, tracks.get("live", 0))
+        sample("visioncount_tracks_evicted_total", "counter", "Tracks expired by TTL", stream, tracks.get("evicted", 0))
+        for class_name, count in (state.get("counters") or {}).items():
+            sample("visioncount_objects_counted_total", "counter", "Objects counted per class",
+                   {**stream, "class": class_name}, count)
+        gate = state.get("gate")
+        if gate:
+            sample("visioncount_gate_skip_ratio", "gauge", "Fraction of frames skipped by the motion gate",
+                   stream, round(gate["skip_ratio"], 4))
+        adaptive = state.get("adaptive")
+        if adaptive:
+            sample("visioncount_adaptive_target_fps", "gauge", "Frame rate the adaptive controller is holding",
+                   stream, adaptive["target_fps"])
+            sample("visioncount_adaptive_imgsz", "gauge", "Inference image size chosen by the adaptive controller",
+                   stream, adaptive["imgsz"])
+            sample("visioncount_adaptive_stride", "gauge", "Run inference on 1 of every N frames (adaptive controller)",
+                   stream, adaptive["stride"])
+            sample("visioncount_adaptive_render_every", "gauge", "Render 1 of every N frames (adaptive controller)",
+                   stream, adaptive["render_every"])
+            sample("visioncount_adaptive_changes_total", "counter", "Operating point changes made by the adaptive controller",
+                   stream, adaptive["changes"])
+        evidence = state.get("evidence")
+        if evidence:
+            sample("visioncount_evidence_buffer_bytes", "gauge", "RAM held by the pre-event JPEG ring buffer",
+                   stream, evidence["buffer_bytes"])
+            sample("visioncount_evidence_buffer_seconds", "gauge", "Seconds of footage in the pre-event ring buffer",
+                   stream, evidence["buffer_seconds"])
+            sample("visioncount_evidence_encode_backlog", "gauge", "Evidence clips waiting for the video encoder",
+                   stream, evidence["encode_backlog"])
+            sample("visioncount_evidence_open_clips", "gauge", "Evidence clips still collecting post-event frames",
+                   stream, evidence["open_clips"])
+            sample("visioncount_evidence_clips_written_total", "counter", "Evidence clips written to disk",
+                   stream, evidence["clips_written"])
+            sample("visioncount_evidence_clips_dropped_total", "counter", "Evidence clips dropped because the encoder backlog was full",
+                   stream, evidence["clips_dropped"])
+            sample("visioncount_evidence_frames_dropped_total", "counter", "Frames that did not make it into the ring buffer",
+                   stream, evidence["frames_dropped"])
+            sample("visioncount_evidence_disk_bytes", "gauge", "Disk used by evidence clips (after quota eviction)",
+                   stream, evidence["disk_bytes"])
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    # async: runs on the event loop, same thread as the hub task
+    live_hub.refresh()
+    return PlainTextResponse(prometheus_text(live_hub.states, process_status(), time.time(), frame_hubs),
+                             media_type="text/plain; version=0.0.4")
+
+# --- Count history: every count is journaled to SQLite by main.py / the worker (see event_journal.py) ---
+
+JOURNAL_PATH = os.path.join("state", "eventos.sqlite")
+MAX_HISTORY_EVENTS = 1000
+
+def history_window(since, until, default_s):
+    until = until if until is not None else time.time()
+    return (since if since is not None else until - default_s), until
+
+@app.get("/api/history/hourly")
+def history_hourly(since: Optional[float] = None, until: Optional[float] = None, source: Optional[str] = None):
+    """Counts per hour, source and class (epoch seconds; default: last 24 h)"""
+    from event_journal import open_reader, hourly_counts
+    since, until = history_window(since, until, 24 * 3600)
+    conn = open_reader(JOURNAL_PATH)
+    if conn is None:
+        return {"since": since, "until": until, "rows": []}
+    try:
+        rows = [dict(r) for r in hourly_counts(conn, since, until, source)]
+    finally:
+        conn.close()
+    return {"since": since, "until": until, "rows": rows}
+
+@app.get("/api/history/shifts")
+def history_shifts(since: Optional[float] = None, until: Optional[float] = None, source: Optional[str] = None):
+    """Counts per shift and class (shifts from counting.yaml; default: last 7 days)"""
+    from event_journal import open_reader, shift_counts, load_shifts
+    since, until = history_window(since, until, 7 * 24 * 3600)
+    conn = open_reader(JOURNAL_PATH)
+    if conn is None:
+        return {"since": since, "until": until, "shifts": []}
+    try:
+        shifts = shift_counts(conn, since, until, load_shifts(), source)
+    finally:
+        conn.close()
+    return {"since": since, "until": until, "shifts": shifts}
+
+@app.get("/api/history/events")
+def history_events(limit: int = 100, source: Optional[str] = None):
+    """Most recent individual counts"""
+    from event_journal import open_reader, recent_events
+    conn = open_reader(JOURNAL_PATH)
+    if conn is None:
+        return {"events": []}
+    try:
+        events = [dict(r) for r in recent_events(conn, max(1, min(limit, MAX_HISTORY_EVENTS)), source)]
+    finally:
+        conn.close()
+    return {"events": events}
+
+# --- Evidence clips: main.py --evidence keeps a pre-event buffer and writes clips (see evidence.py) ---
+
+EVIDENCE_DIR = os.path.join("state", "evidencias")
+
+class ClipRequest(BaseModel):
+    source: Optional[str] = None
+    label: str = "manual"
+
+@app.post("/api/evidence/clip")
+def request_evidence_clip(request: ClipRequest):
+    """Asks the running main.py to save a clip around now (picked up within half a second)"""
+    from evidence import request_clip
+    return {"status": "success", "request": request_clip(EVIDENCE_DIR, request.source, request.label)}
+
+@app.get("/api/evidence")
+def evidence_clips(limit: int = 50):
+    """Saved clips, newest first"""
+    from evidence import list_clips
+    return {"clips": list_clips(EVIDENCE_DIR, max(1, limit))}
+
+@app.get("/api/evidence/{name}")
+def evidence_clip(name: str):
+    path = os.path.join(EVIDENCE_DIR, os.path.basename(name))
+    if not name.endswith(".mp4") or not os.path.isfile(path):
+        return {"status": "error", "message": "Clip not found"}
+    return FileResponse(path, media_type="video/mp4")
+
 @app.post("/api/capture")
 def start_capture():
     """Launches the capture tool (capture_data.py)"""
@@ -101,16 +652,22 @@ def start_training():
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-@app.get("/api/status")
-def get_status():
+def process_status():
     status = {}
     for name, proc in processes.items():
         if proc.poll() is None:
             status[name] = "running"
         else:
             status[name] = "stopped"
+    worker = get_vision_worker(create=False)
+    if worker is not None and status.get("system") != "running":
+        status["system"] = "running" if worker.running else "stopped"
     return status
 
+@app.get("/api/status")
+def get_status():
+    return process_status()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
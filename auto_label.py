@@ -1,59 +1,194 @@
 import cv2
 import os
-import glob
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from json2yolo import AUTO_LABEL_KEY, shapes_digest
+from dataset_manifest import DatasetManifest, UNLABELED, SOURCE_AUTO
 
-def auto_label():
-    img_dir = "dataset"
-    images = glob.glob(os.path.join(img_dir, "*.jpg"))
-    
-    print(f"Encontradas {len(images)} imagens.")
-    
-    for img_path in images:
-        img = cv2.imread(img_path)
-        h, w = img.shape[:2]
-        
-        # Converte para cinza e aplica blur/threshold
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        blurred = cv2.GaussianBlur(gray, (7, 7), 0)
-        
-        # Tenta detectar bordas/objetos
-        # Método Otsu é bom para separar fundo de objeto se houver contraste
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        # Encontra contornos
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if not contours:
-            print(f"Aviso: Nenhum objeto detectado em {img_path}")
+# Pré-rotulagem: gera Labelme JSON (polígonos) para as imagens ainda sem rótulo,
+# para alguém revisar no Labelme. Os .txt do YOLO continuam vindo só do json2yolo.py.
+
+LABELME_VERSION = "5.11.1"
+
+
+def labelme_shape(label, points):
+    return {
+        "label": label,
+        "points": [[float(x), float(y)] for x, y in points],
+        "group_id": None,
+        "description": "",
+        "shape_type": "polygon",
+        "flags": {},
+        "mask": None,
+    }
+
+
+def write_labelme(img_path, shapes, width, height):
+    """
+    JSON ao lado da imagem, gravado de forma atômica (um Ctrl+C não deixa arquivo pela metade).
+    Leva a marca de pré-rotulagem: o json2yolo só converte depois que alguém editar no Labelme.
+    """
+    data = {
+        "version": LABELME_VERSION,
+        "flags": {},
+        "shapes": shapes,
+        "imagePath": os.path.basename(img_path),
+        "imageData": None,
+        "imageHeight": int(height),
+        "imageWidth": int(width),
+        AUTO_LABEL_KEY: {"shapes_sha1": shapes_digest(shapes)},
+    }
+    json_path = os.path.splitext(img_path)[0] + ".json"
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, json_path)
+
+
+def simplify_polygon(points, epsilon):
+    """ approxPolyDP com tolerância proporcional ao perímetro; None se sobrar menos de 3 pontos """
+    contour = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    if len(contour) < 3:
+        return None
+    approx = cv2.approxPolyDP(contour, epsilon * cv2.arcLength(contour, True), True).reshape(-1, 2)
+    return approx if len(approx) >= 3 else None
+
+
+def find_unlabeled(manifest, overwrite=False):
+    """
+    Imagens sem .json segundo o manifesto (retomada: o que já foi rotulado fica como está).
+    `overwrite` refaz também as pré-rotulagens ainda não revisadas; rótulo manual nunca é sobrescrito.
+    """
+    images = manifest.names()
+    pending = manifest.names(status=UNLABELED)
+    if overwrite:
+        pending = sorted(pending + manifest.names(source=SOURCE_AUTO))
+    return [os.path.join(manifest.dataset_dir, n) for n in pending], len(images) - len(pending)
+
+
+def decoded_batches(paths, batch_size, workers):
+    """ Lotes de (caminho, imagem) decodificados em threads; o próximo lote é lido enquanto o atual é inferido """
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        future = [pool.submit(cv2.imread, p) for p in batches[0]] if batches else []
+        for i, batch in enumerate(batches):
+            images = [f.result() for f in future]
+            if i + 1 < len(batches):
+                future = [pool.submit(cv2.imread, p) for p in batches[i + 1]]
+            yield [(p, img) for p, img in zip(batch, images) if img is not None]
+
+
+def label_with_model(args, pending, manifest):
+    from ultralytics import YOLO
+
+    model = YOLO(args.model, task="segment")
+    stats = {"labeled": 0, "empty": 0, "shapes": 0}
+    for batch in decoded_batches(pending, args.batch, args.workers):
+        if not batch:
             continue
-            
-        # Pega o maior contorno (assumindo que é a peça)
-        c = max(contours, key=cv2.contourArea)
-        
-        # Pega o bounding box
-        x, y, bw, bh = cv2.boundingRect(c)
-        
-        # Filtro simples: se for muito pequeno (ruído) ou muito grande (toda a tela), ignora
-        if cv2.contourArea(c) < 1000 or (bw * bh) > (w * h * 0.95):
-            # Se falhar, usa um box central como fallback
-            cx, cy = w / 2, h / 2
-            bw, bh = w * 0.4, h * 0.4
-            x, y = cx - bw/2, cy - bh/2
-        
-        # Converte para formato YOLO (normalizado 0-1 e centro x,y)
-        # class x_center y_center width height
-        cx = (x + bw / 2) / w
-        cy = (y + bh / 2) / h
-        nw = bw / w
-        nh = bh / h
-        
-        # Salva o arquivo .txt com o mesmo nome da imagem
-        txt_path = img_path.replace(".jpg", ".txt")
-        with open(txt_path, "w") as f:
-            f.write(f"0 {cx:.6f} {cy:.6f} {nw:.6f} {nh:.6f}\n")
-            
-        print(f"Gerado label para {os.path.basename(img_path)}")
+        kwargs = {"conf": args.conf, "verbose": False}
+        if args.imgsz:
+            kwargs["imgsz"] = args.imgsz
+        results = model.predict([img for _, img in batch], **kwargs)
+        for (img_path, img), result in zip(batch, results):
+            shapes = []
+            if result.masks is not None:
+                names = result.names
+                for cls, polygon in zip(result.boxes.cls.cpu().numpy().astype(int), result.masks.xy):
+                    points = simplify_polygon(polygon, args.epsilon)
+                    if points is not None and cv2.contourArea(points.astype(np.float32)) >= args.min_area:
+                        shapes.append(labelme_shape(names[int(cls)], points))
+            if not shapes:
+                # Sem JSON: um arquivo vazio viraria "fundo" no treino sem ninguém ter olhado
+                stats["empty"] += 1
+                continue
+            h, w = img.shape[:2]
+            write_labelme(img_path, shapes, w, h)
+            manifest.mark_labeled(img_path, SOURCE_AUTO)
+            stats["labeled"] += 1
+            stats["shapes"] += len(shapes)
+        print(f"  {stats['labeled'] + stats['empty']}/{len(pending)} imagens", end="\r")
+    print()
+    return stats
+
+
+def label_with_otsu(args, pending, manifest):
+    """ Método legado (Otsu + maior contorno), agora como polígono no Labelme JSON """
+    stats = {"labeled": 0, "empty": 0, "shapes": 0}
+    for batch in decoded_batches(pending, args.batch, args.workers):
+        for img_path, img in batch:
+            h, w = img.shape[:2]
+
+            # Converte para cinza e aplica blur/threshold
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            blurred = cv2.GaussianBlur(gray, (7, 7), 0)
+
+            # Método Otsu é bom para separar fundo de objeto se houver contraste
+            _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+            shapes = []
+            if contours:
+                # Pega o maior contorno (assumindo que é a peça)
+                c = max(contours, key=cv2.contourArea)
+                _, _, bw, bh = cv2.boundingRect(c)
+                # Filtro simples: muito pequeno (ruído) ou muito grande (toda a tela) fica sem rótulo
+                if cv2.contourArea(c) >= max(args.min_area, 1000) and (bw * bh) <= (w * h * 0.95):
+                    points = simplify_polygon(c.reshape(-1, 2), args.epsilon)
+                    if points is not None:
+                        shapes.append(labelme_shape(args.label, points))
+            if not shapes:
+                print(f"Aviso: Nenhum objeto detectado em {img_path} (sem JSON)")
+                stats["empty"] += 1
+                continue
+            write_labelme(img_path, shapes, w, h)
+            manifest.mark_labeled(img_path, SOURCE_AUTO)
+            stats["labeled"] += 1
+            stats["shapes"] += len(shapes)
+    return stats
+
+
+def auto_label():
+    parser = argparse.ArgumentParser(description="Pré-rotulagem em lote: gera Labelme JSON para revisão")
+    parser.add_argument("--source", type=str, default="dataset", help="Pasta com as imagens")
+    parser.add_argument("--mode", type=str, default="model", choices=["model", "otsu"], help="model: segmentação do modelo treinado | otsu: método legado")
+    parser.add_argument("--model", type=str, default="best_seg.pt", help="Modelo de segmentação (.pt ou .onnx)")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confiança mínima para virar polígono")
+    parser.add_argument("--imgsz", type=int, default=None, help="Resolução de inferência")
+    parser.add_argument("--batch", type=int, default=16, help="Imagens por chamada do modelo")
+    parser.add_argument("--workers", type=int, default=4, help="Threads de leitura das imagens")
+    parser.add_argument("--epsilon", type=float, default=0.005, help="Simplificação do polígono (fração do perímetro)")
+    parser.add_argument("--min-area", type=float, default=100, help="Área mínima do polígono (px²)")
+    parser.add_argument("--label", type=str, default="peca", help="Classe usada no modo otsu")
+    parser.add_argument("--overwrite", action="store_true", help="Refaz também as pré-rotulagens não revisadas (JSON editado no Labelme fica)")
+    args = parser.parse_args()
+
+    manifest = DatasetManifest(args.source)
+    manifest.sync()
+    pending, already = find_unlabeled(manifest, args.overwrite)
+    print(f"Encontradas {len(pending) + already} imagens: {already} já rotuladas, {len(pending)} para pré-rotular.")
+    if not pending:
+        manifest.close()
+        return
+
+    if args.mode == "model" and not os.path.exists(args.model):
+        # Primeiro ciclo (ainda sem modelo treinado): cai no método legado
+        print(f"Modelo {args.model} não encontrado; usando o modo otsu.")
+        args.mode = "otsu"
+
+    t0 = time.perf_counter()
+    with manifest:
+        stats = label_with_model(args, pending, manifest) if args.mode == "model" else label_with_otsu(args, pending, manifest)
+    elapsed = time.perf_counter() - t0
+    done = stats["labeled"] + stats["empty"]
+    print(f"Pré-rotulagem: {stats['labeled']} imagens, {stats['shapes']} polígonos, {stats['empty']} sem objeto (sem JSON) "
+          f"em {elapsed:.1f}s ({done / elapsed if elapsed > 0 else 0:.1f} img/s)")
+    print("Revise no Labelme: só os JSON corrigidos no Labelme entram no treino do json2yolo.py/train_wrapper.py "
+          "(--include-auto usa as pré-rotulagens sem revisão).")
+
 
 if __name__ == "__main__":
     auto_label()
@@ -0,0 +1,301 @@
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+
+from main import (add_engine_args, build_engine, warm_up, probe_hardware, hardware_key, AUTOTUNE_PATH)
+from benchmark import ReplaySource, replay, summarize, variant
+from json2yolo import file_hash
+
+# Autotune: mede nesta máquina cada combinação backend x imgsz x threads no replay de
+# um vídeo separado (held-out), confere contagem e mAP contra a referência (PyTorch no
+# imgsz de referência) e grava em state/autotune.json a mais rápida que respeita o piso
+# de precisão. O main.py carrega essa configuração sozinho.
+
+BACKENDS = ["pytorch", "onnx", "openvino", "int8"]
+DEFAULT_SIZES = [256, 320, 416, 480, 640]
+
+# Exportações e modelos quantizados ficam fora da pasta do modelo de produção
+WORK_DIR = os.path.join("state", "autotune")
+
+
+def has_module(name):
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def available_backends(device):
+    """ Backends instalados para este device (sem instalar nada) """
+    backends = ["pytorch"]
+    if has_module("onnx") and has_module("onnxruntime"):
+        backends.append("onnx")
+        if device == "cpu" and has_module("onnxruntime.quantization"):
+            backends.append("int8")
+    if device == "cpu" and has_module("openvino"):
+        backends.append("openvino")
+    return backends
+
+
+def default_threads():
+    """ 1, metade e todos os núcleos """
+    n = os.cpu_count() or 1
+    return sorted({1, max(1, n // 2), n})
+
+
+def letterbox(img, size):
+    """ Mesmo pré-processamento do YOLO para entrada quadrada: escala, centraliza, cinza 114 """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas
+
+
+def calibration_tensors(images, size):
+    """ Imagens do dataset já no formato de entrada do ONNX: (1, 3, size, size) float32 RGB 0-1 """
+    for path in images:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        x = letterbox(img, size)[:, :, ::-1].transpose(2, 0, 1)
+        yield np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0
+
+
+def export_static(pt_path, fmt, imgsz):
+    """
+    Exporta o modelo com entrada fixa em `imgsz` dentro de WORK_DIR (reaproveita a
+    exportação se ela for mais nova que o .pt). Retorna o caminho do artefato.
+    """
+    from ultralytics import YOLO
+
+    os.makedirs(WORK_DIR, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pt_path))[0]
+    suffix = ".onnx" if fmt == "onnx" else "_openvino_model"
+    target = os.path.join(WORK_DIR, f"{stem}_{imgsz}{suffix}")
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(pt_path):
+        return target
+
+    # A exportação grava ao lado do .pt: usa uma cópia em WORK_DIR para não tocar o best_seg.onnx de produção
+    work_pt = os.path.join(WORK_DIR, stem + ".pt")
+    if not os.path.exists(work_pt) or os.path.getmtime(work_pt) < os.path.getmtime(pt_path):
+        shutil.copy2(pt_path, work_pt)
+    exported = YOLO(work_pt).export(format=fmt, imgsz=imgsz, dynamic=False, verbose=False)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(exported, target)
+    return target
+
+
+def quantize_int8(onnx_path, imgsz, images, calib_size):
+    """ INT8 estático (QDQ) do ONNX, calibrado com imagens do dataset na mesma letterbox do YOLO """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    target = os.path.splitext(onnx_path)[0] + "_int8.onnx"
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(onnx_path):
+        return target
+    if not images:
+        raise RuntimeError("Sem imagens para calibrar o INT8")
+
+    input_name = onnx.load(onnx_path, load_external_data=False).graph.input[0].name
+    sample = images[:: max(1, len(images) // calib_size)][:calib_size]
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = ({input_name: x} for x in calibration_tensors(sample, imgsz))
+
+        def get_next(self):
+            return next(self._it, None)
+
+    quantize_static(onnx_path, target, Reader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    # O ultralytics lê classes/stride/task dos metadados do ONNX: copia do original
+    src = onnx.load(onnx_path, load_external_data=False)
+    dst = onnx.load(target)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, target)
+    return target
+
+
+def build_artifact(args, backend, imgsz, calib_images):
+    if backend == "pytorch":
+        return args.model
+    if backend == "openvino":
+        return export_static(args.model, "openvino", imgsz)
+    onnx_path = export_static(args.model, "onnx", imgsz)
+    if backend == "int8":
+        return quantize_int8(onnx_path, imgsz, calib_images, args.calib_size)
+    return onnx_path
+
+
+def run_candidate(args, path, device, imgsz, threads):
+    """ Replay completo (infer + track + count, sem render) com um artefato. Retorna métricas e contagens. """
+    import torch
+    from ultralytics import YOLO
+
+    prev_threads = torch.get_num_threads()
+    if threads:
+        torch.set_num_threads(threads)
+    try:
+        model = YOLO(path, task="segment")
+        if device != "cpu" and path.endswith(".pt"):
+            model.to(device)
+        source = ReplaySource(args.source)
+        run_args = variant(args, imgsz=imgsz, motion_gate=False)
+        engine = build_engine(run_args, model, device, device == "cpu", args.source, frame_rate=source.frame_rate)
+        warm_up(model, imgsz, masks=run_args.masks)
+        samples, frames, wall = replay(engine, source, args.frames, render=False)
+        source.release()
+    finally:
+        torch.set_num_threads(prev_threads)
+    infer = summarize(samples["infer"])
+    return {
+        "frames": frames,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "infer_p50_ms": infer.get("p50", 0.0),
+        "infer_p95_ms": infer.get("p95", 0.0),
+        "counts": dict(engine.counters),
+    }
+
+
+def measure_map(path, imgsz, data, device):
+    """ mAP50 (máscaras) no split de validação completo do dataset """
+    from ultralytics import YOLO
+
+    metrics = YOLO(path, task="segment").val(data=data, imgsz=imgsz, batch=1, device=device, plots=False, verbose=False)
+    return float(metrics.seg.map50)
+
+
+def count_error(counts, reference):
+    """ Diferença de contagem por classe somada, relativa ao total da referência """
+    diff = sum(abs(counts.get(k, 0) - reference.get(k, 0)) for k in set(counts) | set(reference))
+    return diff / max(sum(reference.values()), 1)
+
+
+def model_signature(path):
+    st = os.stat(path)
+    return {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": file_hash(path)}
+
+
+def print_table(candidates, best):
+    print(f"\n{'backend':<9} {'imgsz':>5} {'thr':>4} {'p50 ms':>8} {'fps':>7} {'erro cont.':>10} {'mAP50':>7}  status")
+    for c in sorted(candidates, key=lambda c: (c.get("infer_p50_ms") or float("inf"))):
+        if "error" in c:
+            print(f"{c['backend']:<9} {c['imgsz']:>5} {'-':>4} {'-':>8} {'-':>7} {'-':>10} {'-':>7}  ERRO: {c['error']}")
+            continue
+        mark = " <- escolhido" if c is best else ""
+        map50 = f"{c['map50']:.3f}" if c.get("map50") is not None else "-"
+        print(f"{c['backend']:<9} {c['imgsz']:>5} {c.get('threads') or 'auto':>4} {c['infer_p50_ms']:>8.1f} {c['fps']:>7.1f} "
+              f"{c['count_error']:>10.1%} {map50:>7}  {'ok' if c['passes'] else 'abaixo do piso'}{mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede backends/imgsz/threads nesta máquina e grava a melhor configuração para o main.py")
+    parser.add_argument("--source", type=str, required=True, help="Vídeo (ou pasta/glob de .jpg) separado do treino para o replay")
+    add_engine_args(parser)
+    parser.add_argument("--frames", type=int, default=300, help="Frames do replay por candidato")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Valores de imgsz testados")
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="Threads do PyTorch testadas (padrão: 1, metade, todos)")
+    parser.add_argument("--backends", type=str, nargs="+", default=BACKENDS, choices=BACKENDS, help="Backends testados (os não instalados são pulados)")
+    parser.add_argument("--ref-imgsz", type=int, default=640, help="imgsz da referência PyTorch (contagem e mAP)")
+    parser.add_argument("--data", type=str, default=os.path.join("dataset", "data_full.yaml"), help="YAML com o split de validação completo para o mAP")
+    parser.add_argument("--no-map", action="store_true", help="Não mede mAP (só a contagem no replay)")
+    parser.add_argument("--max-count-error", type=float, default=0.02, help="Diferença máxima de contagem contra a referência (fração)")
+    parser.add_argument("--min-map-ratio", type=float, default=0.97, help="mAP50 mínimo como fração do mAP50 da referência")
+    parser.add_argument("--calib-images", type=str, default="dataset", help="Pasta com imagens para calibrar o INT8")
+    parser.add_argument("--calib-size", type=int, default=100, help="Imagens usadas na calibração do INT8")
+    parser.add_argument("--output", type=str, default=AUTOTUNE_PATH, help="Arquivo lido pelo main.py")
+    args = parser.parse_args()
+
+    if not args.model.endswith(".pt"):
+        parser.error("--model precisa ser o .pt (os outros formatos são exportados a partir dele)")
+    hardware = probe_hardware(use_cache=False)
+    device = "cuda:0" if hardware["cuda"] else "cpu"
+    backends = [b for b in args.backends if b in available_backends(device)]
+    skipped = [b for b in args.backends if b not in backends]
+    print(f"Device: {device} | backends: {', '.join(backends)}" + (f" | não disponíveis: {', '.join(skipped)}" if skipped else ""))
+    # Threads só valem para o PyTorch em CPU; ONNX Runtime/OpenVINO usam o padrão do próprio runtime
+    threads = (args.threads or default_threads()) if device == "cpu" else [None]
+    use_map = not args.no_map and os.path.exists(args.data)
+    if not args.no_map and not use_map:
+        print(f"{args.data} não encontrado: sem mAP, o piso de precisão usa só a contagem")
+    calib_images = sorted(glob.glob(os.path.join(args.calib_images, "*.jpg")))
+
+    t0 = time.perf_counter()
+    print(f"Referência: pytorch @ {args.ref_imgsz}px")
+    reference = {"backend": "pytorch", "path": args.model, "device": device, "imgsz": args.ref_imgsz, "threads": None}
+    reference.update(run_candidate(args, args.model, device, args.ref_imgsz, None))
+    reference["map50"] = measure_map(args.model, args.ref_imgsz, args.data, device) if use_map else None
+    reference["count_error"] = 0.0
+    reference["passes"] = True
+    print(f"  contagens {reference['counts']} | mAP50 {reference['map50']}")
+
+    candidates = [reference]
+    for backend in backends:
+        for imgsz in args.sizes:
+            try:
+                path = build_artifact(args, backend, imgsz, calib_images)
+            except Exception as e:
+                candidates.append({"backend": backend, "imgsz": imgsz, "error": f"exportação: {e}"})
+                continue
+            # mAP não depende das threads: uma vez por artefato
+            map50 = None
+            if use_map:
+                try:
+                    map50 = measure_map(path, imgsz, args.data, device)
+                except Exception as e:
+                    print(f"  mAP falhou para {backend} @ {imgsz}: {e}")
+            for n in (threads if backend == "pytorch" else [None]):
+                print(f"Medindo {backend} @ {imgsz}px, {n or 'auto'} threads...")
+                candidate = {"backend": backend, "path": path, "device": device, "imgsz": imgsz, "threads": n}
+                try:
+                    candidate.update(run_candidate(args, path, device, imgsz, n))
+                except Exception as e:
+                    candidates.append({**candidate, "error": str(e)})
+                    continue
+                candidate["map50"] = map50
+                candidate["count_error"] = count_error(candidate["counts"], reference["counts"])
+                map_ok = not use_map or (map50 is not None and map50 >= reference["map50"] * args.min_map_ratio)
+                candidate["passes"] = candidate["count_error"] <= args.max_count_error and map_ok
+                candidates.append(candidate)
+
+    passing = [c for c in candidates if c.get("passes")]
+    best = min(passing, key=lambda c: c["infer_p50_ms"])
+    print_table(candidates, best)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "model": model_signature(args.model),
+        "hardware": hardware_key(),
+        "source": args.source,
+        "floor": {"max_count_error": args.max_count_error, "min_map_ratio": args.min_map_ratio if use_map else None},
+        "best": {k: best[k] for k in ("backend", "path", "device", "imgsz", "threads", "infer_p50_ms", "fps", "count_error", "map50")},
+        "reference": {k: reference[k] for k in ("imgsz", "infer_p50_ms", "fps", "counts", "map50")},
+        "candidates": [{k: v for k, v in c.items() if k != "counts"} for c in candidates],
+        "seconds": time.perf_counter() - t0,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, args.output)
+    speedup = reference["infer_p50_ms"] / best["infer_p50_ms"] if best["infer_p50_ms"] > 0 else 0.0
+    print(f"\nEscolhido: {best['backend']} @ {best['imgsz']}px, {best['threads'] or 'auto'} threads "
+          f"({best['infer_p50_ms']:.1f} ms, {speedup:.2f}x a referência)")
+    print(f"Gravado em {args.output}; o main.py passa a usar essa configuração (--no-autotune desativa).")
+
+
+if __name__ == "__main__":
+    main()
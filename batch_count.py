@@ -0,0 +1,224 @@
+import argparse
+import csv
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+import cv2
+
+from main import add_engine_args
+
+# Auditoria de turno sem tempo real: a gravação é dividida em shards de tempo que rodam em
+# paralelo num pool de processos (um modelo por processo), sem janela e sem espera.
+# Cada shard começa `overlap` segundos antes do seu trecho só para aquecer rastreador e
+# contagem; uma contagem pertence ao shard dono do frame em que ela aconteceu, então uma
+# peça que atravessa a emenda é contada uma vez só.
+
+PROGRESS_INTERVAL_S = 2.0
+
+_worker = {}
+
+
+def plan_shards(total_frames, fps, shard_s, overlap_s):
+    """ [(shard, início do aquecimento, início, fim)] em frames; fim exclusivo """
+    size = max(int(round(shard_s * fps)), 1)
+    overlap = int(round(overlap_s * fps))
+    return [(i, max(start - overlap, 0), start, min(start + size, total_frames))
+            for i, start in enumerate(range(0, total_frames, size))]
+
+
+def count_frames(cap):
+    """ Contagem na leitura (grab, sem decodificar) para contêineres sem CAP_PROP_FRAME_COUNT """
+    n = 0
+    while cap.grab():
+        n += 1
+    return n
+
+
+def init_worker(args, threads, progress):
+    """ Uma vez por processo: limita as threads e carrega o modelo """
+    import torch
+    from main import load_model
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    model, device, adaptive_mode = load_model(args.model)
+    _worker.update(args=args, model=model, device=device, adaptive_mode=adaptive_mode, progress=progress)
+
+
+def count_shard(shard):
+    """ Decode + inferência + contagem de um shard; devolve as contagens com o frame de cada uma """
+    from main import build_engine
+    index, warm, start, end = shard
+    args, progress = _worker["args"], _worker["progress"]
+    cap = cv2.VideoCapture(args.source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.set(cv2.CAP_PROP_POS_FRAMES, warm)
+    engine = build_engine(args, _worker["model"], _worker["device"], _worker["adaptive_mode"], args.source,
+                          frame_rate=int(round(fps)))
+    engine.verbose = False
+
+    events = []
+    idx = warm
+    t0 = last = time.perf_counter()
+    while idx < end:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        packet = engine.process((idx, idx / fps, frame))
+        if idx >= start:
+            for e in packet["events"]:
+                events.append({"frame": idx, "class": e["class"], "element": e["element"],
+                               "track_id": e["track_id"], "area_px": e["area_px"]})
+        idx += 1
+        now = time.perf_counter()
+        if now - last >= PROGRESS_INTERVAL_S:
+            progress.put((os.getpid(), index, idx - warm, end - warm, (idx - warm) / (now - t0)))
+            last = now
+    cap.release()
+    seconds = time.perf_counter() - t0
+    progress.put((os.getpid(), index, idx - warm, end - warm, (idx - warm) / seconds if seconds else 0.0))
+    return {"shard": index, "warm": warm, "start": start, "end": end, "read_to": idx,
+            "frames": idx - warm, "seconds": seconds, "events": events}
+
+
+def timeline_rows(events, fps, total_frames, classes, start_time=None):
+    """ Uma linha por minuto e classe (zeros inclusive) """
+    minutes = int(total_frames / fps // 60) + 1
+    table = {(m, c): 0 for m in range(minutes) for c in classes}
+    for e in events:
+        table[(int(e["frame"] / fps // 60), e["class"])] += 1
+    rows = []
+    for (minute, class_name), count in sorted(table.items()):
+        label = (start_time + timedelta(minutes=minute)).isoformat(timespec="minutes") if start_time else f"{minute // 60:02d}:{minute % 60:02d}"
+        rows.append({"minute": minute, "time": label, "class": class_name, "count": count})
+    return rows
+
+
+def write_timeline(rows, path):
+    """ CSV; .parquet se o pandas (com pyarrow) estiver instalado, senão cai para CSV """
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+            pd.DataFrame(rows, columns=["minute", "time", "class", "count"]).to_parquet(path, index=False)
+            return path
+        except ImportError as e:
+            print(f"Parquet indisponível ({e}); gravando CSV.")
+            path = os.path.splitext(path)[0] + ".csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["minute", "time", "class", "count"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def print_progress(state, done_frames, planned, t0):
+    """ Progresso geral e frames/s de cada processo nos shards em andamento """
+    processed = done_frames + sum(frames for _, frames, _, _ in state.values())
+    elapsed = time.perf_counter() - t0
+    workers = " | ".join(f"{pid}: shard {shard} {frames}/{total} {fps:.0f} f/s"
+                         for pid, (shard, frames, total, fps) in sorted(state.items()))
+    print(f"[{processed / max(planned, 1):6.1%}] {processed}/{planned} frames | "
+          f"{processed / elapsed if elapsed else 0:.0f} frames/s no total | {workers}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contagem offline de uma gravação longa em shards paralelos")
+    parser.add_argument("--source", type=str, required=True, help="Vídeo gravado")
+    add_engine_args(parser)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Processos (um modelo cada)")
+    parser.add_argument("--threads", type=int, default=None, help="Threads do torch por processo (padrão: CPUs / workers)")
+    parser.add_argument("--shard-s", type=float, default=300, help="Duração de cada shard (s)")
+    parser.add_argument("--overlap-s", type=float, default=10,
+                        help="Aquecimento antes de cada shard (s); precisa cobrir o tempo de uma peça da entrada até a linha")
+    parser.add_argument("--output", type=str, default="timeline.csv", help="Linha do tempo por minuto e classe (.csv ou .parquet)")
+    parser.add_argument("--events", type=str, default=None, help="CSV opcional com cada contagem (frame, classe, linha, área)")
+    parser.add_argument("--start", type=str, default=None, help="Início da gravação (ISO, ex: 2026-10-18T06:00) para rotular os minutos")
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.source)
+    if not cap.isOpened():
+        print(f"Erro: não foi possível abrir {args.source}")
+        return
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total_frames <= 0:
+        # Alguns contêineres (MJPEG, .ts, gravação interrompida) não informam o total
+        print(f"{args.source} não informa o número de frames; contando...")
+        total_frames = count_frames(cap)
+    cap.release()
+    if total_frames <= 0:
+        print(f"Erro: nenhum frame legível em {args.source}")
+        return
+
+    shards = plan_shards(total_frames, fps, args.shard_s, args.overlap_s)
+    workers = max(1, min(args.workers, len(shards)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"{args.source}: {total_frames} frames @ {fps:g} fps ({total_frames / fps / 60:.1f} min) | "
+          f"{len(shards)} shards de {args.shard_s:g}s (+{args.overlap_s:g}s de aquecimento) | "
+          f"{workers} processos x {threads} threads")
+
+    # spawn: mesmo comportamento no Windows e no Linux (sem herdar estado do torch)
+    ctx = mp.get_context("spawn")
+    manager = ctx.Manager()
+    progress = manager.Queue()
+    results = []
+    state = {}
+    done_frames = 0
+    # Frames a decodificar, aquecimento incluído
+    planned = sum(end - warm for _, warm, _, end in shards)
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                             initargs=(args, threads, progress)) as pool:
+        pending = {pool.submit(count_shard, shard) for shard in shards}
+        last_print = time.perf_counter()
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                results.append(result)
+                done_frames += result["frames"]
+            while not progress.empty():
+                pid, shard, frames, total, worker_fps = progress.get()
+                state[pid] = (shard, frames, total, worker_fps)
+            # Shard terminado sai do "em andamento" (já somado em done_frames)
+            finished = {r["shard"] for r in results}
+            state = {pid: s for pid, s in state.items() if s[0] not in finished}
+            # Só depois que algum processo começou (o primeiro carregamento do modelo demora)
+            if (state or results) and (time.perf_counter() - last_print >= PROGRESS_INTERVAL_S or not pending):
+                print_progress(state, done_frames, planned, t0)
+                last_print = time.perf_counter()
+    wall = time.perf_counter() - t0
+    manager.shutdown()
+
+    results.sort(key=lambda r: r["shard"])
+    events = sorted((e for r in results for e in r["events"]), key=lambda e: e["frame"])
+    classes = sorted({e["class"] for e in events}) or ["-"]
+    path = write_timeline(timeline_rows(events, fps, total_frames, classes,
+                                        datetime.fromisoformat(args.start) if args.start else None), args.output)
+    if args.events:
+        with open(args.events, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["frame", "seconds", "class", "element", "area_px"])
+            writer.writeheader()
+            for e in events:
+                writer.writerow({"frame": e["frame"], "seconds": round(e["frame"] / fps, 3), "class": e["class"],
+                                 "element": e["element"], "area_px": e["area_px"]})
+
+    totals = {}
+    for e in events:
+        totals[e["class"]] = totals.get(e["class"], 0) + 1
+    overlap = int(round(args.overlap_s * fps))
+    seam = sum(1 for r in results if r["start"] > 0 for e in r["events"] if e["frame"] < r["start"] + overlap)
+    decoded = sum(r["frames"] for r in results)
+    short = [r["shard"] for r in results if r["read_to"] < r["end"]]
+    print(f"\nShards: " + " | ".join(f"{r['shard']}: {len(r['events'])} ({r['frames'] / r['seconds']:.0f} f/s)" for r in results))
+    print(f"Contagens: {totals} | {seam} logo após uma emenda (contadas uma vez, pelo shard dono do frame)")
+    print(f"{decoded} frames decodificados ({decoded - total_frames} de aquecimento) em {wall:.1f}s: "
+          f"{decoded / wall:.0f} frames/s | {total_frames / fps / wall:.1f}x o tempo real")
+    if short:
+        print(f"⚠️ Shards {short} terminaram antes do fim previsto (vídeo menor que CAP_PROP_FRAME_COUNT?)")
+    print(f"Linha do tempo gravada em {path}")
+
+
+if __name__ == "__main__":
+    main()
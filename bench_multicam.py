@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Benchmark multi-câmera em CPU: N processos (um main.py por esteira, cada um com
+# sua cópia do modelo) contra 1 processo com inferência em lote para as N fontes.
+# As fontes são vídeos gravados, lidos o mais rápido possível, sem janela.
+
+
+def peak_rss_mb():
+    """ Pico de memória residente do processo atual (MB) """
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1e6
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3 # Linux: KB
+
+
+def run_worker(videos, model_path, conf, imgsz, max_frames):
+    """ Um processo, um modelo, lote com um frame de cada vídeo por chamada """
+    import cv2
+    import numpy as np
+    from ultralytics import YOLO
+    from vision_engine import VisionEngine, process_batch
+
+    model = YOLO(model_path)
+    caps = [cv2.VideoCapture(v) for v in videos]
+    engines = [VisionEngine(model, conf, imgsz=imgsz, checkpoint_path=None) for _ in videos]
+    frames = [0] * len(videos)
+    active = list(range(len(videos)))
+
+    # Aquecimento fora da medição
+    width = int(caps[0].get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+    height = int(caps[0].get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+    engines[0].predict([np.zeros((height, width, 3), dtype=np.uint8)] * len(videos))
+
+    t0 = time.perf_counter()
+    while active:
+        batch = []
+        for i in list(active):
+            ret, frame = caps[i].read()
+            if not ret or frames[i] >= max_frames:
+                active.remove(i)
+                continue
+            batch.append((i, (frames[i], time.time(), frame)))
+            frames[i] += 1
+        if batch:
+            process_batch([engines[i] for i, _ in batch], [item for _, item in batch])
+    elapsed = time.perf_counter() - t0
+
+    for c in caps:
+        c.release()
+    return {
+        "videos": videos,
+        "frames": frames,
+        "elapsed": elapsed,
+        "fps_per_stream": [n / elapsed for n in frames],
+        "counts": [e.counters for e in engines],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def spawn_worker(videos, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--videos", *videos, "--model", args.model,
+           "--conf", str(args.conf), "--imgsz", str(args.imgsz), "--frames", str(args.frames)]
+    # Força CPU: o objetivo é medir o cenário sem GPU
+    env = dict(os.environ, CUDA_VISIBLE_DEVICES="")
+    return subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, env=env)
+
+
+def collect(proc):
+    out, _ = proc.communicate()
+    for line in reversed(out.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"Worker não retornou resultado (código {proc.returncode})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N processos x 1 processo em lote (CPU)")
+    parser.add_argument("--videos", type=str, nargs="+", required=True, help="Vídeos gravados, um por esteira")
+    parser.add_argument("--model", type=str, default="best_seg.pt")
+    parser.add_argument("--conf", type=float, default=0.65)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--frames", type=int, default=300, help="Máximo de frames por vídeo")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.videos, args.model, args.conf, args.imgsz, args.frames)))
+        return
+
+    n = len(args.videos)
+    print(f"=== {n} processos (1 modelo cada) ===")
+    t0 = time.perf_counter()
+    procs = [spawn_worker([v], args) for v in args.videos]
+    separate = [collect(p) for p in procs]
+    wall_separate = time.perf_counter() - t0
+
+    print(f"=== 1 processo em lote ({n} fontes) ===")
+    t0 = time.perf_counter()
+    batched = collect(spawn_worker(args.videos, args))
+    wall_batched = time.perf_counter() - t0
+
+    print()
+    print(f"{'fonte':<30} | {'N processos fps':>15} | {'lote fps':>9} | contagens iguais")
+    for i, video in enumerate(args.videos):
+        sep_fps = separate[i]["fps_per_stream"][0]
+        bat_fps = batched["fps_per_stream"][i]
+        same = separate[i]["counts"][0] == batched["counts"][i]
+        print(f"{os.path.basename(video):<30} | {sep_fps:>15.1f} | {bat_fps:>9.1f} | {'sim' if same else 'NÃO'}")
+
+    total_sep = sum(sum(r["frames"]) for r in separate)
+    total_bat = sum(batched["frames"])
+    print()
+    print(f"Vazão total:  N processos {total_sep / wall_separate:.1f} frames/s | lote {total_bat / wall_batched:.1f} frames/s")
+    print(f"Memória (pico RSS somado): N processos {sum(r['peak_rss_mb'] for r in separate):.0f} MB | lote {batched['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import time
+import cv2
+import numpy as np
+from ultralytics.engine.results import Boxes
+from counting import CountingEngine, DEFAULT_CAMERA_CONFIG, load_counting_config
+from tracking import StreamTracker
+from vision_engine import resolve_tracker_yaml
+
+# Compara os rastreadores (BoT-SORT do YAML, ByteTrack e o conveyor) sobre as mesmas
+# detecções: ms/frame só do rastreador, ids criados, trocas de id e contagem.
+# Sem --source, gera uma esteira sintética com ids reais (falhas de detecção, confiança
+# baixa, caixas com ruído) e mede as trocas de id de verdade; com vídeo, as detecções
+# vêm do modelo uma vez só e as trocas de id não têm referência.
+
+WIDTH, HEIGHT = 1280, 720
+CLASS_NAMES = {0: "peca a", 1: "peca b"}
+
+
+def synth_belt(n_frames, speed=25.0, density=0.12, miss=0.1, low_conf=0.15, seed=0):
+    """
+    Frames de uma esteira subindo: lista de (imagem, Boxes, gt_ids das detecções,
+    (gt_ids, centroides, classes) dos objetos visíveis). gt_id -1 = falso positivo.
+    """
+    rng = np.random.default_rng(seed)
+    # Fundo com textura fixa: o GMC do BoT-SORT acha pontos como numa câmera real
+    background = cv2.GaussianBlur(rng.integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8), (0, 0), 3)
+    objects = []  # [gt_id, x, y, w, h, v, cls]
+    next_id = 0
+    frames = []
+    for _ in range(n_frames):
+        if rng.random() < density:
+            w, h = rng.uniform(50, 90, 2)
+            objects.append([next_id, rng.uniform(w, WIDTH - w), HEIGHT + h / 2, w, h,
+                            speed * rng.uniform(0.9, 1.1), int(rng.integers(0, 2))])
+            next_id += 1
+        for obj in objects:
+            obj[2] -= obj[5]
+        objects = [o for o in objects if o[2] + o[4] / 2 > 0]
+
+        img = background.copy()
+        rows, det_gt = [], []
+        visible = [o for o in objects if o[2] - o[4] / 2 < HEIGHT]
+        for gt_id, x, y, w, h, _, cls in visible:
+            x1, y1, x2, y2 = x - w / 2, y - h / 2, x + w / 2, y + h / 2
+            cv2.rectangle(img, (int(x1), int(y1)), (int(x2), int(y2)), (40, 160, 220), -1)
+            if rng.random() < miss:
+                continue
+            box = np.array([x1, y1, x2, y2]) + rng.normal(0, 2, 4)
+            conf = rng.uniform(0.15, 0.29) if rng.random() < low_conf else rng.uniform(0.5, 0.95)
+            det_cls = 1 - cls if rng.random() < 0.05 else cls
+            rows.append([*box, conf, det_cls])
+            det_gt.append(gt_id)
+        if rng.random() < 0.05:
+            # Falso positivo fraco
+            x, y = rng.uniform(0, WIDTH - 60), rng.uniform(0, HEIGHT - 60)
+            rows.append([x, y, x + 60, y + 60, rng.uniform(0.1, 0.4), 0])
+            det_gt.append(-1)
+        data = np.array(rows, dtype=np.float32).reshape(-1, 6)
+        data[:, [0, 2]] = np.clip(data[:, [0, 2]], 0, WIDTH - 1)
+        truth = (np.array([o[0] for o in visible], dtype=np.int64),
+                 np.array([[o[1], o[2]] for o in visible], dtype=np.float32).reshape(-1, 2),
+                 np.array([o[6] for o in visible], dtype=np.int64))
+        frames.append((img, Boxes(data, (HEIGHT, WIDTH)), np.array(det_gt, dtype=np.int64), truth))
+    return frames
+
+
+def video_detections(args, n_frames):
+    """ Detecções do modelo para os frames do vídeo (uma inferência por frame, fora da medição) """
+    from main import build_engine, load_model
+    model, device, adaptive_mode = load_model(args.model)
+    cap = cv2.VideoCapture(args.source)
+    frame_rate = int(round(cap.get(cv2.CAP_PROP_FPS) or 30)) or 30
+    engine = build_engine(args, model, device, adaptive_mode, args.source, frame_rate=frame_rate)
+    frames = []
+    while len(frames) < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        result = engine.predict([frame])[0]
+        frames.append((frame, result.boxes.cpu().numpy(), None, None))
+    cap.release()
+    return frames, frame_rate
+
+
+def run_tracker(name, tracker_yaml, overrides, frames, counting_config, frame_rate):
+    tracker = StreamTracker(tracker_yaml, frame_rate=frame_rate, overrides=overrides).tracker
+    counting = CountingEngine.from_config(counting_config, CLASS_NAMES)
+    height, width = frames[0][0].shape[:2]
+    counting.resolve(width, height)
+
+    elapsed = 0.0
+    ids = set()
+    short = {}
+    last_track_of = {}
+    switches = 0
+    for img, boxes, det_gt, _ in frames:
+        t0 = time.perf_counter()
+        tracks = tracker.update(boxes, img)
+        elapsed += time.perf_counter() - t0
+        if len(tracks) == 0:
+            counting.update([], [], [])
+            continue
+        track_ids = tracks[:, 4].astype(int)
+        centroids = ((tracks[:, :2] + tracks[:, 2:4]) / 2).astype(np.float32)
+        counting.update(track_ids, centroids, tracks[:, 6].astype(int) % len(CLASS_NAMES))
+        for track_id in track_ids:
+            ids.add(int(track_id))
+            short[int(track_id)] = short.get(int(track_id), 0) + 1
+        if det_gt is not None:
+            # Troca de id: o mesmo objeto real passa a sair com outro id
+            for track_id, det in zip(track_ids, tracks[:, 7].astype(int)):
+                gt_id = int(det_gt[det])
+                if gt_id < 0:
+                    continue
+                if gt_id in last_track_of and last_track_of[gt_id] != track_id:
+                    switches += 1
+                last_track_of[gt_id] = int(track_id)
+    return {
+        "tracker": name,
+        "ms": elapsed / len(frames) * 1000,
+        "ids": len(ids),
+        "short": sum(1 for n in short.values() if n < 5),
+        "switches": switches if frames[0][2] is not None else None,
+        "counted": sum(counting.counters.values()),
+    }
+
+
+def ground_truth_count(frames, counting_config):
+    counting = CountingEngine.from_config(counting_config, CLASS_NAMES)
+    counting.resolve(WIDTH, HEIGHT)
+    for _, _, _, (gt_ids, centroids, classes) in frames:
+        counting.update(gt_ids, centroids, classes)
+    return sum(counting.counters.values()), len({int(i) for f in frames for i in f[3][0]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BoT-SORT x ByteTrack x conveyor sobre as mesmas detecções")
+    parser.add_argument("--source", type=str, default=None, help="Vídeo (padrão: esteira sintética com ids reais)")
+    parser.add_argument("--tracker-yaml", type=str, default=None, help="YAML base (padrão: custom_tracker.yaml)")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--speed", type=float, default=25, help="Esteira sintética: px/frame")
+    parser.add_argument("--density", type=float, default=0.12, help="Esteira sintética: chance de peça nova por frame")
+    parser.add_argument("--miss", type=float, default=0.1, help="Esteira sintética: chance de a detecção falhar")
+    parser.add_argument("--seed", type=int, default=0)
+    from main import add_engine_args
+    add_engine_args(parser)
+    args = parser.parse_args()
+
+    tracker_yaml = args.tracker_yaml or resolve_tracker_yaml()
+    if args.source:
+        frames, frame_rate = video_detections(args, args.frames)
+        counting_config = load_counting_config(args.counting_config, camera=args.source)
+        truth = None
+    else:
+        frames, frame_rate = synth_belt(args.frames, args.speed, args.density, args.miss, seed=args.seed), 30
+        counting_config = DEFAULT_CAMERA_CONFIG
+        truth = ground_truth_count(frames, counting_config)
+    if not frames:
+        print("Nenhum frame lido.")
+        return
+
+    # Mesmos limiares do YAML; o botsort roda com o GMC configurado nele
+    runs = [("botsort", {"tracker_type": "botsort"}),
+            ("bytetrack", {"tracker_type": "bytetrack"}),
+            ("conveyor", {"tracker_type": "conveyor"})]
+    print(f"{len(frames)} frames | YAML base: {tracker_yaml}")
+    if truth:
+        print(f"Referência: {truth[1]} objetos, {truth[0]} contados")
+    print(f"{'rastreador':<10} | {'ms/frame':>8} | {'ids':>5} | {'ids < 5 frames':>14} | {'trocas de id':>12} | {'contados':>8}")
+    for name, overrides in runs:
+        r = run_tracker(name, tracker_yaml, overrides, frames, counting_config, frame_rate)
+        switches = "-" if r["switches"] is None else r["switches"]
+        print(f"{r['tracker']:<10} | {r['ms']:>8.2f} | {r['ids']:>5} | {r['short']:>14} | {switches:>12} | {r['counted']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+
+from main import add_engine_args, build_engine, load_model
+
+# Replay offline: passa um vídeo (ou os frames de dataset/*.jpg em sequência) pelos
+# mesmos estágios do main.py — decode, infer, track, count, render — sem janela,
+# mede a latência de cada estágio e compara o relatório com um baseline salvo.
+
+STAGES = ["decode", "infer", "track", "count", "render"]
+
+# Bordas do histograma de latência (ms), espaçadas em escala log
+HIST_EDGES = [0, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf")]
+
+
+class ReplaySource:
+    """ Vídeo via cv2.VideoCapture ou pasta/glob de imagens lidas em ordem alfabética """
+
+    def __init__(self, source):
+        self.source = source
+        self.images = None
+        self.cap = None
+        if os.path.isdir(source):
+            self.images = sorted(glob.glob(os.path.join(source, "*.jpg")))
+        elif any(ch in source for ch in "*?["):
+            self.images = sorted(glob.glob(source))
+        else:
+            self.cap = cv2.VideoCapture(source)
+            if not self.cap.isOpened():
+                raise RuntimeError(f"Fonte inacessível: {source}")
+        if self.images is not None and not self.images:
+            raise RuntimeError(f"Nenhuma imagem em {source}")
+        self._pos = 0
+
+    @property
+    def frame_rate(self):
+        if self.cap is not None:
+            return int(round(self.cap.get(cv2.CAP_PROP_FPS) or 30)) or 30
+        return 30
+
+    def read(self):
+        if self.cap is not None:
+            return self.cap.read()
+        if self._pos >= len(self.images):
+            return False, None
+        frame = cv2.imread(self.images[self._pos])
+        self._pos += 1
+        return frame is not None, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+def summarize(samples):
+    """ p50/p95/p99 e histograma de uma lista de latências (ms) """
+    if not samples:
+        return {"n": 0}
+    arr = np.asarray(samples, dtype=np.float64)
+    counts, _ = np.histogram(arr, bins=HIST_EDGES)
+    return {
+        "n": int(len(arr)),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+        "hist": {"edges_ms": [e if e != float("inf") else None for e in HIST_EDGES], "counts": counts.tolist()},
+    }
+
+
+def replay(engine, source, max_frames=None, render=True, on_frame=None):
+    """
+    Executa o replay e devolve (amostras_por_estágio, frames, segundos).
+    `on_frame(packet)` é chamado a cada frame processado (usado por ferramentas de comparação).
+    """
+    samples = {stage: [] for stage in STAGES}
+    frames = 0
+    t_start = time.perf_counter()
+    while max_frames is None or frames < max_frames:
+        t0 = time.perf_counter()
+        ret, frame = source.read()
+        if not ret:
+            break
+        samples["decode"].append((time.perf_counter() - t0) * 1000)
+
+        packet = engine.process((frames, time.time(), frame))
+        for stage in ("infer", "track", "count"):
+            if stage in engine.stage_ms:
+                samples[stage].append(engine.stage_ms[stage])
+
+        if render:
+            t0 = time.perf_counter()
+            engine.render(packet, 0)
+            samples["render"].append((time.perf_counter() - t0) * 1000)
+
+        if on_frame is not None:
+            on_frame(packet)
+        frames += 1
+    return samples, frames, time.perf_counter() - t_start
+
+
+def build_report(args, device, engine, samples, frames, wall):
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "source": args.source,
+        "model": args.model,
+        "device": device,
+        "imgsz": engine.imgsz,
+        "conf": args.conf,
+        "frames": frames,
+        "wall_s": wall,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "stages": {stage: summarize(samples[stage]) for stage in STAGES},
+        "counts": dict(engine.counters),
+    }
+
+
+def compare(report, baseline, tolerance, min_ms=1.0):
+    """
+    Lista de regressões do relatório contra o baseline:
+      - FPS abaixo de baseline * (1 - tolerância)
+      - p95 de um estágio acima de baseline * (1 + tolerância) e pelo menos `min_ms` mais lento
+      - qualquer diferença nas contagens finais
+    """
+    regressions = []
+    base_fps = baseline.get("fps", 0)
+    if base_fps and report["fps"] < base_fps * (1 - tolerance):
+        regressions.append(f"FPS {report['fps']:.1f} < baseline {base_fps:.1f}")
+
+    for stage in STAGES:
+        cur = report["stages"].get(stage, {})
+        base = baseline.get("stages", {}).get(stage, {})
+        if not cur.get("n") or not base.get("n"):
+            continue
+        if cur["p95"] > base["p95"] * (1 + tolerance) and cur["p95"] - base["p95"] >= min_ms:
+            regressions.append(f"{stage}: p95 {cur['p95']:.2f} ms > baseline {base['p95']:.2f} ms")
+
+    if report["counts"] != baseline.get("counts", {}):
+        regressions.append(f"contagens {report['counts']} != baseline {baseline.get('counts', {})}")
+    return regressions
+
+
+def print_report(report, baseline=None):
+    print(f"\nFrames: {report['frames']} | Tempo: {report['wall_s']:.1f}s | FPS: {report['fps']:.1f}"
+          + (f" (baseline {baseline['fps']:.1f})" if baseline else ""))
+    print(f"{'estágio':<8} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'média':>8}" + (" | base p95" if baseline else ""))
+    for stage in STAGES:
+        st = report["stages"][stage]
+        if not st.get("n"):
+            continue
+        line = f"{stage:<8} | {st['p50']:>8.2f} | {st['p95']:>8.2f} | {st['p99']:>8.2f} | {st['mean']:>8.2f}"
+        if baseline:
+            base = baseline.get("stages", {}).get(stage, {})
+            line += f" | {base['p95']:>9.2f}" if base.get("n") else " |         -"
+        print(line)
+    if "cpu_ms_per_frame" in report:
+        print(f"CPU: {report['cpu_ms_per_frame']:.1f} ms/frame (máscaras: {report.get('masks', 'full')})")
+    print(f"Contagens: {report['counts']}")
+    cmp = report.get("roi_comparison")
+    if cmp:
+        print(f"ROI {report['roi']['mode']} {report['roi']['rect']} imgsz={report['roi']['imgsz']}: "
+              f"{cmp['roi_fps']:.1f} FPS x frame inteiro {cmp['full_frame_fps']:.1f} FPS ({cmp['speedup']:.2f}x) | "
+              f"infer p50 {cmp['roi_infer_p50']:.1f} ms x {cmp['full_frame_infer_p50']:.1f} ms | "
+              f"contagens frame inteiro: {cmp['full_frame_counts']}")
+    if report.get("gate"):
+        print(f"Portão de movimento: {report['gate']['skipped']}/{report['gate']['frames']} frames pulados "
+              f"({report['gate']['skip_ratio']:.0%})")
+    cmp = report.get("gate_comparison")
+    if cmp:
+        print(f"Sem portão: {cmp['ungated_fps']:.1f} FPS x com portão {cmp['gated_fps']:.1f} FPS | "
+              f"contagens {'iguais' if cmp['counts_match'] else 'DIFERENTES: ' + str(cmp['ungated_counts'])}")
+    cmp = report.get("mask_comparison")
+    if cmp:
+        print(f"Máscaras lazy x full: CPU {cmp['lazy_cpu_ms_per_frame']:.1f} x {cmp['full_cpu_ms_per_frame']:.1f} ms/frame "
+              f"({cmp['cpu_saved']:.0%} economizado) | {cmp['lazy_fps']:.1f} x {cmp['full_fps']:.1f} FPS | "
+              f"infer p50 {cmp['lazy_infer_p50']:.1f} x {cmp['full_infer_p50']:.1f} ms | "
+              f"contagens {'iguais' if cmp['counts_match'] else 'DIFERENTES: ' + str(cmp['full_counts'])}")
+
+
+def run_once(args, model, device, adaptive_mode):
+    """ Aquecimento + replay completo com as opções de `args`; devolve o relatório """
+    source = ReplaySource(args.source)
+    engine = build_engine(args, model, device, adaptive_mode, args.source, frame_rate=source.frame_rate)
+
+    # Aquecimento: a primeira inferência inclui alocação e não representa o regime
+    ret, frame = source.read()
+    if not ret:
+        print(f"Fonte vazia: {args.source}")
+        sys.exit(1)
+    engine.predict([frame])
+    source.release()
+    source = ReplaySource(args.source)
+
+    cpu0 = time.process_time()
+    samples, frames, wall = replay(engine, source, args.frames, render=not args.no_render)
+    cpu = time.process_time() - cpu0
+    source.release()
+    report = build_report(args, device, engine, samples, frames, wall)
+    # CPU de todas as threads do processo (inclui as threads internas do torch)
+    report["cpu_s"] = cpu
+    report["cpu_ms_per_frame"] = cpu / frames * 1000 if frames else 0.0
+    report["masks"] = engine.mask_mode
+    report["roi"] = {"mode": engine.roi.mode, "rect": engine.roi.rect, "imgsz": engine.roi.imgsz(engine.imgsz)}
+    report["gate"] = engine.gate.metrics() if engine.gate is not None else None
+    return report
+
+
+def variant(args, **overrides):
+    """ Cópia dos argumentos com algumas opções trocadas (comparações A/B) """
+    new_args = argparse.Namespace(**vars(args))
+    for key, value in overrides.items():
+        setattr(new_args, key, value)
+    return new_args
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline com latência por estágio")
+    parser.add_argument("--source", type=str, default="dataset", help="Vídeo, pasta de .jpg ou glob (padrão: dataset/)")
+    add_engine_args(parser)
+    parser.add_argument("--frames", type=int, default=None, help="Limite de frames")
+    parser.add_argument("--no-render", action="store_true", help="Não mede o estágio de render")
+    parser.add_argument("--output", type=str, default="benchmark_report.json", help="Relatório JSON")
+    parser.add_argument("--baseline", type=str, default=None, help="Relatório de referência para comparar")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava este relatório também como --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Tolerância de regressão de tempo (0.10 = 10%%)")
+    parser.add_argument("--compare-roi", action="store_true", help="Roda também sem ROI e mostra a diferença de FPS")
+    parser.add_argument("--compare-gate", action="store_true", help="Roda também sem portão de movimento e confere se as contagens batem")
+    parser.add_argument("--compare-masks", action="store_true", help="Roda também com --masks full e mostra a CPU economizada pelo modo lazy")
+    args = parser.parse_args()
+
+    model, device, adaptive_mode = load_model(args.model)
+    report = run_once(args, model, device, adaptive_mode)
+
+    if args.compare_roi:
+        # Sem ROI configurado, compara com a faixa das linhas
+        if report["roi"]["mode"] == "off":
+            report = run_once(variant(args, roi="band"), model, device, adaptive_mode)
+        full = run_once(variant(args, roi="off"), model, device, adaptive_mode)
+        report["roi_comparison"] = {
+            "full_frame_fps": full["fps"],
+            "roi_fps": report["fps"],
+            "speedup": report["fps"] / full["fps"] if full["fps"] else 0.0,
+            "full_frame_infer_p50": full["stages"]["infer"].get("p50", 0.0),
+            "roi_infer_p50": report["stages"]["infer"].get("p50", 0.0),
+            "full_frame_counts": full["counts"],
+        }
+
+    if args.compare_gate:
+        if report["gate"] is None:
+            report = run_once(variant(args, motion_gate=True), model, device, adaptive_mode)
+        ungated = run_once(variant(args, motion_gate=False), model, device, adaptive_mode)
+        report["gate_comparison"] = {
+            "skip_ratio": report["gate"]["skip_ratio"],
+            "ungated_fps": ungated["fps"],
+            "gated_fps": report["fps"],
+            "ungated_counts": ungated["counts"],
+            "counts_match": ungated["counts"] == report["counts"],
+        }
+
+    if args.compare_masks:
+        if report["masks"] != "lazy":
+            report = run_once(variant(args, masks="lazy"), model, device, adaptive_mode)
+        full = run_once(variant(args, masks="full"), model, device, adaptive_mode)
+        report["mask_comparison"] = {
+            "full_fps": full["fps"],
+            "lazy_fps": report["fps"],
+            "full_cpu_ms_per_frame": full["cpu_ms_per_frame"],
+            "lazy_cpu_ms_per_frame": report["cpu_ms_per_frame"],
+            "cpu_saved": 1 - report["cpu_s"] / full["cpu_s"] if full["cpu_s"] else 0.0,
+            "full_infer_p50": full["stages"]["infer"].get("p50", 0.0),
+            "lazy_infer_p50": report["stages"]["infer"].get("p50", 0.0),
+            "full_counts": full["counts"],
+            "counts_match": full["counts"] == report["counts"],
+        }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Relatório gravado em {args.output}")
+
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline atualizado: {args.baseline}")
+        print_report(report)
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if baseline:
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\n❌ REGRESSÕES:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("\n✅ Sem regressões contra o baseline")
+
+
+if __name__ == "__main__":
+    main()
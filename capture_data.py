@@ -1,64 +1,234 @@
 import cv2
 import os
+import re
+import glob
 import time
+import queue
+import hashlib
+import argparse
+import threading
+from dataset_manifest import DatasetManifest
+from motion_gate import MotionGate
+
+WINDOW_NAME = "Coletor de Dados (Aperte ESPACO)"
+
+# Tecla de rajada: a repetição do teclado chega com atraso (~0.5 s) depois do primeiro toque,
+# então a rajada segue ativa até esse tempo sem nova repetição
+BURST_HOLD_S = 0.6
+
+# Duração do "flash" de confirmação na prévia (sem travar a captura)
+FLASH_S = 0.08
+
+
+class NameAllocator:
+    """
+    Nomes eca_NNNN.jpg sem colisão: continua do maior índice de *imagem* existente
+    (os .json/.txt não contam) e, se outro processo pegar o mesmo nome, pula para o próximo.
+    """
+
+    def __init__(self, output_dir, prefix="eca", ext=".jpg"):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.ext = ext
+        pattern = re.compile(rf"^{re.escape(prefix)}_(\d+){re.escape(ext)}$")
+        indices = [int(m.group(1)) for m in
+                   (pattern.match(os.path.basename(p)) for p in glob.glob(os.path.join(output_dir, f"{prefix}_*{ext}"))) if m]
+        self._next = max(indices) + 1 if indices else 0
+        self._lock = threading.Lock()
+
+    def next_path(self):
+        with self._lock:
+            index = self._next
+            self._next += 1
+        return os.path.join(self.output_dir, f"{self.prefix}_{index:04d}{self.ext}")
+
+
+class AsyncImageWriter:
+    """
+    Grava JPEGs em threads, fora do loop da prévia. A fila é limitada: se o disco não
+    acompanhar, o frame novo é descartado (e contado) em vez de travar a câmera.
+    """
+
+    def __init__(self, allocator, manifest_dir, workers=2, maxsize=32, quality=95):
+        self.allocator = allocator
+        self.manifest_dir = manifest_dir
+        self.quality = quality
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.saved = 0
+        self.dropped = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"gravador-{i}", daemon=True) for i in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, frame):
+        """ Enfileira uma cópia do frame; False se a fila estava cheia """
+        try:
+            self.queue.put_nowait(frame.copy())
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _write_exclusive(self, data):
+        """ Cria o arquivo com O_EXCL: nunca sobrescreve, nem imagem de outro processo """
+        while True:
+            path = self.allocator.next_path()
+            try:
+                with open(path, "xb") as f:
+                    f.write(data)
+                return path
+            except FileExistsError:
+                continue
+
+    def _run(self):
+        # Uma conexão SQLite por thread
+        manifest = DatasetManifest(self.manifest_dir)
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is None:
+                    break
+                try:
+                    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                    if not ok:
+                        raise RuntimeError("falha no imencode")
+                    data = buf.tobytes()
+                    path = self._write_exclusive(data)
+                    manifest.add_image(path, frame.shape, sha1=hashlib.sha1(data).hexdigest())
+                    with self._lock:
+                        self.saved += 1
+                except Exception as e:
+                    print(f"Erro gravando imagem: {e}")
+                    with self._lock:
+                        self.errors += 1
+                finally:
+                    self.queue.task_done()
+        finally:
+            manifest.close()
+
+    def close(self):
+        """ Espera a fila esvaziar e encerra as threads """
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join()
+
+
+def open_camera(source):
+    # Preferência por DSHOW (Windows) para câmeras locais
+    if source.isdigit():
+        cap = cv2.VideoCapture(int(source), cv2.CAP_DSHOW)
+        if not cap.isOpened():
+            cap = cv2.VideoCapture(int(source))
+    else:
+        cap = cv2.VideoCapture(source)
+    return cap if cap.isOpened() else None
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Coleta de imagens para treinamento")
+    parser.add_argument("--source", type=str, default="0", help="Índice da câmera ou vídeo")
+    parser.add_argument("--output", type=str, default="dataset", help="Pasta de saída")
+    parser.add_argument("--prefix", type=str, default="eca", help="Prefixo dos arquivos (eca_0001.jpg)")
+    parser.add_argument("--burst-fps", type=float, default=5, help="Fotos por segundo com a tecla de rajada pressionada")
+    parser.add_argument("--auto", action="store_true", help="Começa no modo automático (captura quando há movimento)")
+    parser.add_argument("--auto-interval", type=float, default=1.0, help="Segundos mínimos entre capturas automáticas")
+    parser.add_argument("--motion-threshold", type=float, default=0.01, help="Fração de pixels alterados que dispara a captura automática")
+    parser.add_argument("--writers", type=int, default=2, help="Threads de gravação")
+    parser.add_argument("--queue-size", type=int, default=32, help="Frames aguardando gravação antes de descartar")
+    parser.add_argument("--quality", type=int, default=95, help="Qualidade JPEG")
+    parser.add_argument("--headless", action="store_true", help="Sem janela (coleta automática sem operador)")
+    args = parser.parse_args()
+
     # Cria a pasta 'dataset' se não existir
-    output_dir = "dataset"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    # Abre a câmera (usa o índice 0 que sabemos que funciona)
-    # Se precisar de outro, mude aqui ou use argparse como no main.py
-    # Preferência por DSHOW
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    
-    if not cap.isOpened():
-        cap = cv2.VideoCapture(0)
-
-    if not cap.isOpened():
+    os.makedirs(args.output, exist_ok=True)
+
+    cap = open_camera(args.source)
+    if cap is None:
         print("Erro: Não foi possível abrir a câmera.")
         return
 
+    auto = args.auto or args.headless
     print("=== Coleta de Dados para Treinamento ===")
     print("Controles:")
     print(" [ESPAÇO] - Salvar Foto")
+    print(f" [b]      - Rajada ({args.burst_fps:g} fotos/s enquanto pressionado)")
+    print(" [a]      - Liga/desliga captura automática por movimento")
     print(" [q]      - Sair")
-    
-    count = 0
-    # Verifica quantas fotos já existem para não sobrescrever
-    existing_files = os.listdir(output_dir)
-    count = len(existing_files)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("Erro ao ler frame.")
-            break
-
-        # Mostra o frame
-        cv2.imshow("Coletor de Dados (Aperte ESPACO)", frame)
-
-        key = cv2.waitKey(1) & 0xFF
-
-        # Salvar imagem
-        if key == ord(' '):
-            filename = f"{output_dir}/eca_{count:04d}.jpg"
-            cv2.imwrite(filename, frame)
-            print(f"Foto salva: {filename}")
-            count += 1
-            
-            # Pisca a tela para dar feedback visual
-            cv2.imshow("Coletor de Dados (Aperte ESPACO)", 255 - frame)
-            cv2.waitKey(50)
-
-        # Sair
-        elif key == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    print(f"\nColeta finalizada! Total de {count} imagens em '{output_dir}'.")
+
+    allocator = NameAllocator(args.output, args.prefix)
+    writer = AsyncImageWriter(allocator, args.output, args.writers, args.queue_size, args.quality)
+    # Referência do portão = último frame capturado: esteira parada não gera fotos repetidas
+    gate = MotionGate(threshold=args.motion_threshold, max_skip=10 ** 9)
+
+    burst_until = 0.0
+    last_burst = 0.0
+    last_auto = 0.0
+    flash_until = 0.0
+
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                print("Erro ao ler frame.")
+                break
+            now = time.time()
+            height, width = frame.shape[:2]
+
+            capture = False
+            if auto and now - last_auto >= args.auto_interval and gate.check(frame, (0, 0, width, height)):
+                capture = True
+                last_auto = now
+            if now < burst_until and now - last_burst >= 1.0 / args.burst_fps:
+                capture = True
+                last_burst = now
+
+            key = -1
+            if not args.headless:
+                # Prévia com status; o flash é só uma borda por alguns ms, sem waitKey bloqueante
+                preview = frame.copy()
+                if now < flash_until:
+                    cv2.rectangle(preview, (0, 0), (width - 1, height - 1), (255, 255, 255), 12)
+                mode = "AUTO" if auto else ("RAJADA" if now < burst_until else "MANUAL")
+                status = f"{mode} | salvas {writer.saved} | fila {writer.pending()} | descartadas {writer.dropped}"
+                cv2.putText(preview, status, (10, height - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2, cv2.LINE_AA)
+                cv2.imshow(WINDOW_NAME, preview)
+                key = cv2.waitKey(1) & 0xFF
+
+            # Salvar imagem
+            if key == ord(' '):
+                capture = True
+            elif key == ord('b'):
+                if now >= burst_until:
+                    last_burst = 0.0
+                burst_until = now + BURST_HOLD_S
+            elif key == ord('a'):
+                auto = not auto
+                print(f"Captura automática: {'LIGADA' if auto else 'DESLIGADA'}")
+            # Sair
+            elif key == ord('q'):
+                break
+
+            if capture:
+                if writer.submit(frame):
+                    flash_until = now + FLASH_S
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        if not args.headless:
+            cv2.destroyAllWindows()
+        print("Gravando imagens pendentes...")
+        writer.close()
+
+    print(f"\nColeta finalizada! {writer.saved} imagens salvas em '{args.output}' "
+          f"({writer.dropped} descartadas por fila cheia, {writer.errors} com erro).")
 
 if __name__ == "__main__":
     main()
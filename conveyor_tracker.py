@@ -0,0 +1,185 @@
+import numpy as np
+
+# Rastreador próprio para câmera fixa sobre esteira (`tracker_type: conveyor` no YAML do
+# rastreador). Sem compensação de movimento global (a câmera não se move) e sem Kalman:
+# cada track anda com velocidade constante entre frames, as peças novas herdam a
+# velocidade da esteira e a associação é IoU/centroide em NumPy, em duas etapas
+# (detecções fortes, depois fracas) como o ByteTrack.
+
+# Eixo da esteira: componente da velocidade que é mantida
+BELT_AXES = {"auto": (1.0, 1.0), "x": (1.0, 0.0), "y": (0.0, 1.0)}
+
+
+def iou_matrix(a, b):
+    """ IoU entre caixas xyxy (N, 4) x (M, 4) """
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(cost):
+    """
+    Pares (linha, coluna) em ordem crescente de custo, cada linha/coluna no máximo uma vez.
+    Custo infinito = par proibido. Devolve (pares, linhas sem par, colunas sem par).
+    """
+    n_rows, n_cols = cost.shape
+    rows, cols = np.nonzero(np.isfinite(cost))
+    order = np.argsort(cost[rows, cols], kind="stable")
+    row_used = np.zeros(n_rows, dtype=bool)
+    col_used = np.zeros(n_cols, dtype=bool)
+    matches = []
+    for r, c in zip(rows[order], cols[order]):
+        if not row_used[r] and not col_used[c]:
+            row_used[r] = col_used[c] = True
+            matches.append((int(r), int(c)))
+    return matches, np.flatnonzero(~row_used), np.flatnonzero(~col_used)
+
+
+class ConveyorTrack:
+    __slots__ = ("track_id", "box", "velocity", "score", "cls", "hits", "last_frame", "confirmed")
+
+    def __init__(self, track_id, box, velocity, score, cls, frame_id, confirmed):
+        self.track_id = track_id
+        self.box = box
+        self.velocity = velocity
+        self.score = score
+        self.cls = cls
+        self.hits = 1
+        self.last_frame = frame_id
+        self.confirmed = confirmed
+
+    def predict(self, frame_id):
+        """ Caixa prevista para `frame_id` andando com a velocidade atual """
+        return self.box + np.tile(self.velocity * (frame_id - self.last_frame), 2)
+
+    def update(self, box, score, cls, frame_id, alpha, axis):
+        gap = max(frame_id - self.last_frame, 1)
+        measured = ((box[:2] + box[2:]) - (self.box[:2] + self.box[2:])) / 2 / gap * axis
+        self.velocity = measured if self.hits == 1 else alpha * measured + (1 - alpha) * self.velocity
+        self.box = box
+        self.score = score
+        self.cls = cls
+        self.hits += 1
+        self.last_frame = frame_id
+        self.confirmed = True
+
+
+class ConveyorTracker:
+    """
+    Mesma interface dos rastreadores do ultralytics: `update(boxes, img)` recebe o Boxes
+    (numpy) do frame e devolve linhas [x1, y1, x2, y2, id, score, cls, idx].
+
+    Usa as chaves de sempre do YAML (track_high_thresh, track_low_thresh,
+    new_track_thresh, match_thresh, track_buffer, fuse_score) e mais:
+      belt_axis: auto | x | y      eixo do movimento da esteira (a outra componente é zerada)
+      center_gate: 0.5             sem sobreposição, associa pelo centroide até esta
+                                   distância (em diagonais da caixa prevista)
+      velocity_alpha: 0.5          peso da medida nova na média da velocidade
+    """
+
+    def __init__(self, args, frame_rate=30):
+        self.high_thresh = args.track_high_thresh
+        self.low_thresh = args.track_low_thresh
+        self.new_track_thresh = args.new_track_thresh
+        self.match_thresh = args.match_thresh
+        self.fuse_score = getattr(args, "fuse_score", False)
+        self.max_time_lost = int(frame_rate / 30.0 * args.track_buffer)
+        belt_axis = getattr(args, "belt_axis", "auto")
+        if belt_axis not in BELT_AXES:
+            raise ValueError(f"belt_axis inválido: '{belt_axis}' (opções: {sorted(BELT_AXES)})")
+        self.axis = np.array(BELT_AXES[belt_axis], dtype=np.float32)
+        self.center_gate = getattr(args, "center_gate", 0.5)
+        self.velocity_alpha = getattr(args, "velocity_alpha", 0.5)
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.frame_id = 0
+        self._next_id = 1
+        # Velocidade típica da esteira (px/frame): ponto de partida das peças novas
+        self.belt_velocity = np.zeros(2, dtype=np.float32)
+
+    def _cost(self, tracks, boxes, scores, max_cost, center_gate):
+        """ 1 - IoU com a caixa prevista; sem sobreposição suficiente, distância do centroide (depois de todo IoU) """
+        if not tracks or not len(boxes):
+            return np.full((len(tracks), len(boxes)), np.inf, dtype=np.float32)
+        pred = np.stack([t.predict(self.frame_id) for t in tracks])
+        iou = iou_matrix(pred, boxes)
+        cost = 1 - (iou * scores[None, :] if self.fuse_score else iou)
+        cost = np.where(cost <= max_cost, cost, np.inf)
+        if center_gate:
+            diag = np.hypot(pred[:, 2] - pred[:, 0], pred[:, 3] - pred[:, 1])
+            pc = (pred[:, :2] + pred[:, 2:]) / 2
+            dc = (boxes[:, :2] + boxes[:, 2:]) / 2
+            dist = np.linalg.norm(pc[:, None, :] - dc[None, :, :], axis=2) / np.maximum(diag[:, None], 1e-6)
+            cost = np.minimum(cost, np.where(dist <= center_gate, 1 + dist, np.inf))
+        return cost
+
+    def update(self, results, img=None):
+        self.frame_id += 1
+        scores = np.asarray(results.conf, dtype=np.float32).reshape(-1)
+        boxes = np.asarray(results.xyxy, dtype=np.float32).reshape(-1, 4)
+        classes = np.asarray(results.cls, dtype=np.float32).reshape(-1)
+
+        strong = np.flatnonzero(scores >= self.high_thresh)
+        weak = np.flatnonzero((scores > self.low_thresh) & (scores < self.high_thresh))
+        confirmed = [t for t in self.tracks if t.confirmed]
+        unconfirmed = [t for t in self.tracks if not t.confirmed]
+        updated = []
+
+        def apply(tracks, det_idx, matches):
+            for ti, di in matches:
+                d = det_idx[di]
+                tracks[ti].update(boxes[d], scores[d], classes[d], self.frame_id, self.velocity_alpha, self.axis)
+                updated.append((tracks[ti], d))
+
+        # 1ª etapa: tracks confirmados (ativos e perdidos) x detecções fortes
+        matches, rest_t, rest_d = greedy_match(self._cost(confirmed, boxes[strong], scores[strong],
+                                                          self.match_thresh, self.center_gate))
+        apply(confirmed, strong, matches)
+        strong = strong[rest_d]
+
+        # 2ª etapa: quem estava ativo no frame anterior x detecções fracas (só IoU, como o ByteTrack)
+        recent = [confirmed[i] for i in rest_t if confirmed[i].last_frame == self.frame_id - 1]
+        matches, _, _ = greedy_match(self._cost(recent, boxes[weak], scores[weak], 0.5, 0))
+        apply(recent, weak, matches)
+
+        # Tracks de um frame só x fortes que sobraram; quem não achar par é descartado
+        matches, _, rest_d = greedy_match(self._cost(unconfirmed, boxes[strong], scores[strong], 0.7, 0))
+        apply(unconfirmed, strong, matches)
+        strong = strong[rest_d]
+
+        if updated:
+            moving = [t.velocity for t, _ in updated if t.hits > 2]
+            if moving:
+                self.belt_velocity = 0.8 * self.belt_velocity + 0.2 * np.median(moving, axis=0).astype(np.float32)
+
+        # Peças novas: forte o bastante para abrir um id; só aparecem na saída quando confirmadas
+        new_tracks = []
+        for d in strong[scores[strong] >= self.new_track_thresh]:
+            track = ConveyorTrack(self._next_id, boxes[d], self.belt_velocity.copy(), scores[d], classes[d],
+                                  self.frame_id, confirmed=self.frame_id == 1)
+            self._next_id += 1
+            new_tracks.append(track)
+            if track.confirmed:
+                updated.append((track, d))
+
+        height, width = img.shape[:2] if img is not None else (None, None)
+        alive = []
+        for t in self.tracks:
+            if t.last_frame == self.frame_id:
+                alive.append(t)
+            elif t.confirmed and self.frame_id - t.last_frame <= self.max_time_lost:
+                # Perdido: some de vez quando a caixa prevista sai inteira do frame
+                if width is not None:
+                    x1, y1, x2, y2 = t.predict(self.frame_id)
+                    if x2 < 0 or y2 < 0 or x1 >= width or y1 >= height:
+                        continue
+                alive.append(t)
+        self.tracks = alive + new_tracks
+
+        rows = [[*t.box, t.track_id, t.score, t.cls, d] for t, d in updated if t.confirmed]
+        return np.array(rows, dtype=np.float32).reshape(-1, 8)
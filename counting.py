@@ -0,0 +1,296 @@
+import os
+import numpy as np
+import yaml
+from track_store import TrackStore
+
+DEFAULT_CONFIG_PATH = "counting.yaml"
+
+# Vetores de sentido (coordenadas de imagem: y cresce para baixo)
+DIRECTIONS = {
+    "up": (0.0, -1.0),
+    "down": (0.0, 1.0),
+    "left": (-1.0, 0.0),
+    "right": (1.0, 0.0),
+    "any": (0.0, 0.0),
+}
+
+# Configuração equivalente às linhas fixas antigas do main.py (A = 65%, B = 15%, esteira subindo)
+DEFAULT_CAMERA_CONFIG = {
+    "lines": [
+        {"name": "entrada", "label": " ZONA DE ENTRADA ", "points": [[0.0, 0.65], [1.0, 0.65]],
+         "direction": "up", "count": False, "spawn_margin": 50},
+        {"name": "contagem", "label": " LINHA DE CONTAGEM ", "points": [[0.0, 0.15], [1.0, 0.15]],
+         "direction": "up", "count": True, "requires": ["entrada"]},
+    ],
+    "zones": [],
+}
+
+
+def load_counting_config(path=DEFAULT_CONFIG_PATH, camera=None):
+    """
+    Lê as linhas/zonas da câmera no YAML. Procura a chave da câmera (ex: "0" ou o
+    caminho do vídeo) e cai em "default". Sem arquivo, usa as linhas antigas A/B.
+    """
+    if not path or not os.path.exists(path):
+        return DEFAULT_CAMERA_CONFIG
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    cameras = data.get("cameras", {})
+    if camera is not None and str(camera) in cameras:
+        return cameras[str(camera)]
+    return cameras.get("default", DEFAULT_CAMERA_CONFIG)
+
+
+def _to_pixels(points, width, height):
+    """ Pontos com todos os valores em [0, 1] são normalizados; senão já estão em pixels """
+    pts = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+    if np.all((pts >= 0) & (pts <= 1)):
+        pts = pts * np.array([width, height], dtype=np.float32)
+    return pts
+
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+def segments_cross(p, q, a, b):
+    """
+    Teste vetorizado segmento x segmento: (p[i] -> q[i]) cruza (a -> b)?
+    p, q: (N, 2). a, b: (2,). Intervalo semiaberto no fim do movimento para que
+    um ponto parado exatamente sobre a linha não conte duas vezes.
+    """
+    abx, aby = b[0] - a[0], b[1] - a[1]
+    d1 = _cross(abx, aby, p[:, 0] - a[0], p[:, 1] - a[1])
+    d2 = _cross(abx, aby, q[:, 0] - a[0], q[:, 1] - a[1])
+    pqx, pqy = q[:, 0] - p[:, 0], q[:, 1] - p[:, 1]
+    d3 = _cross(pqx, pqy, a[0] - p[:, 0], a[1] - p[:, 1])
+    d4 = _cross(pqx, pqy, b[0] - p[:, 0], b[1] - p[:, 1])
+    straddle_line = ((d1 < 0) & (d2 >= 0)) | ((d1 > 0) & (d2 <= 0))
+    straddle_move = ((d3 <= 0) & (d4 >= 0)) | ((d3 >= 0) & (d4 <= 0))
+    return straddle_line & straddle_move
+
+
+def points_in_polygon(pts, poly):
+    """ Ray casting vetorizado sobre os pontos; laço apenas sobre as arestas do polígono """
+    x, y = pts[:, 0], pts[:, 1]
+    inside = np.zeros(len(pts), dtype=bool)
+    n = len(poly)
+    for i in range(n):
+        x1, y1 = poly[i]
+        x2, y2 = poly[(i + 1) % n]
+        cond = (y1 > y) != (y2 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x2 - x1) * (y - y1) / (y2 - y1) + x1
+        inside ^= cond & (x < x_cross)
+    return inside
+
+
+def segment_hits_polygon(p, q, poly):
+    """ Movimento p -> q atravessa alguma aresta do polígono? """
+    hit = np.zeros(len(p), dtype=bool)
+    n = len(poly)
+    for i in range(n):
+        hit |= segments_cross(p, q, poly[i], poly[(i + 1) % n])
+    return hit
+
+
+class CountLine:
+    def __init__(self, name, points, direction="any", count=True, requires=None, spawn_margin=0, label=None, color=None):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Sentido inválido na linha '{name}': {direction}")
+        self.name = name
+        self.points = points
+        self.direction = direction
+        self.count = count
+        self.requires = list(requires or [])
+        self.spawn_margin = spawn_margin
+        self.label = label if label is not None else f" {name.upper()} "
+        self.color = tuple(color) if color else None
+        self.a = self.b = None
+
+    def resolve(self, width, height):
+        self.a, self.b = _to_pixels(self.points, width, height)[:2]
+
+    def crossed(self, prev, cur):
+        hit = segments_cross(prev, cur, self.a, self.b)
+        if self.direction != "any":
+            dx, dy = DIRECTIONS[self.direction]
+            hit &= ((cur[:, 0] - prev[:, 0]) * dx + (cur[:, 1] - prev[:, 1]) * dy) > 0
+        return hit
+
+    def armed_on_spawn(self, pts):
+        """ Track que nasce antes da linha (no sentido do fluxo) ou a até `spawn_margin` px dela """
+        if self.direction == "any":
+            return np.zeros(len(pts), dtype=bool)
+        dx, dy = DIRECTIONS[self.direction]
+        # Distância projetada no sentido do fluxo: <= 0 significa "ainda não passou"
+        along = (pts[:, 0] - self.a[0]) * dx + (pts[:, 1] - self.a[1]) * dy
+        return along <= self.spawn_margin
+
+
+class CountZone:
+    def __init__(self, name, points, count=True, requires=None, label=None, color=None):
+        self.name = name
+        self.points = points
+        self.count = count
+        self.requires = list(requires or [])
+        self.label = label if label is not None else f" {name.upper()} "
+        self.color = tuple(color) if color else None
+        self.poly = None
+
+    def resolve(self, width, height):
+        self.poly = _to_pixels(self.points, width, height)
+
+    def entered(self, prev, cur, is_new):
+        inside_prev = points_in_polygon(prev, self.poly)
+        inside_cur = points_in_polygon(cur, self.poly)
+        # Peça rápida pode atravessar a zona inteira entre dois frames
+        passed = ~inside_prev & ~inside_cur & segment_hits_polygon(prev, cur, self.poly)
+        entered = (~inside_prev & inside_cur) | passed | (is_new & inside_cur)
+        return entered, inside_cur
+
+
+class CountingEngine:
+    """
+    Contagem vetorizada por linhas e zonas. Recebe arrays de IDs, centróides e classes
+    do frame atual e compara com a posição anterior de cada track (segmento anterior ->
+    atual), então uma peça que pula a faixa entre dois frames ainda é contada.
+
+    Cada linha/zona ocupa um bit em `crossed`/`counted`; `requires` lista os elementos
+    que o track precisa ter cruzado (ou nascido antes deles) para a contagem valer.
+    """
+
+    def __init__(self, lines, zones, class_names, ttl=120):
+        self.lines = lines
+        self.zones = zones
+        self.elements = list(lines) + list(zones)
+        if len(self.elements) > 63:
+            raise ValueError("Máximo de 63 linhas/zonas por câmera")
+        self.class_names = class_names
+        index = {e.name: i for i, e in enumerate(self.elements)}
+        self._require_masks = []
+        for e in self.elements:
+            mask = 0
+            for req in e.requires:
+                if req not in index:
+                    raise ValueError(f"'{e.name}' exige elemento inexistente: '{req}'")
+                mask |= 1 << index[req]
+            self._require_masks.append(np.int64(mask))
+        self.resolved_shape = None
+        # Estado por track com expiração (mesmo horizonte do track_buffer do rastreador)
+        self.tracks = TrackStore(ttl=ttl)
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config, class_names, ttl=120):
+        lines = [CountLine(**cfg) for cfg in config.get("lines", [])]
+        zones = [CountZone(**cfg) for cfg in config.get("zones", [])]
+        return cls(lines, zones, class_names, ttl=ttl)
+
+    def resolve(self, width, height):
+        """ Converte coordenadas normalizadas para pixels do frame (uma vez por resolução) """
+        if self.resolved_shape == (width, height):
+            return
+        for e in self.elements:
+            e.resolve(width, height)
+        self.resolved_shape = (width, height)
+
+    def reset(self):
+        self.counters = {}
+        self.element_counters = {e.name: {} for e in self.elements}
+        self.zone_occupancy = {z.name: 0 for z in self.zones}
+        self.tracks.clear()
+
+    def checkpoint(self, path):
+        """ Grava tabela de tracks + placar na hora """
+        self.tracks.checkpoint(path, self._checkpoint_extra())
+
+    def snapshot(self):
+        """ Tabela de tracks + placar copiados, para um CheckpointWriter gravar em segundo plano """
+        return self.tracks.snapshot(self._checkpoint_extra())
+
+    def _checkpoint_extra(self):
+        return {"counters": self.counters, "element_counters": self.element_counters}
+
+    def restore(self, path, tracks=False):
+        """
+        Restaura o placar de um checkpoint. Os tracks só são restaurados com `tracks=True`:
+        o rastreador reinicia a numeração de IDs junto com o processo, e um ID novo herdaria
+        as flags de cruzamento/contagem de outra peça.
+        """
+        extra = self.tracks.restore(path, tracks=tracks)
+        if extra is None:
+            return False
+        self.counters = dict(extra.get("counters", {}))
+        for name, per_class in extra.get("element_counters", {}).items():
+            if name in self.element_counters:
+                self.element_counters[name] = dict(per_class)
+        return True
+
+    def update(self, track_ids, centroids, class_ids):
+        """
+        Processa um frame.
+        Retorna (eventos, classes_travadas, contado_em_algum, is_new), onde eventos é a
+        lista de (track_id, class_name, nome_do_elemento) contados neste frame.
+        """
+        ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        cur = np.asarray(centroids, dtype=np.float32).reshape(-1, 2)
+        cls = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        store = self.tracks
+        if len(ids) == 0:
+            for z in self.zones:
+                self.zone_occupancy[z.name] = 0
+            store.tick()
+            return [], cls, np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+
+        slots, is_new = store.lookup(ids)
+
+        # --- CLASSE FIXA: a primeira classe vista para o ID vale até o track expirar ---
+        store.cls[slots[is_new]] = cls[is_new]
+        final_cls = store.cls[slots]
+
+        prev = store.prev[slots]
+        prev[is_new] = cur[is_new]
+        crossed = store.crossed[slots]
+
+        for bit, line in enumerate(self.lines):
+            hit = line.crossed(prev, cur)
+            if not line.count:
+                # Linha de entrada: track que já nasce antes dela também vale (regra MRU antiga)
+                hit |= is_new & line.armed_on_spawn(cur)
+            crossed |= np.where(hit, np.int64(1 << bit), np.int64(0))
+
+        for k, zone in enumerate(self.zones):
+            bit = len(self.lines) + k
+            entered, inside = zone.entered(prev, cur, is_new)
+            crossed |= np.where(entered, np.int64(1 << bit), np.int64(0))
+            self.zone_occupancy[zone.name] = int(inside.sum())
+
+        counted = store.counted[slots]
+        events = []
+        for bit, e in enumerate(self.elements):
+            if not e.count:
+                continue
+            flag = np.int64(1 << bit)
+            req = self._require_masks[bit]
+            ready = ((crossed & flag) != 0) & ((crossed & req) == req) & ((counted & flag) == 0)
+            if not ready.any():
+                continue
+            counted |= np.where(ready, flag, np.int64(0))
+            per_element = self.element_counters[e.name]
+            for i in np.flatnonzero(ready):
+                class_name = self.class_names[int(final_cls[i])]
+                self.counters[class_name] = self.counters.get(class_name, 0) + 1
+                per_element[class_name] = per_element.get(class_name, 0) + 1
+                events.append((int(ids[i]), class_name, e.name))
+
+        store.crossed[slots] = crossed
+        store.counted[slots] = counted
+        store.prev[slots] = cur
+        store.touch(slots)
+        store.tick()
+        return events, final_cls, counted != 0, is_new
+
+    @property
+    def active_tracks(self):
+        return self.tracks.size
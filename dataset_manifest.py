@@ -0,0 +1,384 @@
+import os
+import time
+import sqlite3
+import argparse
+from collections import defaultdict
+import cv2
+from json2yolo import file_hash
+
+# Manifesto do dataset em SQLite: uma linha por imagem com hash, tamanho, status do
+# rótulo, origem do rótulo e split. As ferramentas (capture_data, auto_label, json2yolo,
+# train_wrapper) atualizam só o que mexeram; `sync` reconcilia com a pasta usando
+# apenas stat e só olha o que mudou desde a varredura anterior (hash só de arquivo novo ou alterado).
+
+MANIFEST_NAME = "manifest.sqlite"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+# Status do rótulo
+UNLABELED = "unlabeled"  # sem JSON do Labelme
+LABELED = "labeled"      # JSON sem .txt atualizado (falta rodar o json2yolo)
+CONVERTED = "converted"  # .txt YOLO gerado a partir do JSON atual
+
+# Origem do rótulo
+SOURCE_MANUAL = "manual"
+SOURCE_AUTO = "auto"    # pré-rotulagem do auto_label; vira manual quando o JSON é editado no Labelme
+
+# Filtro SQL dos rótulos revisados (fora do treino ficam as pré-rotulagens ainda não abertas)
+REVIEWED = f"(label_source IS NULL OR label_source != '{SOURCE_AUTO}')"
+
+# Fração das imagens que vai para validação
+VAL_FRACTION = 0.1
+
+# Folga da marca d'água do sync: resolução de mtime do sistema de arquivos (FAT: 2 s)
+SCAN_MARGIN_NS = 2_000_000_000
+
+# Tamanho máximo do subconjunto de validação rápida (usado a cada época)
+QUICK_VAL_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    sha1 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    label_status TEXT NOT NULL DEFAULT 'unlabeled',
+    label_source TEXT,
+    json_sha1 TEXT,
+    json_mtime_ns INTEGER,
+    txt_mtime_ns INTEGER,
+    stratum TEXT,
+    split TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_status ON images (label_status, split);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+
+def hash_fraction(sha1, offset=0):
+    """ Número em [0, 1) tirado do hash: estável para a mesma imagem em qualquer execução """
+    return int(sha1[offset:offset + 8], 16) / 2 ** 32
+
+
+def assign_split(sha1, val_fraction=VAL_FRACTION):
+    """ Split determinístico pelo hash do conteúdo: a mesma imagem cai sempre no mesmo lado """
+    return "val" if hash_fraction(sha1) < val_fraction else "train"
+
+
+def stratum_of(txt_path):
+    """ Estrato de uma imagem rotulada: classes presentes + faixa de quantidade de objetos """
+    classes = set()
+    n = 0
+    with open(txt_path, "r") as f:
+        for line in f:
+            parts = line.split(maxsplit=1)
+            if parts:
+                classes.add(int(parts[0]))
+                n += 1
+    if n == 0:
+        return "fundo"
+    bucket = "1" if n == 1 else "2-3" if n <= 3 else "4+"
+    return "-".join(map(str, sorted(classes))) + ":" + bucket
+
+
+class DatasetManifest:
+    """ Manifesto SQLite de uma pasta de dataset plana (imagem, .json e .txt lado a lado) """
+
+    def __init__(self, dataset_dir, db_path=None):
+        self.dataset_dir = dataset_dir
+        os.makedirs(dataset_dir, exist_ok=True)
+        self.db_path = db_path or os.path.join(dataset_dir, MANIFEST_NAME)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        # WAL: leitura de uma ferramenta não trava a escrita de outra
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(images)")}
+        if "stratum" not in columns:
+            # Manifesto criado antes do split estratificado
+            self.conn.execute("ALTER TABLE images ADD COLUMN stratum TEXT")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _path(self, name, ext=None):
+        if ext is not None:
+            name = os.path.splitext(name)[0] + ext
+        return os.path.join(self.dataset_dir, name)
+
+    # --- Atualizações pontuais (cada ferramenta registra o que gravou) ---
+
+    def add_image(self, path, shape=None, sha1=None):
+        """ Registra (ou atualiza) uma imagem recém-gravada. `shape` evita reabrir a imagem. """
+        with self.conn:
+            self._upsert_image(path, shape, sha1)
+
+    def _upsert_image(self, path, shape=None, sha1=None):
+        name = os.path.basename(path)
+        st = os.stat(path)
+        sha1 = sha1 or file_hash(path)
+        if shape is None:
+            img = cv2.imread(path)
+            shape = img.shape if img is not None else (None, None)
+        self.conn.execute(
+            """INSERT INTO images (name, sha1, size, mtime_ns, width, height, split, added_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET sha1=excluded.sha1, size=excluded.size,
+                   mtime_ns=excluded.mtime_ns, width=excluded.width, height=excluded.height""",
+            (name, sha1, st.st_size, st.st_mtime_ns, shape[1], shape[0], assign_split(sha1), time.time()))
+
+    def mark_labeled(self, image_name, source):
+        """ JSON do Labelme gravado para a imagem (pelo auto_label ou por quem chamar); aceita nome ou caminho """
+        name = os.path.basename(image_name)
+        json_path = self._path(name, ".json")
+        st = os.stat(json_path)
+        with self.conn:
+            self.conn.execute(
+                """UPDATE images SET label_status=?, label_source=?, json_sha1=?, json_mtime_ns=?, txt_mtime_ns=NULL
+                   WHERE name=?""",
+                (LABELED, source, file_hash(json_path), st.st_mtime_ns, name))
+
+    def mark_converted(self, json_names):
+        """ .txt gerado pelo json2yolo para estes JSON (a imagem é a de mesmo nome, qualquer extensão/caixa) """
+        # Nome gravado pelo sync, com a extensão como está no disco (.JPG, .Png...)
+        images = {os.path.splitext(name)[0]: name for name in self.names()}
+        rows = []
+        for json_name in json_names:
+            stem = os.path.splitext(os.path.basename(json_name))[0]
+            txt_path = self._path(stem + ".txt")
+            if stem in images and os.path.exists(txt_path):
+                rows.append((os.stat(txt_path).st_mtime_ns, stratum_of(txt_path), images[stem]))
+        with self.conn:
+            self.conn.executemany(
+                f"""UPDATE images SET label_status='{CONVERTED}', txt_mtime_ns=?, stratum=?
+                    WHERE name=? AND label_status != '{UNLABELED}'""",
+                rows)
+
+    # --- Reconciliação com a pasta ---
+
+    def sync(self, full=False):
+        """
+        Reconcilia o manifesto com a pasta: registra imagens novas ou alteradas, remove as
+        apagadas e atualiza status/origem dos rótulos editados fora das ferramentas (Labelme).
+        Retorna contadores do que mudou.
+
+        Incremental: uma listagem (os.scandir; no Windows o stat vem junto) e só as entradas
+        com mtime/ctime depois da marca d'água da última varredura são comparadas com o banco.
+        Arquivo criado ou apagado muda o mtime da pasta; só então a presença de imagem/JSON/.txt
+        é conferida contra todas as linhas. `full` compara tudo (arquivos restaurados com mtime antigo).
+        """
+        scan_ns = time.time_ns()
+        dir_mtime = os.stat(self.dataset_dir).st_mtime_ns
+        watermark = None if full else self._meta("scan_ns")
+        if watermark is not None:
+            watermark -= SCAN_MARGIN_NS
+        dir_changed = watermark is None or self._meta("dir_mtime_ns") != dir_mtime
+
+        images, jsons, txts = {}, {}, {}
+        candidates = set()
+        with os.scandir(self.dataset_dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                ext = ext.lower()
+                if ext in IMAGE_EXTS:
+                    target = images
+                    key = entry.name
+                elif ext in (".json", ".txt"):
+                    target = jsons if ext == ".json" else txts
+                    key = stem
+                else:
+                    continue
+                st = entry.stat()
+                target[key] = st
+                if watermark is None or max(st.st_mtime_ns, st.st_ctime_ns) >= watermark:
+                    candidates.add(key if target is images else stem)
+
+        # Stems de JSON/.txt novos apontam para a imagem de mesmo nome
+        stems = {os.path.splitext(name)[0]: name for name in images}
+        candidates = {stems.get(c, c) for c in candidates if c in images or c in stems}
+
+        stats = {"added": 0, "updated": 0, "removed": 0, "labels": 0}
+        with self.conn:
+            if dir_changed:
+                removed = []
+                for name, has_json, has_txt in self.conn.execute(
+                        "SELECT name, json_mtime_ns IS NOT NULL, txt_mtime_ns IS NOT NULL FROM images").fetchall():
+                    if name not in images:
+                        removed.append(name)
+                        continue
+                    stem = os.path.splitext(name)[0]
+                    if bool(has_json) != (stem in jsons) or bool(has_txt) != (stem in txts):
+                        candidates.add(name)
+                self.conn.executemany("DELETE FROM images WHERE name=?", [(n,) for n in removed])
+                stats["removed"] = len(removed)
+
+            for name in sorted(candidates):
+                self._sync_image(name, images[name], jsons.get(os.path.splitext(name)[0]),
+                                 txts.get(os.path.splitext(name)[0]), stats)
+
+            self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                  [("scan_ns", scan_ns), ("dir_mtime_ns", dir_mtime)])
+        return stats
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _sync_image(self, name, st, json_st, txt_st, stats):
+        """ Compara uma imagem (e o JSON/.txt de mesmo nome) com a linha dela no manifesto """
+        row = self.conn.execute("SELECT * FROM images WHERE name=?", (name,)).fetchone()
+        if row is None or row["size"] != st.st_size or row["mtime_ns"] != st.st_mtime_ns:
+            self._upsert_image(self._path(name))
+            stats["added" if row is None else "updated"] += 1
+            row = self.conn.execute("SELECT * FROM images WHERE name=?", (name,)).fetchone()
+
+        status, source, json_sha1 = row["label_status"], row["label_source"], row["json_sha1"]
+        json_mtime = json_st.st_mtime_ns if json_st else None
+        txt_mtime = txt_st.st_mtime_ns if txt_st else None
+
+        if json_st is None:
+            status, source, json_sha1 = UNLABELED, None, None
+        elif json_mtime != row["json_mtime_ns"]:
+            # JSON criado/editado fora do auto_label: rótulo revisado por alguém
+            digest = file_hash(self._path(name, ".json"))
+            if digest != json_sha1:
+                source = SOURCE_MANUAL
+            json_sha1 = digest
+        if json_st is not None:
+            status = CONVERTED if txt_mtime is not None and txt_mtime >= json_mtime else LABELED
+        stratum = row["stratum"]
+        if status != CONVERTED:
+            stratum = None
+        elif txt_mtime != row["txt_mtime_ns"] or stratum is None:
+            stratum = stratum_of(self._path(name, ".txt"))
+
+        if (status, source, json_sha1, json_mtime, txt_mtime, stratum) != (
+                row["label_status"], row["label_source"], row["json_sha1"], row["json_mtime_ns"],
+                row["txt_mtime_ns"], row["stratum"]):
+            self.conn.execute(
+                """UPDATE images SET label_status=?, label_source=?, json_sha1=?, json_mtime_ns=?, txt_mtime_ns=?,
+                       stratum=? WHERE name=?""",
+                (status, source, json_sha1, json_mtime, txt_mtime, stratum, name))
+            stats["labels"] += 1
+
+    # --- Consultas ---
+
+    def names(self, status=None, split=None, include_auto=True, source=None):
+        query, params = "SELECT name FROM images WHERE 1=1", []
+        if not include_auto:
+            query += f" AND {REVIEWED}"
+        if source is not None:
+            query += " AND label_source=?"
+            params.append(source)
+        if status is not None:
+            query += " AND label_status=?"
+            params.append(status)
+        if split is not None:
+            query += " AND split=?"
+            params.append(split)
+        return [row[0] for row in self.conn.execute(query + " ORDER BY name", params)]
+
+    def summary(self):
+        rows = self.conn.execute(
+            "SELECT label_status, label_source, split, COUNT(*) FROM images GROUP BY label_status, label_source, split")
+        return [tuple(row) for row in rows]
+
+    def assign_splits(self, val_fraction=VAL_FRACTION, include_auto=False):
+        """
+        Split estratificado e determinístico das imagens convertidas.
+
+        Dentro de cada estrato (classes + quantidade de objetos) vai para validação quem
+        tem hash abaixo de `val_fraction`: uma imagem nunca troca de lado quando chegam
+        imagens novas. Estrato com tamanho para ter ao menos uma imagem de validação e
+        que ficou sem nenhuma recebe a de menor hash.
+        Sem `include_auto`, pré-rotulagens não revisadas ficam de fora.
+        Retorna {estrato: (treino, validação)}.
+        """
+        strata = defaultdict(list)
+        query = f"SELECT name, sha1, stratum FROM images WHERE label_status='{CONVERTED}'"
+        if not include_auto:
+            query += f" AND {REVIEWED}"
+        for row in self.conn.execute(query):
+            strata[row["stratum"] or "?"].append((hash_fraction(row["sha1"]), row["name"]))
+
+        updates = []
+        counts = {}
+        for stratum, members in strata.items():
+            val = {name for frac, name in members if frac < val_fraction}
+            if not val and len(members) >= 1 / val_fraction:
+                val.add(min(members)[1])
+            updates.extend(("val" if name in val else "train", name) for _, name in members)
+            counts[stratum] = (len(members) - len(val), len(val))
+        with self.conn:
+            self.conn.executemany("UPDATE images SET split=? WHERE name=?", updates)
+        return counts
+
+    def quick_val_names(self, size=QUICK_VAL_SIZE, include_auto=False):
+        """
+        Subconjunto fixo da validação para as épocas intermediárias: até `size` imagens,
+        tiradas em rodízio dos estratos (ordem por um segundo trecho do hash).
+        """
+        strata = defaultdict(list)
+        query = f"SELECT name, sha1, stratum FROM images WHERE label_status='{CONVERTED}' AND split='val'"
+        if not include_auto:
+            query += f" AND {REVIEWED}"
+        for row in self.conn.execute(query):
+            strata[row["stratum"] or "?"].append((hash_fraction(row["sha1"], 8), row["name"]))
+        queues = [sorted(members, reverse=True) for _, members in sorted(strata.items())]
+        picked = []
+        while queues and len(picked) < size:
+            for queue in queues:
+                if queue and len(picked) < size:
+                    picked.append(queue.pop()[1])
+            queues = [q for q in queues if q]
+        return sorted(picked)
+
+    def write_split_lists(self, output_dir=None, quick_val_size=QUICK_VAL_SIZE, include_auto=False):
+        """ train.txt / val.txt / quick_val.txt com os caminhos absolutos das imagens já convertidas (e revisadas) """
+        output_dir = output_dir or self.dataset_dir
+        lists = {
+            "train": self.names(status=CONVERTED, split="train", include_auto=include_auto),
+            "val": self.names(status=CONVERTED, split="val", include_auto=include_auto),
+            "quick_val": self.quick_val_names(quick_val_size, include_auto),
+        }
+        paths = {}
+        for split, names in lists.items():
+            path = os.path.join(output_dir, f"{split}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(os.path.abspath(self._path(n)) + "\n" for n in names)
+            paths[split] = (path, len(names))
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manifesto SQLite do dataset")
+    parser.add_argument("--dataset", type=str, default="dataset", help="Pasta do dataset")
+    parser.add_argument("--no-sync", action="store_true", help="Só mostra o resumo, sem reconciliar com a pasta")
+    parser.add_argument("--full-sync", action="store_true",
+                        help="Compara todos os arquivos, não só os alterados desde a última sincronização")
+    args = parser.parse_args()
+
+    with DatasetManifest(args.dataset) as manifest:
+        if not args.no_sync:
+            t0 = time.perf_counter()
+            stats = manifest.sync(full=args.full_sync)
+            print(f"Sincronizado em {time.perf_counter() - t0:.2f}s: {stats}")
+        for status, source, split, n in manifest.summary():
+            print(f"  {status:<10} {source or '-':<7} {split:<5} {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import os
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import yaml
+from counting import DEFAULT_CONFIG_PATH
+
+# Diário de contagens em SQLite (WAL): cada contagem vira uma linha (hora, fonte, classe,
+# track, linha/zona, confiança, área) e a tabela `hourly` é somada na mesma transação,
+# então um mês de consulta por hora/turno lê ~720 linhas por fonte e classe.
+# Quem conta só enfileira; uma thread grava em lotes. Numa queda perde-se no máximo o
+# lote ainda não gravado (FLUSH_INTERVAL_S) e a recuperação do WAL na abertura é curta,
+# porque o checkpoint automático mantém o arquivo -wal pequeno.
+
+DEFAULT_JOURNAL_PATH = os.path.join("state", "eventos.sqlite")
+
+# Lote máximo por transação e espera máxima antes de gravar um lote incompleto
+BATCH_SIZE = 500
+FLUSH_INTERVAL_S = 0.5
+
+# Contagens aguardando gravação antes de descartar (disco travado não trava a esteira)
+MAX_PENDING = 100_000
+
+# Turnos padrão (hora local, horas cheias); sobrescritos por `shifts:` no counting.yaml
+DEFAULT_SHIFTS = [
+    {"name": "A", "start": 6, "end": 14},
+    {"name": "B", "start": 14, "end": 22},
+    {"name": "C", "start": 22, "end": 6},
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    class TEXT NOT NULL,
+    track_id INTEGER,
+    element TEXT,
+    confidence REAL,
+    area_px INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS events_source_ts ON events (source, ts);
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    class TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, source, class)
+) WITHOUT ROWID;
+"""
+
+INSERT_EVENT = """INSERT INTO events (ts, source, class, track_id, element, confidence, area_px)
+                  VALUES (?, ?, ?, ?, ?, ?, ?)"""
+UPSERT_HOURLY = """INSERT INTO hourly (hour, source, class, count) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(hour, source, class) DO UPDATE SET count = count + excluded.count"""
+
+
+def connect(path=DEFAULT_JOURNAL_PATH, synchronous="NORMAL"):
+    """ Conexão de escrita: WAL, cria as tabelas. NORMAL sobrevive à queda do processo; FULL também à de energia. """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def open_reader(path=DEFAULT_JOURNAL_PATH):
+    """ Conexão de leitura (app.py); None se o diário ainda não existe """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path, timeout=5)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class EventJournal:
+    """
+    Gravação em segundo plano. `append` roda no laço quente (thread de inferência) e só
+    enfileira; a thread "diario-contagens" junta até BATCH_SIZE contagens ou
+    FLUSH_INTERVAL_S segundos e grava tudo numa transação (eventos + soma por hora).
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL_S,
+                 max_pending=MAX_PENDING, synchronous="NORMAL"):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        # Abre aqui para falhar cedo (caminho inválido, banco corrompido)
+        connect(path, synchronous).close()
+        self._thread = threading.Thread(target=self._run, name="diario-contagens", daemon=True)
+        self._thread.start()
+
+    def append(self, source, events, timestamp=None):
+        """ Contagens de um frame (packet["events"]); nunca espera o disco """
+        ts = timestamp or time.time()
+        for e in events:
+            try:
+                self.queue.put_nowait((ts, str(source), e["class"], e.get("track_id"), e.get("element"),
+                                       e.get("confidence"), e.get("area_px")))
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        conn = connect(self.path, self.synchronous)
+        try:
+            stop = False
+            while not stop:
+                item = self.queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        hourly = Counter((int(ts // 3600 * 3600), source, class_name) for ts, source, class_name, *_ in batch)
+        try:
+            with conn:
+                conn.executemany(INSERT_EVENT, batch)
+                conn.executemany(UPSERT_HOURLY, [(*key, n) for key, n in hourly.items()])
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.errors += len(batch)
+            self.last_error = str(e)
+            print(f"Erro gravando o diário de contagens: {e}")
+
+    def metrics(self):
+        return {"written": self.written, "pending": self.queue.qsize(), "dropped": self.dropped, "errors": self.errors}
+
+    def close(self):
+        """ Grava o que está na fila e encerra a thread """
+        self.queue.put(None)
+        self._thread.join()
+
+
+# --- Consultas (app.py / linha de comando) ---
+
+def load_shifts(path=DEFAULT_CONFIG_PATH):
+    """ `shifts:` do counting.yaml ([{name, start: "06:00", end: "14:00"}]); horas cheias """
+    if not os.path.exists(path):
+        return DEFAULT_SHIFTS
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    shifts = []
+    for cfg in data.get("shifts") or []:
+        bounds = []
+        for key in ("start", "end"):
+            hour, _, minute = str(cfg[key]).partition(":")
+            if minute.strip("0"):
+                raise ValueError(f"Turno {cfg['name']}: {key} '{cfg[key]}' precisa ser hora cheia (o diário soma por hora)")
+            bounds.append(int(hour) % 24)
+        shifts.append({"name": str(cfg["name"]), "start": bounds[0], "end": bounds[1]})
+    return shifts or DEFAULT_SHIFTS
+
+
+def shift_of(hour_ts, shifts):
+    """ (data do turno, nome) da hora local que começa em `hour_ts`; turno da madrugada fica no dia em que começou """
+    dt = datetime.fromtimestamp(hour_ts)
+    h = dt.hour
+    for s in shifts:
+        start, end = s["start"], s["end"]
+        if start < end and start <= h < end:
+            return dt.date(), s["name"]
+        if start >= end and (h >= start or h < end):
+            return (dt.date() if h >= start else dt.date() - timedelta(days=1)), s["name"]
+    return dt.date(), None
+
+
+def hourly_counts(conn, since, until, source=None):
+    """ Linhas (hour, source, class, count) com hora em [since, until): varredura pela chave da tabela horária """
+    sql = "SELECT hour, source, class, count FROM hourly WHERE hour >= ? AND hour < ?"
+    params = [int(since // 3600 * 3600), until]
+    if source is not None:
+        sql += " AND source = ?"
+        params.append(str(source))
+    return conn.execute(sql + " ORDER BY hour, source, class", params).fetchall()
+
+
+def shift_counts(conn, since, until, shifts=None, source=None):
+    """ [{date, shift, counts: {classe: n}, total}] somando a tabela horária """
+    shifts = shifts or DEFAULT_SHIFTS
+    totals = {}
+    for hour, _, class_name, count in hourly_counts(conn, since, until, source):
+        day, name = shift_of(hour, shifts)
+        counts = totals.setdefault((day.isoformat(), name or "-"), {})
+        counts[class_name] = counts.get(class_name, 0) + count
+    return [{"date": day, "shift": name, "counts": counts, "total": sum(counts.values())}
+            for (day, name), counts in sorted(totals.items())]
+
+
+def recent_events(conn, limit=100, source=None):
+    """ Últimas contagens (mais nova primeiro), pelo índice de ts """
+    sql = "SELECT ts, source, class, track_id, element, confidence, area_px FROM events"
+    params = []
+    if source is not None:
+        sql += " WHERE source = ?"
+        params.append(str(source))
+    return conn.execute(sql + " ORDER BY ts DESC LIMIT ?", [*params, limit]).fetchall()
+
+
+def rebuild_hourly(conn):
+    """ Refaz a soma por hora a partir dos eventos (reparo manual; normalmente nunca diverge) """
+    with conn:
+        conn.execute("DELETE FROM hourly")
+        conn.execute("""INSERT INTO hourly (hour, source, class, count)
+                        SELECT CAST(ts / 3600 AS INTEGER) * 3600, source, class, COUNT(*) FROM events
+                        GROUP BY 1, 2, 3""")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumo do diário de contagens")
+    parser.add_argument("--journal", type=str, default=DEFAULT_JOURNAL_PATH)
+    parser.add_argument("--days", type=float, default=1, help="Período (dias até agora)")
+    parser.add_argument("--source", type=str, default=None)
+    parser.add_argument("--config", type=str, default=DEFAULT_CONFIG_PATH, help="YAML com os turnos (shifts:)")
+    parser.add_argument("--rebuild-hourly", action="store_true", help="Recalcula a tabela horária a partir dos eventos")
+    args = parser.parse_args()
+
+    conn = open_reader(args.journal)
+    if conn is None:
+        print(f"Diário não encontrado: {args.journal}")
+        return
+    if args.rebuild_hourly:
+        rebuild_hourly(conn)
+        print("Tabela horária recalculada.")
+
+    until = time.time()
+    since = until - args.days * 86400
+    t0 = time.perf_counter()
+    shifts = shift_counts(conn, since, until, load_shifts(args.config), args.source)
+    elapsed = (time.perf_counter() - t0) * 1000
+    for row in shifts:
+        print(f"{row['date']} turno {row['shift']}: {row['total']:>6} | {row['counts']}")
+    print(f"{len(shifts)} turnos em {elapsed:.1f} ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import os
+import re
+import glob
+import json
+import time
+import queue
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+# Evidência de contagem: os últimos segundos de cada fonte ficam na memória em JPEG
+# (reduzidos), e cada contagem (ou pedido do painel) vira um clipe curto com o antes e o
+# depois do evento. Duas threads por fonte, nenhuma no caminho da inferência:
+#   "evidencia-buffer": comprime os frames que a captura entrega e monta os clipes;
+#   "evidencia-video":  decodifica os JPEG e grava o .mp4, depois aplica cota e retenção.
+# Contagens próximas caem no mesmo clipe (até MAX_CLIP_S).
+
+DEFAULT_EVIDENCE_DIR = os.path.join("state", "evidencias")
+
+# Pedido do painel (app.py): {"ts", "source", "label"}; cada gravação nova do arquivo vale um clipe
+REQUEST_FILE = "pedido.json"
+REQUEST_POLL_S = 0.5
+
+MAX_CLIP_S = 60
+# Clipes fechados esperando o codificador; acima disso o clipe novo é descartado (RAM limitada)
+MAX_ENCODE_BACKLOG = 8
+# Fonte parada/encerrada: fecha o clipe este tempo depois do fim previsto, mesmo sem frames novos
+CLOSE_GRACE_S = 2.0
+
+
+class FrameRing:
+    """ Frames JPEG (timestamp, bytes) dos últimos `seconds`, limitados também a `max_bytes` """
+
+    def __init__(self, seconds, max_bytes):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.nbytes = 0
+
+    def push(self, ts, data):
+        self.frames.append((ts, data))
+        self.nbytes += len(data)
+        while self.frames and (ts - self.frames[0][0] > self.seconds or self.nbytes > self.max_bytes):
+            self.nbytes -= len(self.frames.popleft()[1])
+
+    def since(self, ts):
+        return [f for f in self.frames if f[0] >= ts]
+
+    def span(self):
+        return self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0.0
+
+
+def enforce_quota(out_dir, quota_bytes, retention_s, now=None):
+    """ Apaga clipes do mais velho para o mais novo até caber na cota e na retenção; devolve (bytes em disco, apagados) """
+    now = now or time.time()
+    clips = []
+    for path in glob.glob(os.path.join(out_dir, "*.mp4")):
+        if path.endswith(".parcial.mp4"):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        clips.append((st.st_mtime, st.st_size, path))
+    clips.sort()
+    total = sum(size for _, size, _ in clips)
+    removed = 0
+    for mtime, size, path in clips:
+        if total <= quota_bytes and now - mtime <= retention_s:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return total, removed
+
+
+class EvidenceRecorder:
+    """
+    Buffer de pré-evento + gravador de clipes de uma fonte. `offer` é o tap do
+    FrameGrabber (copia o frame e enfileira sem esperar; fila cheia = frame fora do
+    buffer), `trigger` abre um clipe [ts - pre_s, ts + post_s].
+    """
+
+    def __init__(self, source, out_dir=DEFAULT_EVIDENCE_DIR, pre_s=10.0, post_s=5.0, scale=0.5, quality=75,
+                 max_buffer_mb=64, quota_mb=2048, retention_days=7, max_clip_s=MAX_CLIP_S):
+        self.source = source
+        self.out_dir = out_dir
+        self.pre_s = pre_s
+        self.post_s = post_s
+        self.scale = scale
+        self.quality = int(quality)
+        self.max_clip_s = max(max_clip_s, pre_s + post_s)
+        self.quota_bytes = int(quota_mb * 1024 * 1024)
+        self.retention_s = retention_days * 86400
+        os.makedirs(out_dir, exist_ok=True)
+
+        # Folga de 2 s: a contagem chega com o atraso da inferência em relação à captura
+        self.ring = FrameRing(pre_s + 2, int(max_buffer_mb * 1024 * 1024))
+        self.clips = []
+        self.frames_in = queue.Queue(maxsize=8)
+        self.triggers = queue.Queue()
+        self.encode_queue = queue.Queue()
+        self.frames_dropped = 0
+        self.clips_written = 0
+        self.clips_dropped = 0
+        self.clips_evicted = 0
+        self.disk_bytes, _ = enforce_quota(out_dir, self.quota_bytes, self.retention_s)
+        self.last_clip = None
+        self._latest_ts = 0.0
+        self._request_path = os.path.join(out_dir, REQUEST_FILE)
+        self._request_mtime = self._mtime(self._request_path)
+        self._stop = threading.Event()
+        self._buffer_thread = threading.Thread(target=self._buffer_loop, name="evidencia-buffer", daemon=True)
+        self._encoder_thread = threading.Thread(target=self._encoder_loop, name="evidencia-video", daemon=True)
+        self._buffer_thread.start()
+        self._encoder_thread.start()
+
+    # --- Chamados pelas threads da esteira ---
+
+    def offer(self, idx, ts, frame):
+        """ Tap da captura: a cópia evita o desenho do render no mesmo array """
+        if self.frames_in.full():
+            self.frames_dropped += 1
+            return
+        try:
+            self.frames_in.put_nowait((ts, frame.copy()))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def trigger(self, ts=None, label="manual"):
+        self.triggers.put((ts or time.time(), label))
+
+    # --- Thread do buffer ---
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _poll_request(self):
+        mtime = self._mtime(self._request_path)
+        if mtime is None or mtime == self._request_mtime:
+            return
+        self._request_mtime = mtime
+        try:
+            with open(self._request_path, "r", encoding="utf-8") as f:
+                request = json.load(f)
+        except (OSError, ValueError):
+            return
+        if request.get("source") in (None, "", str(self.source)):
+            self.trigger(request.get("ts"), request.get("label") or "manual")
+
+    def _compress(self, frame):
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return data.tobytes() if ok else None
+
+    def _open(self, ts, label):
+        last = self.clips[-1] if self.clips else None
+        if last is not None and ts <= last["end"] and ts + self.post_s - last["start"] <= self.max_clip_s:
+            last["end"] = max(last["end"], ts + self.post_s)
+            last["labels"].append(label)
+            return
+        start, end = ts - self.pre_s, ts + self.post_s
+        self.clips.append({"event": ts, "start": start, "end": end, "labels": [label],
+                           "frames": [f for f in self.ring.since(start) if f[0] <= end]})
+
+    def _close_ready(self, flush=False):
+        now = time.time()
+        ready = [c for c in self.clips
+                 if flush or self._latest_ts > c["end"] or now > c["end"] + CLOSE_GRACE_S]
+        for clip in ready:
+            self.clips.remove(clip)
+            if self.encode_queue.qsize() >= MAX_ENCODE_BACKLOG:
+                self.clips_dropped += 1
+            else:
+                self.encode_queue.put(clip)
+
+    def _buffer_loop(self):
+        last_poll = 0.0
+        while not self._stop.is_set():
+            # Pedidos antes do frame: um clipe estendido agora ainda recebe este frame
+            if time.monotonic() - last_poll >= REQUEST_POLL_S:
+                self._poll_request()
+                last_poll = time.monotonic()
+            while True:
+                try:
+                    self._open(*self.triggers.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                ts, frame = self.frames_in.get(timeout=0.1)
+                data = self._compress(frame)
+                if data is not None:
+                    self._latest_ts = ts
+                    self.ring.push(ts, data)
+                    for clip in self.clips:
+                        if clip["start"] <= ts <= clip["end"]:
+                            clip["frames"].append((ts, data))
+            except queue.Empty:
+                pass
+            self._close_ready()
+        # Encerrando: o que estiver aberto sai com os frames que já tem
+        while True:
+            try:
+                self._open(*self.triggers.get_nowait())
+            except queue.Empty:
+                break
+        self._close_ready(flush=True)
+
+    # --- Thread do codificador ---
+
+    def _clip_path(self, clip):
+        """ Nome com a hora do evento em milissegundos; sufixo _2, _3... se ainda assim já existir """
+        ts = clip["event"]
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(ts)) + f"_{int(ts * 1000) % 1000:03d}"
+        labels = sorted(set(clip["labels"]))
+        label = labels[0] if len(labels) == 1 else f"{len(clip['labels'])}_eventos"
+        name = re.sub(r"[^\w.-]+", "-", f"{stamp}_{self.source}_{label}").strip("-")
+        path = os.path.join(self.out_dir, name + ".mp4")
+        seq = 1
+        while os.path.exists(path):
+            seq += 1
+            path = os.path.join(self.out_dir, f"{name}_{seq}.mp4")
+        return path
+
+    def write_clip(self, clip):
+        """ JPEG -> .mp4 (mp4v) com a hora de cada frame; escreve em .parcial.mp4 e renomeia """
+        frames = clip["frames"]
+        if len(frames) < 2:
+            return None
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        height, width = first.shape[:2]
+        fps = (len(frames) - 1) / max(frames[-1][0] - frames[0][0], 1e-3)
+        path = self._clip_path(clip)
+        partial = path[:-4] + ".parcial.mp4"
+        writer = cv2.VideoWriter(partial, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+        if not writer.isOpened():
+            raise RuntimeError(f"VideoWriter não abriu {partial}")
+        try:
+            for ts, data in frames:
+                img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) + f".{int(ts * 1000) % 1000:03d}"
+                cv2.putText(img, stamp, (8, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3, cv2.LINE_AA)
+                cv2.putText(img, stamp, (8, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+                writer.write(img)
+        finally:
+            writer.release()
+        os.replace(partial, path)
+        return path
+
+    def _encoder_loop(self):
+        while True:
+            clip = self.encode_queue.get()
+            if clip is None:
+                break
+            try:
+                path = self.write_clip(clip)
+            except Exception as e:
+                print(f"Erro gravando clipe de evidência: {e}")
+                continue
+            if path is None:
+                continue
+            self.clips_written += 1
+            self.last_clip = path
+            self.disk_bytes, evicted = enforce_quota(self.out_dir, self.quota_bytes, self.retention_s)
+            self.clips_evicted += evicted
+
+    def metrics(self):
+        return {
+            "buffer_frames": len(self.ring.frames),
+            "buffer_bytes": self.ring.nbytes,
+            "buffer_seconds": round(self.ring.span(), 2),
+            "open_clips": len(self.clips),
+            "encode_backlog": self.encode_queue.qsize(),
+            "frames_dropped": self.frames_dropped,
+            "clips_written": self.clips_written,
+            "clips_dropped": self.clips_dropped,
+            "clips_evicted": self.clips_evicted,
+            "disk_bytes": self.disk_bytes,
+        }
+
+    def close(self):
+        """ Fecha os clipes abertos com o que já têm e espera o codificador terminar """
+        self._stop.set()
+        self._buffer_thread.join()
+        self.encode_queue.put(None)
+        self._encoder_thread.join()
+
+
+def request_clip(out_dir=DEFAULT_EVIDENCE_DIR, source=None, label="manual"):
+    """ Pedido de clipe agora (app.py): os gravadores de main.py veem a mudança do arquivo """
+    os.makedirs(out_dir, exist_ok=True)
+    request = {"ts": time.time(), "source": source, "label": label}
+    tmp = os.path.join(out_dir, REQUEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(request, f)
+    os.replace(tmp, os.path.join(out_dir, REQUEST_FILE))
+    return request
+
+
+def list_clips(out_dir=DEFAULT_EVIDENCE_DIR, limit=50):
+    """ Clipes gravados, mais novo primeiro """
+    clips = []
+    for path in glob.glob(os.path.join(out_dir, "*.mp4")):
+        if path.endswith(".parcial.mp4"):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        clips.append({"name": os.path.basename(path), "bytes": st.st_size, "mtime": st.st_mtime})
+    clips.sort(key=lambda c: c["mtime"], reverse=True)
+    return clips[:limit]
@@ -1,86 +1,242 @@
 import json
 import os
 import glob
-from collections import defaultdict
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
-def convert_labelme_json_to_yolo(json_dir, output_dir, class_map=None):
+# Manifesto da última conversão (na pasta de saída): JSON -> mtime/tamanho/hash
+MANIFEST_NAME = ".json2yolo_manifest.json"
+
+# Abaixo disso o custo de subir o pool de processos não compensa
+MIN_FILES_FOR_POOL = 32
+
+# Marca do auto_label.py no JSON: hash dos polígonos como saíram da pré-rotulagem. O Labelme
+# mantém chaves extras ao salvar, então polígono editado = hash diferente = rótulo revisado
+AUTO_LABEL_KEY = "autoLabel"
+
+
+def load_class_map(json_dir, class_map=None):
+    if class_map is not None:
+        return class_map
+    # Try to find classes.txt
+    classes_path = os.path.join(json_dir, "classes.txt")
+    if os.path.exists(classes_path):
+        with open(classes_path, "r") as f:
+            classes = [line.strip() for line in f.readlines() if line.strip()]
+            return {name: i for i, name in enumerate(classes)}
+    # Fallback A: Default "peca" if user only wants that
+    # Fallback B: Scan all JSONs to find unique labels (risky for consistency across runs)
+    # Let's assume 'peca' is 0 for safety if nothing else
+    return {"peca": 0}
+
+
+def shapes_digest(shapes):
+    """ Hash de classe + pontos (2 casas): não muda ao abrir e salvar no Labelme sem editar """
+    key = [(s["label"], [[round(float(x), 2), round(float(y), 2)] for x, y in s["points"]]) for s in shapes]
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+
+def is_unreviewed(data):
+    """ JSON do auto_label ainda do jeito que foi gerado (ninguém corrigiu no Labelme) """
+    mark = data.get(AUTO_LABEL_KEY)
+    return isinstance(mark, dict) and mark.get("shapes_sha1") == shapes_digest(data.get("shapes", []))
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    """ Grava o manifesto de forma atômica (arquivo temporário + os.replace) """
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def resolve_label(label, class_map):
+    """ Label em minúsculo; se não estiver no mapa, procura uma chave igual ignorando maiúsculas """
+    label = label.lower() # Força minusculo para evitar erros de Case
+    if label in class_map:
+        return label
+    for key in class_map:
+        if key.lower() == label:
+            return key
+    return None
+
+
+def convert_file(json_file, output_dir, class_map, include_auto=False):
+    """
+    Converte um JSON do Labelme em um .txt YOLO de segmentação.
+    Retorna (json_file, avisos, erro, não_revisado); roda dentro do pool de processos.
+    Pré-rotulagem não revisada só é convertida com `include_auto`.
+    """
+    warnings = []
+    try:
+        with open(json_file, "r") as f:
+            data = json.load(f)
+        if not include_auto and is_unreviewed(data):
+            return json_file, warnings, None, True
+
+        size = np.array([data["imageWidth"], data["imageHeight"]], dtype=np.float64)
+
+        lines = []
+        for shape in data["shapes"]:
+            label = resolve_label(shape["label"], class_map)
+            if label is None:
+                warnings.append(f"Aviso: Label '{shape['label'].lower()}' (orig: {shape['label']}) nao encontrado no mapa de classes {class_map}. Ignorando.")
+                continue
+
+            # Normaliza e limita a 0-1 todos os pontos do polígono de uma vez
+            points = np.clip(np.asarray(shape["points"], dtype=np.float64).reshape(-1, 2) / size, 0.0, 1.0)
+            coords = " ".join(map("{:.6f}".format, points.ravel().tolist()))
+            lines.append(f"{class_map[label]} {coords}\n")
+
+        # Output file name: replace .json with .txt
+        base_name = os.path.splitext(os.path.basename(json_file))[0]
+        txt_path = os.path.join(output_dir, f"{base_name}.txt")
+        with open(txt_path, "w") as out_f:
+            out_f.writelines(lines)
+        return json_file, warnings, None, False
+    except Exception as e:
+        return json_file, warnings, str(e), False
+
+
+def convert_labelme_json_to_yolo(json_dir, output_dir, class_map=None, workers=None, force=False, manifest=None,
+                                 include_auto=False):
     """
     Converts Labelme JSON files to YOLO segmentation format (.txt).
     format: <class-index> <x1> <y1> <x2> <y2> ... <xn> <yn> (normalized)
+
+    Incremental: JSONs whose mtime/size (or, failing that, SHA-1) match the manifest
+    from the previous run and whose .txt still exists are skipped. The rest are
+    converted in a process pool. Returns a summary dict.
+
+    With `manifest` (a synced DatasetManifest of `json_dir`) the candidates come from
+    the database (labels not yet converted) instead of a folder scan, and the
+    converted files are recorded back in it.
+
+    Pre-labels written by auto_label.py are skipped until someone edits them in
+    Labelme; `include_auto` converts them anyway.
     """
+    t0 = time.perf_counter()
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    json_files = glob.glob(os.path.join(json_dir, "*.json"))
-    print(f"Encontrados {len(json_files)} arquivos JSON em {json_dir}")
-
-    # If no class map provided, auto-generate or use standard
-    # For now, let's assume we read classes.txt or generate on fly
-    if class_map is None:
-        # Try to find classes.txt
-        classes_path = os.path.join(json_dir, "classes.txt")
-        if os.path.exists(classes_path):
-             with open(classes_path, "r") as f:
-                classes = [line.strip() for line in f.readlines() if line.strip()]
-                class_map = {name: i for i, name in enumerate(classes)}
-        else:
-            # Fallback A: Default "peca" if user only wants that
-            # Fallback B: Scan all JSONs to find unique labels (risky for consistency across runs)
-            # Let's assume 'peca' is 0 for safety if nothing else
-            class_map = {"peca": 0} 
-    
+    class_map = load_class_map(json_dir, class_map)
     print(f"Mapa de Classes: {class_map}")
 
+    # Mapa de classes diferente invalida todos os .txt já gerados
+    previous = {} if force else load_manifest(output_dir)
+    if previous.get("class_map") != class_map:
+        previous = {}
+    entries = previous.get("files", {})
+
+    if manifest is not None:
+        from dataset_manifest import LABELED, CONVERTED
+        names = manifest.names(status=LABELED, include_auto=include_auto)
+        if not entries:
+            names += manifest.names(status=CONVERTED, include_auto=include_auto)
+        json_files = sorted(os.path.join(json_dir, os.path.splitext(n)[0] + ".json") for n in names)
+        print(f"{len(json_files)} arquivos JSON novos ou alterados segundo o manifesto de {json_dir}")
+    else:
+        json_files = sorted(glob.glob(os.path.join(json_dir, "*.json")))
+        print(f"Encontrados {len(json_files)} arquivos JSON em {json_dir}")
+
+    pending = []
+    new_entries = dict(entries) if manifest is not None else {}
     for json_file in json_files:
-        try:
-            with open(json_file, "r") as f:
-                data = json.load(f)
-            
-            image_width = data["imageWidth"]
-            image_height = data["imageHeight"]
-            
-            # Output file name: replace .json with .txt
-            base_name = os.path.splitext(os.path.basename(json_file))[0]
-            txt_path = os.path.join(output_dir, f"{base_name}.txt")
-            
-            with open(txt_path, "w") as out_f:
-                for shape in data["shapes"]:
-                    label = shape["label"].lower() # Força minusculo para evitar erros de Case
-                    
-                    # Normaliza o mapa de classes também se necessário, mas aqui vamos assumir que o map usa chaves minusculas
-                    if label not in class_map:
-                        # Tenta verificar se existe alguma chave compatível ignorando case
-                        found_key = None
-                        for key in class_map:
-                            if key.lower() == label:
-                                found_key = key
-                                break
-                        
-                        if found_key:
-                            label = found_key
-                        else:
-                            print(f"Aviso: Label '{label}' (orig: {shape['label']}) nao encontrado no mapa de classes {class_map}. Ignorando.")
-                            continue
-                    
-                    class_id = class_map[label]
-                    points = shape["points"]
-                    
-                    # Normalize points
-                    normalized_points = []
-                    for x, y in points:
-                        nx = x / image_width
-                        ny = y / image_height
-                        # Clamp to 0-1 just in case
-                        nx = max(0, min(1, nx))
-                        ny = max(0, min(1, ny))
-                        normalized_points.extend([f"{nx:.6f}", f"{ny:.6f}"])
-                    
-                    line = f"{class_id} " + " ".join(normalized_points) + "\n"
-                    out_f.write(line)
-                    
-        except Exception as e:
-            print(f"Erro convertendo {json_file}: {e}")
+        name = os.path.basename(json_file)
+        st = os.stat(json_file)
+        txt_path = os.path.join(output_dir, os.path.splitext(name)[0] + ".txt")
+        entry = entries.get(name)
+        if entry and os.path.exists(txt_path):
+            if entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                new_entries[name] = entry
+                continue
+            # mtime mudou (cópia, checkout...) mas o conteúdo pode ser o mesmo
+            digest = file_hash(json_file)
+            if digest == entry["sha1"]:
+                new_entries[name] = {"mtime": st.st_mtime_ns, "size": st.st_size, "sha1": digest}
+                continue
+        pending.append(json_file)
+
+    skipped = len(json_files) - len(pending)
+    failed = []
+    unreviewed = []
+    converted = []
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(pending) >= MIN_FILES_FOR_POOL:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(pending) // (workers * 4))
+                results = list(pool.map(convert_file, pending, [output_dir] * len(pending),
+                                        [class_map] * len(pending), [include_auto] * len(pending),
+                                        chunksize=chunksize))
+        else:
+            results = [convert_file(f, output_dir, class_map, include_auto) for f in pending]
+
+        for json_file, warnings, error, skipped_auto in results:
+            for warning in warnings:
+                print(warning)
+            if error is not None:
+                print(f"Erro convertendo {json_file}: {error}")
+                failed.append(json_file)
+                continue
+            if skipped_auto:
+                unreviewed.append(json_file)
+                continue
+            converted.append(json_file)
+            st = os.stat(json_file)
+            new_entries[os.path.basename(json_file)] = {"mtime": st.st_mtime_ns, "size": st.st_size,
+                                                        "sha1": file_hash(json_file)}
+
+    save_manifest(output_dir, {"class_map": class_map, "files": new_entries})
+    if manifest is not None and converted:
+        manifest.mark_converted(converted)
+
+    summary = {
+        "total": len(json_files),
+        "converted": len(pending) - len(failed) - len(unreviewed),
+        "skipped": skipped,
+        "unreviewed": len(unreviewed),
+        "failed": len(failed),
+        "seconds": time.perf_counter() - t0,
+    }
+    print(f"Conversao: {summary['converted']} convertidos, {summary['skipped']} sem mudanca, "
+          f"{summary['failed']} com erro em {summary['seconds']:.2f}s")
+    if unreviewed:
+        print(f"  {len(unreviewed)} pré-rotulagens ainda não revisadas no Labelme ficaram de fora (--include-auto para incluir)")
+    return summary
+
 
 if __name__ == "__main__":
-    # Test run
-    convert_labelme_json_to_yolo("dataset", "dataset")
+    parser = argparse.ArgumentParser(description="Labelme JSON -> YOLO segmentação (incremental)")
+    parser.add_argument("--input", type=str, default="dataset", help="Pasta com os JSON do Labelme")
+    parser.add_argument("--output", type=str, default=None, help="Pasta dos .txt (padrão: a mesma da entrada)")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de conversão (padrão: núcleos da CPU)")
+    parser.add_argument("--force", action="store_true", help="Ignora o manifesto e converte tudo")
+    parser.add_argument("--include-auto", action="store_true",
+                        help="Converte também as pré-rotulagens do auto_label ainda não revisadas no Labelme")
+    args = parser.parse_args()
+    convert_labelme_json_to_yolo(args.input, args.output or args.input, workers=args.workers, force=args.force,
+                                 include_auto=args.include_auto)
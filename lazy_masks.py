@@ -0,0 +1,103 @@
+import torch
+from ultralytics.engine.results import Results
+from ultralytics.models.yolo.segment.predict import SegmentationPredictor
+from ultralytics.utils import ops
+
+# Caminho rápido só de caixas para o modelo -seg: a contagem usa xyxy/id/cls, então o
+# pós-processamento não monta as máscaras de cada instância. Protótipos e coeficientes
+# ficam guardados no Results e a máscara é decodificada só quando alguém pede
+# (ex.: área do objeto no frame em que ele é contado).
+
+
+class LazyMasks:
+    """
+    Máscaras ainda não decodificadas: protótipos da imagem + coeficientes e caixas de cada
+    detecção. `shape` é a imagem que entrou no modelo (frame ou recorte do ROI) e `offset`
+    a posição dela dentro do frame inteiro.
+    """
+
+    def __init__(self, proto, coeffs, boxes, shape, offset=(0, 0), frame_shape=None):
+        self.proto = proto
+        self.coeffs = coeffs
+        self.boxes = boxes
+        self.shape = tuple(shape)
+        self.offset = offset
+        self.frame_shape = tuple(frame_shape or shape)
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def select(self, idx):
+        """ Subconjunto das detecções (mesma ordem de `result[idx]`) """
+        idx = torch.as_tensor(idx, dtype=torch.long, device=self.coeffs.device)
+        return LazyMasks(self.proto, self.coeffs[idx], self.boxes[idx], self.shape, self.offset, self.frame_shape)
+
+    def shifted(self, x0, y0, frame_shape):
+        """ Mesmas máscaras, com a imagem de entrada colada em (x0, y0) de um frame maior (ROI) """
+        return LazyMasks(self.proto, self.coeffs, self.boxes, self.shape, (x0, y0), frame_shape)
+
+    def _native(self, rows):
+        if rows is None:
+            return ops.process_mask_native(self.proto, self.coeffs, self.boxes, self.shape)
+        rows = torch.as_tensor(rows, dtype=torch.long, device=self.coeffs.device)
+        return ops.process_mask_native(self.proto, self.coeffs[rows], self.boxes[rows], self.shape)
+
+    def decode(self, rows=None):
+        """ Máscaras binárias (N, H, W) no frame inteiro, só das linhas pedidas """
+        masks = self._native(rows)
+        if self.offset == (0, 0) and self.frame_shape[:2] == self.shape[:2]:
+            return masks
+        x0, y0 = self.offset
+        h, w = self.shape[:2]
+        full = torch.zeros((len(masks), *self.frame_shape[:2]), dtype=masks.dtype, device=masks.device)
+        full[:, y0:y0 + h, x0:x0 + w] = masks
+        return full
+
+    def areas(self, rows=None):
+        """ Área em pixels do frame de cada máscara pedida (não precisa colar no frame) """
+        return self._native(rows).sum((1, 2)).cpu().numpy()
+
+
+def nonempty_masks(proto, coeffs, boxes, shape):
+    """
+    Filtro do modo completo (descarta detecção com máscara vazia) sem o upsample para o
+    tamanho da imagem: olha, na resolução dos protótipos, as células que o bilinear usa
+    dentro da caixa. Nunca descarta algo que o modo completo manteria.
+    """
+    c, mh, mw = proto.shape
+    positive = ((coeffs @ proto.float().view(c, -1)).view(-1, mh, mw) > 0).byte()
+    scale = boxes.new_tensor([mw / shape[1], mh / shape[0]])
+    lo = torch.floor((boxes[:, :2] + 0.5) * scale - 0.5)
+    hi = torch.floor((boxes[:, 2:] - 0.5) * scale - 0.5) + 2
+    return ops.crop_mask(positive, torch.cat([lo, hi], 1)).amax((-2, -1)) > 0
+
+
+class LazyMaskPredictor(SegmentationPredictor):
+    """
+    SegmentationPredictor sem a decodificação das máscaras: NMS e caixas iguais, mas o
+    Results sai com `masks=None` e um `lazy_masks` para decodificar sob demanda.
+    O filtro de máscara vazia é o de `nonempty_masks` (pode manter alguma caixa minúscula a mais).
+    """
+
+    def construct_result(self, pred, img, orig_img, img_path, proto):
+        if len(pred):
+            keep = nonempty_masks(proto, pred[:, 6:], pred[:, :4], img.shape[2:])
+            if not keep.all():
+                pred = pred[keep]
+        pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
+        result = Results(orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6])
+        result.lazy_masks = LazyMasks(proto, pred[:, 6:], pred[:, :4], orig_img.shape[:2])
+        return result
+
+
+def mask_areas(result, rows):
+    """ Área (px) das máscaras das linhas `rows` do Results; None se o modelo não tem máscara """
+    lazy = getattr(result, "lazy_masks", None)
+    if lazy is not None:
+        return lazy.areas(rows)
+    if result.masks is None:
+        return None
+    data = result.masks.data[torch.as_tensor(rows, dtype=torch.long, device=result.masks.data.device)]
+    # Sem ROI as máscaras estão no tamanho da entrada do modelo (com letterbox)
+    masks = ops.scale_masks(data[None].float(), result.orig_shape)[0]
+    return (masks > 0.5).sum((1, 2)).cpu().numpy()
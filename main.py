@@ -1,86 +1,225 @@
-import os
-import numpy as np
 import time
+# Referência da linha do tempo de inicialização (o mais cedo possível no processo)
+PROCESS_T0 = time.perf_counter()
+
+import os
+import json
+import platform
+import importlib.metadata
 import argparse
+import signal
+import threading
+import numpy as np
 import cv2
-from ultralytics import YOLO
+# torch/ultralytics (~2 s de import) só entram na thread de carga do modelo, em paralelo com a câmera
+from pipeline import (FrameQueue, FrameGrabber, BatchWorker, StageStats, END_OF_STREAM,
+                      DROP_NEWEST, DROP_NEVER, resolve_drop_policy, format_stats)
+from counting import load_counting_config, DEFAULT_CONFIG_PATH
+from roi import RoiCropper, ROI_MODES
+from motion_gate import MotionGate
+from shared_frames import FrameRingWriter, DEFAULT_SHM_NAME
 
 # Correção para erro OMP
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-def draw_modern_text(img, text, pos, font_scale=0.6, color=(255,255,255), thickness=1, bg_color=(0,0,0)):
-    """ Desenha texto com background semi-transparente """
-    font = cv2.FONT_HERSHEY_DUPLEX
-    (t_w, t_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-    x, y = pos
-    sub_img = img[y-t_h-5:y+5, x-5:x+t_w+5]
-    if sub_img.size > 0:
-        rect = np.full(sub_img.shape, bg_color, dtype=np.uint8)
-        cv2.addWeighted(sub_img, 0.4, rect, 0.6, 1.0, sub_img)
-    cv2.putText(img, text, pos, font, font_scale, color, thickness, cv2.LINE_AA)
+# Resultado da detecção de GPU entre execuções (--reprobe refaz)
+HARDWARE_CACHE_PATH = os.path.join("state", "hardware.json")
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--source", type=str, default="0", help="Caminho do vídeo ou índice da câmera")
-    parser.add_argument("--model", type=str, default="best_seg.pt", help="Modelo .pt")
-    parser.add_argument("--conf", type=float, default=0.65, help="Confiança mínima")
-    args = parser.parse_args()
+# Melhor backend/imgsz/threads medido pelo autotune.py (--no-autotune ignora)
+AUTOTUNE_PATH = os.path.join("state", "autotune.json")
 
-    print(f"Carregando modelo solicitado: {args.model}") 
-    
-    # --- AUTO-DEVICE & MODEL SELECTION ---
+# Intervalo de checagem do --stop-file
+STOP_POLL_S = 0.5
+
+
+class StartupTimeline:
+    """ Marcos da inicialização em segundos desde PROCESS_T0; várias threads marcam """
+
+    def __init__(self, t0=PROCESS_T0):
+        self.t0 = t0
+        self.marks = []
+        self._lock = threading.Lock()
+
+    def mark(self, name, at=None):
+        at = time.perf_counter() if at is None else at
+        with self._lock:
+            self.marks.append((at - self.t0, name, threading.current_thread().name))
+
+    def report(self):
+        lines = ["⏱️ Inicialização (desde o início do processo):"]
+        prev = 0.0
+        for t, name, thread in sorted(self.marks):
+            lines.append(f"   {t:6.2f}s (+{t - prev:5.2f}s) {name} [{thread}]")
+            prev = t
+        return "\n".join(lines)
+
+
+def hardware_key():
+    """ O que invalida o cache: versão do torch, GPUs visíveis e a máquina (sem importar o torch) """
+    try:
+        torch_version = importlib.metadata.version("torch")
+    except importlib.metadata.PackageNotFoundError:
+        torch_version = None
+    return {"torch": torch_version, "cuda_visible": os.environ.get("CUDA_VISIBLE_DEVICES"), "host": platform.node()}
+
+
+def probe_hardware(use_cache=True):
+    """ {"cuda": bool, "device_name": str|None, "cached": bool}; a sondagem do CUDA vai para o cache """
     import torch
-    
-    def get_best_hardware_config(model_base_name):
-        """
-        Detecta hardware e seleciona o melhor formato de modelo.
-        Retorna: (model_path, device, adaptive_resize_bool)
-        """
-        # 1. Prioridade: GPU NVIDIA
-        if torch.cuda.is_available():
-            device_name = torch.cuda.get_device_name(0)
-            print(f"✅ GPU NVIDIA Detectada: {device_name} (Forçando CUDA:0)")
-            
-            # Tenta carregar TensorRT (.engine)
-            engine_path = model_base_name.replace(".pt", ".engine")
-            if os.path.exists(engine_path):
-                print(f"⚡ Usando Motor TensorRT para velocidade máxima: {engine_path}")
-                return engine_path, "cuda:0", False
-            
-            # Se não tiver engine, usa .pt na GPU
-            print(f"⚠️ Arquivo TensorRT (.engine) não encontrado. Usando PyTorch (.pt) na GPU.")
-            return model_base_name, "cuda:0", False
-            
-        else:
-            # 2. Fallback: CPU
-            print("⚠️ GPU não detectada. Ativando modo de compatibilidade CPU.")
-            
-            # Tenta carregar ONNX (Universal)
-            onnx_path = model_base_name.replace(".pt", ".onnx")
-            if os.path.exists(onnx_path):
-                print(f"🛡️ Usando ONNX Runtime para otimização em CPU: {onnx_path}")
-                return onnx_path, "cpu", True
-            
-            print(f"⚠️ ONNX não encontrado. Usando PyTorch (.pt) em CPU (Pode ser lento).")
-            return model_base_name, "cpu", True
-
-    best_model_path, device, adaptive_mode = get_best_hardware_config(args.model)
-    
+
+    key = hardware_key()
+    if use_cache and os.path.exists(HARDWARE_CACHE_PATH):
+        try:
+            with open(HARDWARE_CACHE_PATH, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return {"cuda": cached["cuda"], "device_name": cached.get("device_name"), "cached": True}
+        except (OSError, ValueError, KeyError):
+            pass
+
+    cuda = torch.cuda.is_available()
+    probe = {"cuda": cuda, "device_name": torch.cuda.get_device_name(0) if cuda else None}
+    try:
+        os.makedirs(os.path.dirname(HARDWARE_CACHE_PATH), exist_ok=True)
+        tmp_path = HARDWARE_CACHE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"key": key, **probe}, f)
+        os.replace(tmp_path, HARDWARE_CACHE_PATH)
+    except OSError:
+        pass
+    return {**probe, "cached": False}
+
+
+def invalidate_hardware_cache():
+    try:
+        os.remove(HARDWARE_CACHE_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def load_autotune(model_name, path=AUTOTUNE_PATH):
+    """
+    Configuração escolhida pelo autotune.py, se ainda vale: mesmo arquivo de modelo
+    (tamanho/mtime ou, se mudaram, SHA-1) e mesma máquina. Senão None.
+    """
+    if not os.path.exists(path) or not os.path.exists(model_name):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        best, signature = data["best"], data["model"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if os.path.abspath(signature["path"]) != os.path.abspath(model_name) or not os.path.exists(best["path"]):
+        return None
+    if data.get("hardware") != hardware_key():
+        print(f"{path} foi medido em outro hardware/torch; ignorando (rode o autotune.py de novo)")
+        return None
+    st = os.stat(model_name)
+    if (st.st_size, st.st_mtime_ns) != (signature["size"], signature["mtime_ns"]):
+        from json2yolo import file_hash
+        if st.st_size != signature["size"] or file_hash(model_name) != signature["sha1"]:
+            print(f"{path} é de outra versão de {model_name}; ignorando (rode o autotune.py de novo)")
+            return None
+    return best
+
+def get_best_hardware_config(model_base_name, use_cache=True):
+    """
+    Detecta hardware e seleciona o melhor formato de modelo.
+    Retorna: (model_path, device, adaptive_resize_bool)
+    """
+    hardware = probe_hardware(use_cache)
+    if hardware["cached"]:
+        print(f"Hardware do cache ({HARDWARE_CACHE_PATH}; --reprobe para detectar de novo)")
+
+    # 1. Prioridade: GPU NVIDIA
+    if hardware["cuda"]:
+        device_name = hardware["device_name"]
+        print(f"✅ GPU NVIDIA Detectada: {device_name} (Forçando CUDA:0)")
+
+        # Tenta carregar TensorRT (.engine)
+        engine_path = model_base_name.replace(".pt", ".engine")
+        if os.path.exists(engine_path):
+            print(f"⚡ Usando Motor TensorRT para velocidade máxima: {engine_path}")
+            return engine_path, "cuda:0", False
+
+        # Se não tiver engine, usa .pt na GPU
+        print(f"⚠️ Arquivo TensorRT (.engine) não encontrado. Usando PyTorch (.pt) na GPU.")
+        return model_base_name, "cuda:0", False
+
+    else:
+        # 2. Fallback: CPU
+        print("⚠️ GPU não detectada. Ativando modo de compatibilidade CPU.")
+
+        # Tenta carregar ONNX (Universal)
+        onnx_path = model_base_name.replace(".pt", ".onnx")
+        if os.path.exists(onnx_path):
+            print(f"🛡️ Usando ONNX Runtime para otimização em CPU: {onnx_path}")
+            return onnx_path, "cpu", True
+
+        print(f"⚠️ ONNX não encontrado. Usando PyTorch (.pt) em CPU (Pode ser lento).")
+        return model_base_name, "cpu", True
+
+def load_model(model_name, use_cache=True, timeline=None, tuned=None):
+    """
+    Carrega o modelo no device correto. Retorna: (model, device, adaptive_mode)
+    `tuned` (load_autotune) troca a escolha por existência de arquivo pela configuração medida.
+    """
+    from ultralytics import YOLO
+    if timeline is not None:
+        timeline.mark("import torch/ultralytics")
+
+    if tuned is not None:
+        best_model_path, device = tuned["path"], tuned["device"]
+        adaptive_mode = device == "cpu"
+        if tuned.get("threads"):
+            import torch
+            torch.set_num_threads(tuned["threads"])
+        print(f"⚙️ Autotune: {tuned['backend']} @ {tuned['imgsz']}px, {tuned.get('threads') or 'auto'} threads "
+              f"({tuned['infer_p50_ms']:.1f} ms/frame medido) -> {best_model_path}")
+    else:
+        best_model_path, device, adaptive_mode = get_best_hardware_config(model_name, use_cache)
+    if timeline is not None:
+        timeline.mark(f"hardware: {device} | {os.path.basename(best_model_path)}")
+
     # Carrega o modelo com o device correto
     try:
         model = YOLO(best_model_path) # YOLO carrega .pt, .onnx, .engine automaticamente
     except Exception as e:
         print(f"Erro ao carregar {best_model_path}: {e}")
         print("Tentando fallback para original...")
-        model = YOLO(args.model)
+        best_model_path = model_name
+        model = YOLO(model_name)
         device = "cpu"
         adaptive_mode = True
 
-    model.to(device) if device != "cpu" and not best_model_path.endswith(".onnx") else None # ONNX runs on its own runtime usually
+    try:
+        model.to(device) if device != "cpu" and not best_model_path.endswith(".onnx") else None # ONNX runs on its own runtime usually
+    except Exception as e:
+        # GPU do cache não existe mais (driver, placa trocada): sonda de novo na próxima execução
+        print(f"Erro ao mover o modelo para {device}: {e}. Usando CPU.")
+        invalidate_hardware_cache()
+        device, adaptive_mode = "cpu", True
     print(f"🚀 Sistema rodando em: {device.upper()} | Resize Adaptativo: {'ATIVO' if adaptive_mode else 'OFF'}")
-
-    source = args.source
-    if source.isdigit():
+    if timeline is not None:
+        timeline.mark("modelo carregado")
+    return model, device, adaptive_mode
+
+def warm_up(model, imgsz=None, batch=1, shape=(480, 640, 3), masks="lazy"):
+    """
+    Primeira inferência (alocação, kernels, sessão ONNX/TensorRT) num frame preto, fora do caminho da esteira.
+    `masks` igual ao do engine: mesmo predictor, senão o primeiro frame real monta outro.
+    """
+    from vision_engine import predictor_kwargs
+    kwargs = {"verbose": False, **predictor_kwargs(model, masks)}
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    frame = np.zeros(shape, dtype=np.uint8)
+    model.predict([frame] * batch, **kwargs)
+
+def open_capture(source):
+    """ Abre câmera (índice numérico, DSHOW primeiro) ou arquivo de vídeo. Retorna None se inacessível. """
+    if str(source).isdigit():
         source = int(source)
         print(f"Abrindo câmera {source} (DSHOW)...")
         cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
@@ -93,167 +232,391 @@ def main():
 
     if not cap.isOpened():
         print(f"Erro Crítico: Fonte inacessível: {source}")
-        return
+        return None
+    return cap
 
-    # --- CONFIGURAÇÕES ---
-    line_pos_A = None # Topo (65%)
-    line_pos_B = None # Fundo (15%)
-    offset = 25
-    
-    # Cores (BGR)
-    COLOR_CONFIRMED = (50, 205, 50)     # Verde
-    COLOR_TRACKING = (0, 140, 255)      # Laranja
-    COLOR_LOCKED = (255, 215, 0)        # Dourado (Novo: Identificado e Travado)
-    COLOR_HUD_BG = (30, 30, 30)
-    COLOR_LINE_A = (0, 165, 255)
-    COLOR_LINE_B = (0, 255, 127)
-
-    # Estados
-    object_states = {}
-    counters = {}
-    
-    # BLOQUEIO DE CLASSE: { track_id: class_id }
-    locked_classes = {}
-    
-    class_names = model.names
-    start_time = time.time()
+def add_engine_args(parser):
+    """ Opções do modelo e da contagem, compartilhadas entre main.py e os benchmarks de replay """
+    parser.add_argument("--model", type=str, default="best_seg.pt", help="Modelo .pt")
+    parser.add_argument("--conf", type=float, default=0.65, help="Confiança mínima")
+    parser.add_argument("--imgsz", type=int, default=None, help="Resolução de inferência (padrão: 320 em CPU, nativa em GPU)")
+    parser.add_argument("--counting-config", type=str, default=DEFAULT_CONFIG_PATH, help="YAML com as linhas/zonas de contagem por câmera")
+    parser.add_argument("--roi", type=str, default=None, choices=ROI_MODES,
+                        help="Recorte antes da inferência: band (faixa das linhas + margem) | polygon (counting.yaml) | off. Padrão: counting.yaml")
+    parser.add_argument("--roi-margin", type=float, default=None, help="Margem do ROI 'band' em fração do frame (padrão 0.1)")
+    parser.add_argument("--motion-gate", action="store_true", default=None, help="Pula a inferência quando nada se move dentro do ROI (também via 'motion:' no counting.yaml)")
+    parser.add_argument("--motion-threshold", type=float, default=None, help="Fração de pixels alterados que dispara a inferência (padrão 0.002)")
+    parser.add_argument("--motion-max-skip", type=int, default=None, help="Máximo de frames seguidos sem inferência (padrão 15)")
+    parser.add_argument("--masks", type=str, default="lazy", choices=["lazy", "full"],
+                        help="lazy: modelo -seg só com caixas, máscara decodificada apenas no frame da contagem | full: todas as máscaras a cada frame")
+
+def build_engine(args, model, device, adaptive_mode, source, frame_rate=30, checkpoint_path=None):
+    """ VisionEngine de uma fonte com as opções de add_engine_args """
+    from vision_engine import VisionEngine
+    counting_config = load_counting_config(args.counting_config, camera=source)
+    imgsz = args.imgsz or (320 if adaptive_mode else None)
+    roi = RoiCropper.from_config(counting_config, mode=args.roi, margin=args.roi_margin)
+    gate = MotionGate.from_config(counting_config, enabled=args.motion_gate, threshold=args.motion_threshold,
+                                  max_skip=args.motion_max_skip)
+    return VisionEngine(model, args.conf, imgsz=imgsz, counting_config=counting_config,
+                        checkpoint_path=checkpoint_path, checkpoint_interval=getattr(args, "checkpoint_interval", 10),
+                        frame_rate=frame_rate, device=device, roi=roi, gate=gate, masks=args.masks)
+
+def model_is_resizable(model):
+    """ PyTorch aceita qualquer imgsz; exportações (ONNX/OpenVINO/TensorRT) podem ter entrada fixa """
+    import torch
+    return isinstance(model.model, torch.nn.Module)
+
+def stream_path(path, index, n_streams):
+    """ Com várias fontes, cada fluxo ganha o próprio arquivo/nome: contagem.npz -> contagem_1.npz """
+    if not path or n_streams == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{index}{ext}"
+
+def stream_state(source, frame_seq, packet, fps, snapshots, adaptive=None, evidence=None):
+    """ Estado publicado na memória compartilhada (lido pelo app.py) """
+    return {
+        "source": source,
+        "frame_seq": frame_seq,
+        "timestamp": packet["timestamp"],
+        "counters": packet["counters"],
+        "fps": fps,
+        "infer_fps": packet["infer_fps"],
+        "stages": snapshots,
+        "engine_ms": packet["stage_ms"],
+        "tracks": packet["tracks"],
+        "gate": packet["gate"],
+        "adaptive": adaptive,
+        "evidence": evidence,
+    }
+
+class Stream:
+    """ Tudo o que pertence a uma fonte: captura, filas, engine de contagem e saída """
+
+    def __init__(self, index, source, cap, engine, policy, queue_size, stop_event, window_name, shm_name, multi=False,
+                 recorder=None):
+        self.index = index
+        self.source = source
+        self.cap = cap
+        self.engine = engine
+        self.policy = policy
+        self.recorder = recorder
+        self.grab_queue = FrameQueue(queue_size, policy)
+        self.render_queue = FrameQueue(queue_size, policy)
+        suffix = f"[{index}]" if multi else ""
+        self.grabber = FrameGrabber(cap, self.grab_queue, stop_event, name=f"captura{suffix}",
+                                    tap=recorder.offer if recorder is not None else None)
+        self.render_stats = StageStats(f"render{suffix}", self.render_queue)
+        self.window_name = window_name
+        self.shm_name = shm_name
+        self.shm_writer = None
+        self.prev_frame_time = 0
+        self.finished = False
+        self.packets = 0
+        self.frame_seq = 0
 
-    print("Sistema iniciado. Pressione 'q' para sair.")
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", type=str, nargs="+", default=["0"], help="Caminho do vídeo ou índice da câmera (várias fontes = inferência em lote)")
+    add_engine_args(parser)
+    parser.add_argument("--drop-policy", type=str, default="auto", choices=["auto", DROP_NEWEST, DROP_NEVER],
+                        help="newest: câmera ao vivo (sempre o frame mais novo) | never: vídeo offline (nunca descarta) | auto: decide pela fonte")
+    parser.add_argument("--queue-size", type=int, default=2, help="Tamanho das filas entre estágios")
+    parser.add_argument("--checkpoint", type=str, default=os.path.join("state", "contagem.npz"), help="Arquivo de checkpoint do placar ('' desativa)")
+    parser.add_argument("--checkpoint-interval", type=float, default=10, help="Segundos entre checkpoints do placar")
+    parser.add_argument("--journal", type=str, default=os.path.join("state", "eventos.sqlite"),
+                        help="Diário SQLite de cada contagem, consultado por hora/turno no app.py ('' desativa)")
+    parser.add_argument("--headless", action="store_true", help="Sem janela: publica frames e placar em memória compartilhada")
+    parser.add_argument("--stop-file", type=str, default=None,
+                        help="Encerra (com checkpoint e diário gravados) quando este arquivo aparecer; usado pelo app.py")
+    parser.add_argument("--shm-name", type=str, default=DEFAULT_SHM_NAME, help="Nome do bloco de memória compartilhada (placar/métricas e frames desenhados)")
+    parser.add_argument("--shm-slots", type=int, default=3, help="Slots do ring buffer de frames (0 = só placar/métricas, sem visualização ao vivo no app.py)")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="Com janela, não publica placar/métricas/frames em memória compartilhada para o app.py")
+    parser.add_argument("--no-autotune", action="store_true", help="Ignora state/autotune.json (escolha do formato por existência de arquivo)")
+    parser.add_argument("--reprobe", action="store_true", help="Ignora o cache de hardware (state/hardware.json) e detecta a GPU de novo")
+    parser.add_argument("--render-every", type=int, default=1,
+                        help="Desenha/exibe 1 a cada N frames (0 = sem render; no headless só o placar é publicado)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Controle em malha fechada: ajusta imgsz, passo de frames e render para segurar o --target-fps")
+    parser.add_argument("--target-fps", type=float, default=None, help="FPS alvo por fluxo do controle adaptativo (padrão: FPS da fonte)")
+    parser.add_argument("--min-imgsz", type=int, default=256, help="Menor imgsz que o controle adaptativo pode usar")
+    parser.add_argument("--max-imgsz", type=int, default=None, help="Maior imgsz que o controle adaptativo pode usar (padrão: o inicial)")
+    parser.add_argument("--max-stride", type=int, default=3, help="Maior passo de frames (1 inferência a cada N) do controle adaptativo")
+    parser.add_argument("--max-render-every", type=int, default=4, help="Maior espaçamento de render do controle adaptativo")
+    parser.add_argument("--evidence", type=str, default="off", choices=["off", "count", "manual"],
+                        help="Clipes de evidência: count = a cada contagem e a pedido do painel/tecla 'e' | manual = só a pedido")
+    parser.add_argument("--evidence-dir", type=str, default=os.path.join("state", "evidencias"), help="Pasta dos clipes de evidência")
+    parser.add_argument("--evidence-pre", type=float, default=10, help="Segundos antes do evento no clipe (buffer em memória)")
+    parser.add_argument("--evidence-post", type=float, default=5, help="Segundos depois do evento no clipe")
+    parser.add_argument("--evidence-scale", type=float, default=0.5, help="Escala dos frames guardados no buffer")
+    parser.add_argument("--evidence-quality", type=int, default=75, help="Qualidade JPEG dos frames do buffer")
+    parser.add_argument("--evidence-buffer-mb", type=float, default=64, help="Teto de RAM do buffer por fonte (MB)")
+    parser.add_argument("--evidence-quota-mb", type=float, default=2048, help="Cota em disco dos clipes (apaga os mais antigos)")
+    parser.add_argument("--evidence-retention-days", type=float, default=7, help="Clipes mais velhos que isso são apagados")
+    args = parser.parse_args()
+    timeline = StartupTimeline()
+    timeline.mark("argumentos")
+
+    print(f"Carregando modelo solicitado: {args.model}") 
+    
+    # --- AUTO-DEVICE & MODEL SELECTION ---
+    # Um único modelo para todas as fontes. Import + carga + warm-up numa thread,
+    # enquanto a thread principal abre as câmeras (DSHOW pode levar segundos)
+    tuned = None if args.no_autotune else load_autotune(args.model)
+    if tuned is not None and args.imgsz and args.imgsz != tuned["imgsz"] and tuned["backend"] != "pytorch":
+        # Exportações estáticas só aceitam o imgsz em que foram medidas
+        print(f"--imgsz {args.imgsz} difere do autotune ({tuned['imgsz']}, {tuned['backend']}); ignorando o autotune")
+        tuned = None
+    if tuned is not None and not args.imgsz:
+        args.imgsz = tuned["imgsz"]
+
+    loaded = {}
+    caps_ready = threading.Event()
+    frame_shape = [(480, 640, 3)]
+
+    def load():
+        try:
+            model, device, adaptive_mode = load_model(args.model, use_cache=not args.reprobe, timeline=timeline, tuned=tuned)
+            loaded.update(model=model, device=device, adaptive_mode=adaptive_mode)
+            # Warm-up na resolução das câmeras, se já abertas, e no imgsz/lote que a esteira vai usar
+            caps_ready.wait(timeout=10)
+            warm_up(model, args.imgsz or (320 if adaptive_mode else None), batch=len(args.source), shape=frame_shape[0],
+                    masks=args.masks)
+            timeline.mark("warm-up")
+        except Exception as e:
+            loaded["error"] = e
+
+    loader = threading.Thread(target=load, name="carga-modelo", daemon=True)
+    loader.start()
+
+    caps = []
+    for source in args.source:
+        cap = open_capture(source)
+        if cap is None:
+            for c in caps: c.release()
+            return
+        caps.append(cap)
+        timeline.mark(f"fonte aberta: {source}")
+    width, height = int(caps[0].get(cv2.CAP_PROP_FRAME_WIDTH)), int(caps[0].get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if width > 0 and height > 0:
+        frame_shape[0] = (height, width, 3)
+    caps_ready.set()
+
+    loader.join()
+    if "error" in loaded:
+        for c in caps: c.release()
+        raise loaded["error"]
+    model, device, adaptive_mode = loaded["model"], loaded["device"], loaded["adaptive_mode"]
+    from vision_engine import process_batch
+
+    # --- PIPELINE: captura (1 thread por fonte) -> inferência em lote -> render (thread principal, exigida pelo imshow) ---
+    stop_event = threading.Event()
+    n_streams = len(args.source)
+    streams = []
+    for i, (source, cap) in enumerate(zip(args.source, caps)):
+        frame_rate = int(round(cap.get(cv2.CAP_PROP_FPS) or 30)) or 30
+        engine = build_engine(args, model, device, adaptive_mode, source, frame_rate=frame_rate,
+                              checkpoint_path=stream_path(args.checkpoint, i, n_streams) or None)
+        window_name = "VisionCount Pro V5" if n_streams == 1 else f"VisionCount Pro V5 [{i}] {source}"
+        policy = resolve_drop_policy(args.drop_policy, source)
+        recorder = None
+        if args.evidence != "off":
+            from evidence import EvidenceRecorder
+            recorder = EvidenceRecorder(source, args.evidence_dir, args.evidence_pre, args.evidence_post,
+                                        args.evidence_scale, args.evidence_quality, args.evidence_buffer_mb,
+                                        args.evidence_quota_mb, args.evidence_retention_days)
+        streams.append(Stream(i, source, cap, engine, policy, args.queue_size, stop_event,
+                              window_name, stream_path(args.shm_name, i, n_streams), multi=n_streams > 1,
+                              recorder=recorder))
+
+    journal = None
+    if args.journal:
+        from event_journal import EventJournal
+        journal = EventJournal(args.journal)
+
+    def infer_batch(batch):
+        packets = process_batch([streams[i].engine for i, _ in batch], [item for _, item in batch])
+        # Só enfileiram: diário e clipes gravam nas próprias threads
+        for (i, _), packet in zip(batch, packets):
+            if not packet["events"]:
+                continue
+            if journal is not None:
+                journal.append(streams[i].source, packet["events"], packet["timestamp"])
+            if args.evidence == "count" and streams[i].recorder is not None:
+                for event in packet["events"]:
+                    streams[i].recorder.trigger(packet["timestamp"], event["class"])
+        return packets
+
+    infer_stage = BatchWorker("inferencia", infer_batch, [s.grab_queue for s in streams],
+                              [s.render_queue for s in streams], stop_event)
+
+    controller = None
+    if args.adaptive:
+        from adaptive import AdaptiveController
+        target_fps = args.target_fps or (int(round(caps[0].get(cv2.CAP_PROP_FPS) or 30)) or 30)
+        controller = AdaptiveController([s.engine for s in streams], target_fps, imgsz=streams[0].engine.imgsz,
+                                        min_imgsz=args.min_imgsz, max_imgsz=args.max_imgsz, resizable=model_is_resizable(model),
+                                        max_stride=args.max_stride, render_every=args.render_every,
+                                        max_render_every=args.max_render_every)
+        print(f"Controle adaptativo: alvo {target_fps:g} FPS | imgsz {controller.imgsz_steps[0]}-{controller.imgsz_steps[-1]} | "
+              f"passo até {args.max_stride} | render até 1/{controller.max_render_every}")
+
+    def stage_snapshots(stream):
+        return [stream.grabber.snapshot(), infer_stage.stream_stats[stream.index].snapshot(), stream.render_stats.snapshot()]
+
+    # Placar e métricas vão para a memória compartilhada (o app.py repassa ao navegador)
+    publish = args.headless or not args.no_publish
+
+    # Parada limpa (checkpoint, diário, clipes) no SIGTERM com ou sem janela; no Windows o
+    # terminate() do app.py não dá chance ao finally, então lá vale o arquivo de parada ou CTRL_BREAK
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, lambda *_: stop_event.set())
+    if args.headless:
+        print(f"Sistema iniciado em modo HEADLESS. Publicando em memória compartilhada: {', '.join(s.shm_name for s in streams)}")
+    else:
+        print("Sistema iniciado. Pressione 'q' para sair." + (" 'e' grava um clipe de evidência." if args.evidence != "off" else ""))
     print("Modo de Bloqueio de Classe: ATIVO (IA define a classe na entrada e não muda mais)")
+    for s in streams:
+        print(f"Pipeline [{s.index}] {s.source}: política de fila '{s.policy}' | fila máx {args.queue_size}")
 
-    prev_frame_time = 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-
-        # Calculo de FPS
-        curr_frame_time = time.time()
-        fps = 1 / (curr_frame_time - prev_frame_time) if prev_frame_time > 0 else 0
-        prev_frame_time = curr_frame_time
-
-        height, width, _ = frame.shape
-        
-        if line_pos_A is None:
-            line_pos_A = int(height * 0.65) # Entrada (Baixo/Meio)
-            line_pos_B = int(height * 0.15) # Saída (Topo)
-            
-        yaml_path = "custom_tracker.yaml"
-        if not os.path.exists(yaml_path): yaml_path = "botsort.yaml"
-
-        if adaptive_mode:
-            # Em CPU, reduzimos a resolução de inferência para manter o FPS
-            # 320px é suficiente para contagem e muito mais rápido
-            results = model.track(source=frame, persist=True, conf=args.conf, tracker=yaml_path, verbose=False, imgsz=320)
-        else:
-            # Em GPU, usamos 640 ou tamanho nativo (padrão)
-            results = model.track(source=frame, persist=True, conf=args.conf, tracker=yaml_path, verbose=False)
-        
-        # --- HUD ---
-        overlay_hud = frame.copy()
-        cv2.rectangle(overlay_hud, (0, 0), (width, 100), COLOR_HUD_BG, -1)
-        cv2.addWeighted(overlay_hud, 0.85, frame, 0.15, 0, frame)
-        
-        cv2.line(frame, (0, line_pos_A), (width, line_pos_A), COLOR_LINE_A, 2, cv2.LINE_AA)
-        draw_modern_text(frame, " ZONA DE ENTRADA ", (10, line_pos_A - 10), 0.5, COLOR_LINE_A, 1, (0,0,0))
-        
-        cv2.line(frame, (0, line_pos_B), (width, line_pos_B), COLOR_LINE_B, 2, cv2.LINE_AA)
-        draw_modern_text(frame, " LINHA DE CONTAGEM ", (10, line_pos_B - 10), 0.5, COLOR_LINE_B, 1, (0,0,0))
-
-        # Cronômetro
-        elapsed = int(time.time() - start_time)
-        hours, rem = divmod(elapsed, 3600)
-        minutes, seconds = divmod(rem, 60)
-        cv2.putText(frame, f"{hours:02}:{minutes:02}:{seconds:02}", (width - 160, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2, cv2.LINE_AA)
-        cv2.putText(frame, "TEMPO ATIVO", (width - 160, 25), cv2.FONT_HERSHEY_PLAIN, 1.0, (150, 150, 150), 1, cv2.LINE_AA)
-
-        # FPS (Bottom Right, Simple Font, Green)
-        cv2.putText(frame, f"FPS: {int(fps)}", (width - 120, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-
-        # Processamento
-        if results and results[0].boxes.id is not None:
-            boxes = results[0].boxes.xyxy.cpu().numpy().astype(int)
-            track_ids = results[0].boxes.id.cpu().numpy().astype(int)
-            class_ids = results[0].boxes.cls.cpu().numpy().astype(int)
-
-            for idx, (box, track_id, cls_id) in enumerate(zip(boxes, track_ids, class_ids)):
-                x1, y1, x2, y2 = box
-                cx, cy = int((x1 + x2) / 2), int((y1 + y2) / 2)
-
-                # --- Lógica de CLASSE FIXA ("Congelar IA") ---
-                # A primeira vez que vemos um ID, fixamos sua classe.
-                # Nos frames seguintes, usamos a classe fixa, ignorando a detecção atual.
-                if track_id in locked_classes:
-                    final_cls_id = locked_classes[track_id]
-                    is_locked = True
-                else:
-                    locked_classes[track_id] = cls_id
-                    final_cls_id = cls_id
-                    is_locked = False
-
-                class_name = class_names[final_cls_id]
-
-                if track_id not in object_states:
-                    object_states[track_id] = {'valid_entry': False, 'counted': False, 'frames': 0, 'start_y': cy}
-                
-                state = object_states[track_id]
-                state['frames'] += 1
-                
-                # Regra MRU Invertida (Subindo)
-                if state['start_y'] >= (line_pos_A - offset * 2): state['valid_entry'] = True
-                if abs(cy - line_pos_A) < offset: state['valid_entry'] = True
-
-                # Contagem
-                if (line_pos_B - offset) < cy < (line_pos_B + offset):
-                    if state['valid_entry'] and not state['counted']:
-                        state['counted'] = True
-                        counters[class_name] = counters.get(class_name, 0) + 1
-                        print(f"[ID {track_id}] CONTADO: {class_name}")
-
-                # --- Visualização ---
-                if state['counted']:
-                    color = COLOR_CONFIRMED
-                    status_icon = "CHECK"
-                elif is_locked:
-                    color = COLOR_TRACKING
-                    status_icon = "LOCK"
+    for s in streams:
+        s.grabber.start()
+    infer_stage.start()
+    timeline.mark("pipeline iniciado")
+
+    last_stats_print = time.time()
+    last_stop_check = time.time()
+    quit_requested = False
+
+    try:
+        while not stop_event.is_set() and not quit_requested:
+            if all(s.finished for s in streams):
+                break
+            got_frame = False
+            for stream in streams:
+                if stream.finished:
+                    continue
+                packet = stream.render_queue.get(timeout=0.1 / n_streams)
+                if packet is END_OF_STREAM:
+                    stream.finished = True
+                    continue
+                if packet is None:
+                    continue
+                got_frame = True
+
+                t0 = time.perf_counter()
+                if controller is not None:
+                    controller.observe(time.time() - packet["timestamp"])
+                if timeline is not None:
+                    # Timestamp da captura é time.time(): converte para a escala do perf_counter
+                    timeline.mark("primeiro frame capturado", at=t0 - (time.time() - packet["timestamp"]))
+                    timeline.mark(f"primeiro frame contado (inferência {packet['stage_ms'].get('infer', 0.0):.0f} ms)")
+                    print(timeline.report())
+                    timeline = None
+
+                # Calculo de FPS (exibição)
+                curr_frame_time = time.time()
+                fps = 1 / (curr_frame_time - stream.prev_frame_time) if stream.prev_frame_time > 0 else 0
+                stream.prev_frame_time = curr_frame_time
+
+                snapshots = stage_snapshots(stream)
+                # Render reduzido/desligado: o placar continua, só o desenho é pulado
+                render_every = controller.render_every if controller is not None else args.render_every
+                draw = render_every > 0 and stream.packets % render_every == 0
+                stream.packets += 1
+                frame = stream.engine.render(packet, fps, format_stats(snapshots)) if draw else packet["frame"]
+
+                if publish:
+                    # Buffer criado no primeiro frame, quando a resolução é conhecida.
+                    # Com janela os frames também vão, para a visualização ao vivo do app.py
+                    if stream.shm_writer is None:
+                        stream.shm_writer = FrameRingWriter(stream.shm_name, frame.shape, args.shm_slots)
+                    if draw and stream.shm_writer.slots:
+                        stream.frame_seq = stream.shm_writer.write_frame(frame)
+                    stream.shm_writer.write_state(stream_state(stream.source, stream.frame_seq, packet, fps, snapshots,
+                                                                   controller.snapshot() if controller is not None else None,
+                                                                   stream.recorder.metrics() if stream.recorder is not None else None))
+
+                if args.headless:
+                    stream.render_stats.record(time.perf_counter() - t0)
+                elif draw:
+                    display_scale = 1.5
+                    display_frame = cv2.resize(frame, None, fx=display_scale, fy=display_scale)
+                    cv2.imshow(stream.window_name, display_frame)
+                    stream.render_stats.record(time.perf_counter() - t0)
                 else:
-                    color = COLOR_LOCKED
-                    status_icon = "NEW"
-
-                # Bounding Box
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2, cv2.LINE_AA)
-                
-                # Label estilizada
-                label = f" #{track_id} {class_name} [{status_icon}] "
-                (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 0.5, 1)
-                cv2.rectangle(frame, (x1, y1 - 25), (x1 + w, y1), color, -1)
-                cv2.putText(frame, label, (x1, y1 - 8), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0,0,0) if state['counted'] else (255,255,255), 1, cv2.LINE_AA)
-                cv2.circle(frame, (cx, cy), 3, (0,255,255), -1, cv2.LINE_AA)
-
-        # Placar
-        x_offset = 20
-        cv2.putText(frame, "PRODUCAO:", (x_offset, 25), cv2.FONT_HERSHEY_PLAIN, 1.2, (180, 180, 180), 1, cv2.LINE_AA)
-        for class_name, count in counters.items():
-            text = f"{class_name.upper()}  {count:03d}"
-            (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_DUPLEX, 0.8, 1)
-            cv2.rectangle(frame, (x_offset, 35), (x_offset + tw + 10, 35 + th + 15), (50, 50, 50), -1)
-            cv2.putText(frame, text, (x_offset + 5, 35 + th + 5), cv2.FONT_HERSHEY_DUPLEX, 0.8, COLOR_CONFIRMED, 1, cv2.LINE_AA)
-            x_offset += tw + 30
-
-        display_scale = 1.5
-        display_frame = cv2.resize(frame, None, fx=display_scale, fy=display_scale)
-        cv2.imshow("VisionCount Pro V5", display_frame)
-
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'): break
-        elif key == ord('r'):
-            counters.clear(); object_states.clear(); locked_classes.clear(); start_time = time.time()
-            print(">> RESETADO TUDO")
-
-    cap.release()
-    cv2.destroyAllWindows()
+                    stream.render_stats.record(time.perf_counter() - t0)
+
+            if controller is not None:
+                controller.update(time.perf_counter(), sum(s.packets for s in streams),
+                                  sum(s.grab_queue.dropped + s.render_queue.dropped for s in streams),
+                                  infer_stage.stats.busy_time, sum(s.render_stats.busy_time for s in streams), n_streams)
+
+            if time.time() - last_stats_print > 5:
+                for stream in streams:
+                    t = stream.engine.counting.tracks.metrics()
+                    gate = f" | pulados {stream.engine.gate.metrics()['skip_ratio']:.0%}" if stream.engine.gate is not None else ""
+                    print(f"[PIPELINE {stream.index}] {format_stats(stage_snapshots(stream))} | tracks: {t['live']} vivos, {t['evicted']} expirados{gate}")
+                    if stream.recorder is not None:
+                        e = stream.recorder.metrics()
+                        print(f"[EVIDÊNCIA {stream.index}] buffer {e['buffer_seconds']:.1f}s / {e['buffer_bytes'] / 1e6:.1f} MB | "
+                              f"clipes abertos {e['open_clips']}, na fila {e['encode_backlog']}, gravados {e['clips_written']} | "
+                              f"disco {e['disk_bytes'] / 1e6:.0f} MB")
+                if controller is not None:
+                    w = controller.window
+                    print(f"[ADAPTATIVO] imgsz {controller.imgsz} | passo {controller.stride} | render 1/{controller.render_every} | "
+                          f"{w.get('fps', 0):.1f}/{controller.target_fps:g} fps | latência {w.get('latency_ms', 0):.0f} ms")
+                if n_streams > 1:
+                    print(f"[LOTE] média de {infer_stage.avg_batch():.2f} frames por chamada do modelo")
+                last_stats_print = time.time()
+
+            if args.stop_file and time.time() - last_stop_check > STOP_POLL_S:
+                last_stop_check = time.time()
+                if os.path.exists(args.stop_file):
+                    print(f"Arquivo de parada {args.stop_file} encontrado: encerrando.")
+                    os.remove(args.stop_file)
+                    break
+
+            if args.headless:
+                continue
+
+            # Sem frame novo: mantém a janela responsiva do mesmo jeito
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'): quit_requested = True
+            elif key == ord('r'):
+                for stream in streams:
+                    stream.engine.request_reset()
+            elif key == ord('e'):
+                for stream in streams:
+                    if stream.recorder is not None:
+                        stream.recorder.trigger(label="manual")
+    finally:
+        stop_event.set()
+        for s in streams:
+            s.grabber.join(timeout=2)
+        infer_stage.join(timeout=5)
+        for s in streams:
+            s.engine.checkpoint()
+            s.cap.release()
+            if s.shm_writer is not None:
+                s.shm_writer.close()
+        if journal is not None:
+            journal.close()
+        for s in streams:
+            if s.recorder is not None:
+                s.recorder.close()
+        if not args.headless:
+            cv2.destroyAllWindows()
+
+    if infer_stage.error is not None:
+        print(f"Erro no estágio de inferência: {infer_stage.error}")
+    for s in streams:
+        print(f"[PIPELINE {s.index}] Final: {format_stats(stage_snapshots(s))} | {s.engine.counters}")
+    if journal is not None:
+        print(f"[DIÁRIO] {journal.metrics()} -> {args.journal}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Porteiro barato antes da inferência: diferença de frames em escala reduzida
+    dentro do ROI. Esteira parada ou vazia -> o frame pula o modelo.
+
+    A referência é o último frame que passou pela inferência (não o frame anterior),
+    então movimento lento se acumula até passar do limiar em vez de escapar
+    frame a frame. `max_skip` força uma inferência de tempos em tempos mesmo sem
+    movimento (peça parada que apareceu com iluminação igual, câmera congelada...).
+    """
+
+    def __init__(self, threshold=0.002, pixel_delta=25, width=160, max_skip=15):
+        self.threshold = threshold     # fração de pixels alterados que abre o portão
+        self.pixel_delta = pixel_delta # diferença de cinza (0-255) para um pixel contar como alterado
+        self.width = width             # largura do frame reduzido
+        self.max_skip = max_skip
+        self._reference = None
+        self._skipped_run = 0
+        self.frames = 0
+        self.skipped = 0
+        self.score = 0.0
+
+    @classmethod
+    def from_config(cls, config, enabled=None, threshold=None, max_skip=None):
+        """ Bloco `motion:` da câmera no counting.yaml; opções da linha de comando têm prioridade. Desligado -> None. """
+        cfg = dict((config or {}).get("motion") or {})
+        if enabled is not None:
+            cfg["enabled"] = enabled
+        if not cfg.get("enabled", False):
+            return None
+        if threshold is not None:
+            cfg["threshold"] = threshold
+        if max_skip is not None:
+            cfg["max_skip"] = max_skip
+        return cls(cfg.get("threshold", 0.002), cfg.get("pixel_delta", 25), cfg.get("width", 160), cfg.get("max_skip", 15))
+
+    def _small(self, frame, rect):
+        x0, y0, x1, y1 = rect
+        view = frame[y0:y1, x0:x1]
+        h, w = view.shape[:2]
+        height = max(1, int(round(h * self.width / max(w, 1))))
+        small = cv2.resize(view, (self.width, height), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, rect):
+        """ True se o frame deve passar pela inferência. `rect` = (x0, y0, x1, y1) do ROI. """
+        self.frames += 1
+        small = self._small(frame, rect)
+        if self._reference is None or self._reference.shape != small.shape or self._skipped_run >= self.max_skip:
+            self.score = 1.0
+        else:
+            diff = cv2.absdiff(small, self._reference)
+            self.score = np.count_nonzero(diff > self.pixel_delta) / diff.size
+
+        if self.score >= self.threshold:
+            self._reference = small
+            self._skipped_run = 0
+            return True
+        self._skipped_run += 1
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        self._reference = None
+        self._skipped_run = 0
+
+    def metrics(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / self.frames if self.frames else 0.0,
+            "score": self.score,
+        }
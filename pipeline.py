@@ -0,0 +1,226 @@
+import queue
+import threading
+import time
+
+# Políticas de fila entre estágios
+#   "newest": câmera ao vivo, descarta o frame mais antigo quando a fila enche
+#   "never":  vídeo offline, bloqueia o produtor e nunca perde frame
+DROP_NEWEST = "newest"
+DROP_NEVER = "never"
+
+# Marca de fim de fluxo repassada de um estágio para o próximo
+END_OF_STREAM = object()
+
+
+class FrameQueue:
+    """ Fila limitada entre estágios com contador de descartes """
+
+    def __init__(self, maxsize=2, policy=DROP_NEWEST):
+        if policy not in (DROP_NEWEST, DROP_NEVER):
+            raise ValueError(f"Política de fila inválida: {policy}")
+        self.policy = policy
+        self.dropped = 0
+        self._q = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def put(self, item, stop_event=None):
+        """ Enfileira o item. Retorna False se o pipeline foi parado durante a espera. """
+        if self.policy == DROP_NEVER or item is END_OF_STREAM:
+            while True:
+                try:
+                    self._q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+
+        # "newest": nunca bloqueia, o frame velho sai para o novo entrar
+        with self._lock:
+            while True:
+                try:
+                    self._q.put_nowait(item)
+                    return True
+                except queue.Full:
+                    try:
+                        stale = self._q.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if stale is END_OF_STREAM:
+                        # Fim de fluxo nunca é descartado
+                        self._q.put_nowait(stale)
+                        return False
+                    self.dropped += 1
+
+    def get(self, timeout=0.1):
+        """ Retorna o próximo item ou None se nada chegou dentro do timeout """
+        try:
+            return self._q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self):
+        return self._q.qsize()
+
+
+class StageStats:
+    """ Métricas de um estágio: itens processados, descartes, profundidade da fila e tempo médio """
+
+    def __init__(self, name, in_queue=None):
+        self.name = name
+        self.in_queue = in_queue
+        self.processed = 0
+        self.busy_time = 0.0
+        self.last_ms = 0.0
+        self.extra_drops = 0
+        self.first_time = None
+
+    def record(self, elapsed):
+        if self.first_time is None:
+            self.first_time = time.time() - elapsed
+        self.processed += 1
+        self.busy_time += elapsed
+        self.last_ms = elapsed * 1000
+
+    def snapshot(self):
+        drops = self.extra_drops + (self.in_queue.dropped if self.in_queue is not None else 0)
+        return {
+            "stage": self.name,
+            "processed": self.processed,
+            "dropped": drops,
+            "queue_depth": self.in_queue.depth() if self.in_queue is not None else 0,
+            "avg_ms": (self.busy_time / self.processed * 1000) if self.processed else 0.0,
+            "last_ms": self.last_ms,
+            "fps": self.throughput(),
+        }
+
+    def throughput(self):
+        """ Itens por segundo desde o primeiro item processado """
+        if self.first_time is None:
+            return 0.0
+        elapsed = time.time() - self.first_time
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Thread dedicada ao cap.read(). Mantém a decodificação fora do loop de inferência.
+    Cada item enfileirado é (indice_frame, timestamp, frame). `tap(idx, timestamp, frame)`,
+    se dado, vê todos os frames lidos, inclusive os que a fila descarta (ex.: evidence.py).
+    """
+
+    def __init__(self, cap, out_queue, stop_event, name="captura", tap=None):
+        super().__init__(name=name, daemon=True)
+        self.cap = cap
+        self.tap = tap
+        self.out_queue = out_queue
+        self.stop_event = stop_event
+        # Cada estágio reporta a fila de ENTRADA; a captura lê direto do dispositivo
+        self.stats = StageStats(name)
+
+    def run(self):
+        idx = 0
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            self.stats.record(time.perf_counter() - t0)
+            timestamp = time.time()
+            if self.tap is not None:
+                self.tap(idx, timestamp, frame)
+            if not self.out_queue.put((idx, timestamp, frame), self.stop_event):
+                break
+            idx += 1
+        self.out_queue.put(END_OF_STREAM, self.stop_event)
+
+    def snapshot(self):
+        return self.stats.snapshot()
+
+
+class BatchWorker(threading.Thread):
+    """
+    Estágio de inferência multi-câmera: junta o frame mais recente de cada fluxo e
+    chama `fn` uma vez com a lista [(indice_fluxo, item), ...], devolvendo um
+    resultado por item na fila de saída do fluxo correspondente.
+
+    Fluxos "never" (vídeo) esperam o próximo frame para o lote sair completo;
+    fluxos "newest" (câmera) esperam no máximo `gather_timeout` segundos.
+    """
+
+    def __init__(self, name, fn, in_queues, out_queues, stop_event, gather_timeout=0.02):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.in_queues = in_queues
+        self.out_queues = out_queues
+        self.stop_event = stop_event
+        self.gather_timeout = gather_timeout
+        self.stats = StageStats(name)
+        if len(in_queues) == 1:
+            self.stream_stats = [StageStats(name, in_queues[0])]
+        else:
+            self.stream_stats = [StageStats(f"{name}[{i}]", q) for i, q in enumerate(in_queues)]
+        self.batch_sizes = 0
+        self.error = None
+
+    def _next(self, i):
+        q = self.in_queues[i]
+        if q.policy == DROP_NEVER:
+            while not self.stop_event.is_set():
+                item = q.get()
+                if item is not None:
+                    return item
+            return None
+        return q.get(timeout=self.gather_timeout)
+
+    def run(self):
+        active = list(range(len(self.in_queues)))
+        try:
+            while active and not self.stop_event.is_set():
+                batch = []
+                for i in list(active):
+                    item = self._next(i)
+                    if item is END_OF_STREAM:
+                        active.remove(i)
+                        self.out_queues[i].put(END_OF_STREAM, self.stop_event)
+                    elif item is not None:
+                        batch.append((i, item))
+                if not batch:
+                    continue
+
+                t0 = time.perf_counter()
+                outputs = self.fn(batch)
+                elapsed = time.perf_counter() - t0
+                self.stats.record(elapsed)
+                self.batch_sizes += len(batch)
+                for (i, _), out in zip(batch, outputs):
+                    self.stream_stats[i].record(elapsed)
+                    if out is not None:
+                        self.out_queues[i].put(out, self.stop_event)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            for i in active:
+                self.out_queues[i].put(END_OF_STREAM, self.stop_event)
+
+    def avg_batch(self):
+        return self.batch_sizes / self.stats.processed if self.stats.processed else 0.0
+
+    def snapshot(self):
+        """ Um snapshot por fluxo (fila, descartes, fps do fluxo) """
+        return [s.snapshot() for s in self.stream_stats]
+
+
+def resolve_drop_policy(policy, source):
+    """ "auto": câmera ao vivo descarta frames velhos, arquivo de vídeo nunca descarta """
+    if policy != "auto":
+        return policy
+    return DROP_NEWEST if str(source).isdigit() else DROP_NEVER
+
+
+def format_stats(snapshots):
+    """ Linha compacta para log/HUD: estagio fila/descartes/ms/vazão """
+    parts = []
+    for s in snapshots:
+        parts.append(f"{s['stage']}: q={s['queue_depth']} drop={s['dropped']} {s['avg_ms']:.1f}ms {s['fps']:.1f}/s")
+    return " | ".join(parts)
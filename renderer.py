@@ -0,0 +1,246 @@
+import time
+import cv2
+import numpy as np
+
+# Cores (BGR)
+COLOR_CONFIRMED = (50, 205, 50)     # Verde
+COLOR_TRACKING = (0, 140, 255)      # Laranja
+COLOR_LOCKED = (255, 215, 0)        # Dourado (Novo: Identificado e Travado)
+COLOR_HUD_BG = (30, 30, 30)
+COLOR_LINE_A = (0, 165, 255)
+COLOR_LINE_B = (0, 255, 127)
+COLOR_ZONE = (255, 0, 200)
+COLOR_ROI = (120, 120, 120)
+LINE_COLORS = [COLOR_LINE_A, COLOR_LINE_B]
+
+HUD_HEIGHT = 100
+STATIC_TILE = 16
+LABEL_FONT = cv2.FONT_HERSHEY_DUPLEX
+
+# Limite de sprites de texto guardados (placar, rótulos por track, cronômetro...)
+SPRITE_CACHE_SIZE = 2048
+
+
+def clip_rect(shape, x0, y0, x1, y1):
+    height, width = shape[:2]
+    return max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+
+
+class HudRenderer:
+    """
+    Desenho do HUD sem realocar o frame a cada quadro.
+
+    A camada estática (faixa do HUD, linhas/zonas com legendas, ROI e títulos fixos)
+    é composta uma vez por resolução: traços e textos viram recortes (cor + alfa do
+    antialiasing) misturados só onde há desenho, e os fundos semitransparentes viram
+    blends em retângulos com um patch de cor pré-alocado. Textos que mudam pouco
+    (rótulos dos tracks, placar, cronômetro, FPS) viram sprites guardados em cache com
+    o tamanho já medido; os sem fundo usam a mesma mistura por alfa da camada estática.
+    """
+
+    def __init__(self, counting, roi):
+        self.counting = counting
+        self.roi = roi
+        self._static_key = None
+        self._blends = []  # (y0, y1, x0, x1, alpha_frame, patch, gamma)
+        self._strokes = []  # (y0, y1, x0, x1, cores, alfa, 1 - alfa)
+        self._sprites = {}
+        self._sizes = {}
+
+    # --- Camada estática ---
+
+    def _build_static(self, shape):
+        height, width = shape[:2]
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        blends = []
+
+        def blend(x0, y0, x1, y1, color, alpha_color, gamma=0.0):
+            x0, y0, x1, y1 = clip_rect(shape, x0, y0, x1, y1)
+            if x1 > x0 and y1 > y0:
+                patch = np.full((y1 - y0, x1 - x0, 3), color, dtype=np.uint8)
+                blends.append((y0, y1, x0, x1, 1.0 - alpha_color, patch, gamma))
+
+        def text(txt, pos, font, scale, color, thickness):
+            cv2.putText(layer, txt, pos, font, scale, color, thickness, cv2.LINE_AA)
+            cv2.putText(mask, txt, pos, font, scale, 255, thickness, cv2.LINE_AA)
+
+        def caption(txt, pos, color):
+            # Fundo preto 60% + texto
+            (t_w, t_h), _ = self.text_size(txt, LABEL_FONT, 0.5, 1)
+            x, y = pos
+            blend(x - 5, y - t_h - 5, x + t_w + 5, y + 5, (0, 0, 0), 0.6, 1.0)
+            text(txt, pos, LABEL_FONT, 0.5, color, 1)
+
+        blend(0, 0, width, HUD_HEIGHT, COLOR_HUD_BG, 0.85)
+
+        for i, line in enumerate(self.counting.lines):
+            color = line.color or LINE_COLORS[i % len(LINE_COLORS)]
+            a, b = tuple(int(v) for v in line.a), tuple(int(v) for v in line.b)
+            cv2.line(layer, a, b, color, 2, cv2.LINE_AA)
+            cv2.line(mask, a, b, 255, 2, cv2.LINE_AA)
+            x, y = a if a[0] <= b[0] else b
+            caption(line.label, (x + 10, y - 10), color)
+        if self.roi.active and self.roi.rect is not None:
+            x0, y0, x1, y1 = self.roi.rect
+            cv2.rectangle(layer, (x0, y0), (x1 - 1, y1 - 1), COLOR_ROI, 1, cv2.LINE_AA)
+            cv2.rectangle(mask, (x0, y0), (x1 - 1, y1 - 1), 255, 1, cv2.LINE_AA)
+        for zone in self.counting.zones:
+            color = zone.color or COLOR_ZONE
+            poly = zone.poly.astype(np.int32)
+            cv2.polylines(layer, [poly], True, color, 2, cv2.LINE_AA)
+            cv2.polylines(mask, [poly], True, 255, 2, cv2.LINE_AA)
+            x, y = poly[np.argmin(poly[:, 1])]
+            caption(zone.label, (int(x) + 10, int(y) - 10), color)
+
+        text("TEMPO ATIVO", (width - 160, 25), cv2.FONT_HERSHEY_PLAIN, 1.0, (150, 150, 150), 1)
+        text("PRODUCAO:", (20, 25), cv2.FONT_HERSHEY_PLAIN, 1.2, (180, 180, 180), 1)
+
+        # Só os trechos com desenho: grade de STATIC_TILE px, blocos vizinhos da mesma faixa
+        # viram um retângulo (uma linha horizontal inteira = uma mistura). A camada foi
+        # desenhada sobre preto (cor * alfa, alfa = máscara / 255): divide de volta pela cobertura
+        alpha = mask.astype(np.float32) / 255.0
+        colors = np.clip(layer / np.maximum(alpha, 1e-3)[..., None], 0, 255).astype(np.uint8)
+        strokes = []
+        for y0 in range(0, height, STATIC_TILE):
+            y1 = min(height, y0 + STATIC_TILE)
+            band = mask[y0:y1]
+            active = [band[:, x:x + STATIC_TILE].any() for x in range(0, width, STATIC_TILE)] + [False]
+            start = None
+            for i, on in enumerate(active):
+                if on and start is None:
+                    start = i
+                elif not on and start is not None:
+                    x0, x1 = start * STATIC_TILE, min(width, i * STATIC_TILE)
+                    a = alpha[y0:y1, x0:x1].copy()
+                    strokes.append((y0, y1, x0, x1, colors[y0:y1, x0:x1].copy(), a, 1.0 - a))
+                    start = None
+
+        self._blends = blends
+        self._strokes = strokes
+
+    def draw_static(self, frame):
+        key = (frame.shape, self.roi.rect, self.counting.resolved_shape)
+        if key != self._static_key:
+            self._build_static(frame.shape)
+            self._static_key = key
+        for y0, y1, x0, x1, alpha_frame, patch, gamma in self._blends:
+            sub = frame[y0:y1, x0:x1]
+            cv2.addWeighted(sub, alpha_frame, patch, 1.0 - alpha_frame, gamma, sub)
+        for y0, y1, x0, x1, colors, alpha, inv_alpha in self._strokes:
+            sub = frame[y0:y1, x0:x1]
+            cv2.blendLinear(colors, sub, alpha, inv_alpha, sub)
+
+    # --- Texto em cache ---
+
+    def text_size(self, text, font, scale, thickness):
+        key = (text, font, scale, thickness)
+        size = self._sizes.get(key)
+        if size is None:
+            if len(self._sizes) >= SPRITE_CACHE_SIZE:
+                self._sizes.clear()
+            size = self._sizes[key] = cv2.getTextSize(text, font, scale, thickness)
+        return size
+
+    def _sprite(self, key, build):
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            if len(self._sprites) >= SPRITE_CACHE_SIZE:
+                self._sprites.clear()
+            sprite = self._sprites[key] = build()
+        return sprite
+
+    def text_sprite(self, text, font, scale, color, thickness):
+        """ Texto sem fundo: (cores, (alfa, 1 - alfa) do antialiasing, deslocamento do topo até a linha de base) """
+        def build():
+            (w, h), base = self.text_size(text, font, scale, thickness)
+            pad = thickness + 1
+            canvas = np.zeros((h + base + 2 * pad, w + 2 * pad), dtype=np.uint8)
+            cv2.putText(canvas, text, (pad, h + pad), font, scale, 255, thickness, cv2.LINE_AA)
+            colors = np.empty(canvas.shape + (3,), dtype=np.uint8)
+            colors[:] = color
+            alpha = canvas.astype(np.float32) / 255.0
+            return colors, (alpha, 1.0 - alpha), (-pad, -(h + pad))
+        return self._sprite(("text", text, font, scale, color, thickness), build)
+
+    def box_sprite(self, text, font, scale, color, text_color, thickness, height, baseline, pad_x=0, extra_w=0):
+        """ Texto sobre retângulo sólido (rótulos dos tracks, placar): um patch opaco pronto """
+        def build():
+            (w, _), _ = self.text_size(text, font, scale, thickness)
+            patch = np.empty((height + 1, w + extra_w + 1, 3), dtype=np.uint8)
+            patch[:] = color
+            cv2.putText(patch, text, (pad_x, baseline), font, scale, text_color, thickness, cv2.LINE_AA)
+            return patch
+        return self._sprite(("box", text, font, scale, color, text_color, thickness, height, baseline, pad_x, extra_w), build)
+
+    @staticmethod
+    def paste(frame, patch, x, y, alpha=None):
+        """
+        Copia `patch` com canto superior esquerdo em (x, y), cortando o que sai do frame.
+        Com `alpha` = (alfa, 1 - alfa), mistura como os traços da camada estática.
+        """
+        h, w = patch.shape[:2]
+        x0, y0, x1, y1 = clip_rect(frame.shape, x, y, x + w, y + h)
+        if x1 <= x0 or y1 <= y0:
+            return
+        src = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        if alpha is None:
+            frame[y0:y1, x0:x1] = patch[src]
+        else:
+            sub = frame[y0:y1, x0:x1]
+            cv2.blendLinear(patch[src], sub, alpha[0][src], alpha[1][src], sub)
+
+    def put_text(self, frame, text, pos, font, scale, color, thickness):
+        colors, alpha, (dx, dy) = self.text_sprite(text, font, scale, color, thickness)
+        self.paste(frame, colors, pos[0] + dx, pos[1] + dy, alpha)
+
+    # --- Quadro ---
+
+    def render(self, packet, fps, stats_line=None):
+        """ HUD, linhas, caixas e placar desenhados direto no frame do pacote """
+        frame = packet["frame"]
+        height, width, _ = frame.shape
+
+        self.draw_static(frame)
+
+        # Cronômetro
+        elapsed = int(time.time() - packet["start_time"])
+        hours, rem = divmod(elapsed, 3600)
+        minutes, seconds = divmod(rem, 60)
+        self.put_text(frame, f"{hours:02}:{minutes:02}:{seconds:02}", (width - 160, 55), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2)
+
+        # FPS (Bottom Right, Simple Font, Green)
+        self.put_text(frame, f"FPS: {int(fps)}", (width - 120, height - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Filas e descartes por estágio (Bottom Left): muda a cada quadro, não vale cache
+        if stats_line:
+            cv2.putText(frame, stats_line, (10, height - 20), cv2.FONT_HERSHEY_PLAIN, 0.9, (200, 200, 200), 1, cv2.LINE_AA)
+
+        for x1, y1, x2, y2, cx, cy, track_id, class_name, status_icon in packet["detections"]:
+            # --- Visualização ---
+            if status_icon == "CHECK":
+                color = COLOR_CONFIRMED
+            elif status_icon == "LOCK":
+                color = COLOR_TRACKING
+            else:
+                color = COLOR_LOCKED
+
+            # Bounding Box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2, cv2.LINE_AA)
+
+            # Label estilizada
+            label = f" #{track_id} {class_name} [{status_icon}] "
+            text_color = (0,0,0) if status_icon == "CHECK" else (255,255,255)
+            self.paste(frame, self.box_sprite(label, LABEL_FONT, 0.5, color, text_color, 1, 25, 17), x1, y1 - 25)
+            cv2.circle(frame, (cx, cy), 3, (0,255,255), -1, cv2.LINE_AA)
+
+        # Placar
+        x_offset = 20
+        for class_name, count in packet["counters"].items():
+            text = f"{class_name.upper()}  {count:03d}"
+            (tw, th), _ = self.text_size(text, LABEL_FONT, 0.8, 1)
+            patch = self.box_sprite(text, LABEL_FONT, 0.8, (50, 50, 50), COLOR_CONFIRMED, 1, th + 15, th + 5, pad_x=5, extra_w=10)
+            self.paste(frame, patch, x_offset, 35)
+            x_offset += tw + 30
+
+        return frame
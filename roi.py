@@ -0,0 +1,138 @@
+import math
+import cv2
+import numpy as np
+
+ROI_MODES = ["off", "band", "polygon"]
+
+# Cinza do letterbox do YOLO: pixels fora do polígono não geram detecção
+FILL_VALUE = 114
+
+
+class RoiCropper:
+    """
+    Recorta a região útil da esteira antes da inferência e devolve as caixas/máscaras
+    em coordenadas do frame inteiro, para rastreamento e desenho seguirem iguais.
+
+    Modos:
+      off     - frame inteiro
+      band    - retângulo que envolve as linhas/zonas de contagem + margem
+      polygon - retângulo do polígono fixo `points`; fora do polígono vira cinza
+
+    O imgsz do recorte mantém a mesma densidade de pixels do frame inteiro
+    (lado maior do recorte * imgsz_base / lado maior do frame), então o modelo vê
+    as peças no mesmo tamanho e gasta CPU só com a área recortada.
+    """
+
+    def __init__(self, mode="off", margin=0.1, points=None):
+        if mode not in ROI_MODES:
+            raise ValueError(f"Modo de ROI inválido: {mode} (opções: {ROI_MODES})")
+        if mode == "polygon" and not points:
+            raise ValueError("ROI 'polygon' exige 'points'")
+        self.mode = mode
+        self.margin = margin
+        self.points = points
+        self.shape = None
+        self.rect = None # (x0, y0, x1, y1)
+        self._mask = None
+        self._buffer = None
+
+    @classmethod
+    def from_config(cls, config, mode=None, margin=None):
+        """ Bloco `roi:` da câmera no counting.yaml; `mode`/`margin` da linha de comando têm prioridade """
+        cfg = dict((config or {}).get("roi") or {})
+        if mode is not None:
+            cfg["mode"] = mode
+        if margin is not None:
+            cfg["margin"] = margin
+        return cls(cfg.get("mode", "off"), cfg.get("margin", 0.1), cfg.get("points"))
+
+    @property
+    def active(self):
+        return self.mode != "off"
+
+    def resolve(self, frame_shape, counting):
+        """ Calcula o retângulo (uma vez por resolução). `counting` já precisa estar resolvido. """
+        height, width = frame_shape[:2]
+        if self.shape == (height, width):
+            return
+        self.shape = (height, width)
+        self._mask = None
+        self._buffer = None
+        if self.mode == "off":
+            self.rect = (0, 0, width, height)
+            return
+
+        if self.mode == "band":
+            pts = []
+            for line in counting.lines:
+                pts.extend([line.a, line.b])
+            for zone in counting.zones:
+                pts.extend(zone.poly)
+            pts = np.asarray(pts, dtype=np.float32)
+        else:
+            pts = np.asarray(self.points, dtype=np.float32).reshape(-1, 2)
+            if np.all((pts >= 0) & (pts <= 1)):
+                pts = pts * np.array([width, height], dtype=np.float32)
+            poly_mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(poly_mask, [pts.astype(np.int32)], 255)
+
+        mx, my = self.margin * width, self.margin * height
+        x0 = int(max(0, math.floor(pts[:, 0].min() - mx)))
+        y0 = int(max(0, math.floor(pts[:, 1].min() - my)))
+        x1 = int(min(width, math.ceil(pts[:, 0].max() + mx)))
+        y1 = int(min(height, math.ceil(pts[:, 1].max() + my)))
+        self.rect = (x0, y0, x1, y1)
+
+        if self.mode == "polygon":
+            # Máscara "fora do polígono" já no tamanho do recorte
+            self._mask = poly_mask[y0:y1, x0:x1] == 0
+            self._buffer = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+
+    def imgsz(self, base_imgsz):
+        """ imgsz do recorte com a mesma escala que `base_imgsz` teria no frame inteiro """
+        if not self.active or self.shape is None:
+            return base_imgsz
+        height, width = self.shape
+        x0, y0, x1, y1 = self.rect
+        scale = (base_imgsz or 640) / max(width, height)
+        return max(32, int(math.ceil(max(x1 - x0, y1 - y0) * scale / 32) * 32))
+
+    def crop(self, frame):
+        if not self.active:
+            return frame
+        x0, y0, x1, y1 = self.rect
+        view = frame[y0:y1, x0:x1]
+        if self._mask is None:
+            return view
+        np.copyto(self._buffer, view)
+        self._buffer[self._mask] = FILL_VALUE
+        return self._buffer
+
+    def restore(self, result, frame):
+        """ Results do recorte -> Results no frame inteiro (caixas deslocadas, máscaras reposicionadas) """
+        if not self.active:
+            return result
+        # torch/ultralytics só aqui: o main.py lê ROI_MODES sem esperar o import pesado
+        import torch
+        from ultralytics.engine.results import Results
+        from ultralytics.utils import ops
+
+        x0, y0, x1, y1 = self.rect
+        boxes = result.boxes.data.clone()
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+
+        masks = None
+        if result.masks is not None and len(boxes):
+            # Máscaras no tamanho do recorte, coladas na posição dele dentro do frame
+            crop_masks = ops.scale_masks(result.masks.data[None].float(), (y1 - y0, x1 - x0))[0]
+            masks = torch.zeros((len(crop_masks), frame.shape[0], frame.shape[1]), dtype=crop_masks.dtype, device=crop_masks.device)
+            masks[:, y0:y1, x0:x1] = crop_masks
+
+        restored = Results(frame, path=result.path, names=result.names, boxes=boxes, masks=masks)
+        restored.speed = result.speed
+        lazy = getattr(result, "lazy_masks", None)
+        if lazy is not None:
+            # --masks lazy: nada a decodificar agora, só onde o recorte fica no frame
+            restored.lazy_masks = lazy.shifted(x0, y0, frame.shape[:2])
+        return restored
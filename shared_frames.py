@@ -0,0 +1,231 @@
+import json
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Nome padrão do bloco compartilhado entre main.py (escritor) e app.py (leitor)
+DEFAULT_SHM_NAME = "visioncount_frames"
+
+MAGIC = 0x56434631 # "VCF1"
+STATE_BYTES = 64 * 1024
+
+# Cabeçalho: vetor int64 no início do bloco
+H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, H_FRAME_SEQ, H_STATE_SEQ, H_STATE_LEN, H_CLOSED = range(10)
+HEADER_FIELDS = 16
+
+
+def _layout(slots):
+    """ Offsets (em bytes) de cada região: cabeçalho | seq por slot | estado JSON | frames """
+    header_bytes = HEADER_FIELDS * 8
+    slot_seq_offset = header_bytes
+    state_offset = slot_seq_offset + slots * 8
+    frames_offset = state_offset + STATE_BYTES
+    # Alinha os frames em 64 bytes
+    frames_offset = (frames_offset + 63) // 64 * 64
+    return slot_seq_offset, state_offset, frames_offset
+
+
+class FrameRingWriter:
+    """
+    Ring buffer em memória compartilhada com os últimos frames anotados e o estado do placar.
+    Com slots=0 só o estado é publicado (placar/métricas, sem frames para a visualização ao vivo).
+    Cada slot tem um número de sequência (seqlock): ímpar enquanto está sendo escrito,
+    par quando pronto. O leitor recebe uma view numpy do slot sem cópia e confere a
+    sequência depois de usar para saber se o escritor já sobrescreveu aquele slot.
+    """
+
+    def __init__(self, name=DEFAULT_SHM_NAME, shape=(480, 640, 3), slots=3):
+        height, width, channels = shape
+        slot_seq_offset, state_offset, frames_offset = _layout(slots)
+        size = frames_offset + slots * height * width * channels
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Sobra de uma execução anterior que não fechou direito
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.name = name
+        self.slots = slots
+        self.shape = (height, width, channels)
+        buf = self.shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=slot_seq_offset)
+        self.state_buf = np.ndarray((STATE_BYTES,), dtype=np.uint8, buffer=buf, offset=state_offset)
+        self.frames = np.ndarray((slots, height, width, channels), dtype=np.uint8, buffer=buf, offset=frames_offset)
+
+        self.header[:] = 0
+        self.slot_seq[:] = 0
+        self.header[H_SLOTS] = slots
+        self.header[H_HEIGHT] = height
+        self.header[H_WIDTH] = width
+        self.header[H_CHANNELS] = channels
+        self.header[H_LATEST] = -1
+        self.header[H_MAGIC] = MAGIC # por último: leitor só confia no bloco depois disso
+        self._frame_seq = 0
+
+    def write_frame(self, frame):
+        """ Copia o frame para o próximo slot do anel (única cópia do caminho quente) """
+        if not self.slots:
+            raise ValueError("Buffer criado sem slots de frame (só estado)")
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame {frame.shape} não bate com o buffer {self.shape}")
+        self._frame_seq += 1
+        slot = self._frame_seq % self.slots
+        seq = int(self.slot_seq[slot])
+        self.slot_seq[slot] = seq + 1       # ímpar: escrevendo
+        np.copyto(self.frames[slot], frame)
+        self.slot_seq[slot] = seq + 2       # par: pronto
+        self.header[H_LATEST] = slot
+        self.header[H_FRAME_SEQ] = self._frame_seq
+        return self._frame_seq
+
+    def write_state(self, state):
+        """ Publica o estado (placar, métricas) como JSON na região fixa """
+        data = json.dumps(state, separators=(",", ":")).encode("utf-8")
+        if len(data) > STATE_BYTES:
+            raise ValueError(f"Estado com {len(data)} bytes excede {STATE_BYTES}")
+        seq = int(self.header[H_STATE_SEQ])
+        self.header[H_STATE_SEQ] = seq + 1
+        self.state_buf[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self.header[H_STATE_LEN] = len(data)
+        self.header[H_STATE_SEQ] = seq + 2
+
+    def close(self):
+        self.header[H_CLOSED] = 1
+        # Solta as views antes de fechar o mapeamento
+        del self.header, self.slot_seq, self.state_buf, self.frames
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameRingReader:
+    """
+    Leitor do ring buffer. Uso:
+
+        reader = FrameRingReader.attach()
+        view = reader.latest_frame()       # FrameView ou None
+        if view is not None:
+            img = view.array                # view numpy, sem cópia
+            ... usa img ...
+            if not view.valid(): descarta   # escritor sobrescreveu o slot no meio
+        state = reader.read_state()
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        buf = shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        slots = int(self.header[H_SLOTS])
+        height, width, channels = (int(self.header[H_HEIGHT]), int(self.header[H_WIDTH]), int(self.header[H_CHANNELS]))
+        slot_seq_offset, state_offset, frames_offset = _layout(slots)
+        self.slots = slots
+        self.shape = (height, width, channels)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=slot_seq_offset)
+        self.state_buf = np.ndarray((STATE_BYTES,), dtype=np.uint8, buffer=buf, offset=state_offset)
+        self.frames = np.ndarray((slots, height, width, channels), dtype=np.uint8, buffer=buf, offset=frames_offset)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_SHM_NAME):
+        """ Conecta a um bloco existente. Retorna None se o escritor não está rodando. """
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return None
+        if os.name == "posix":
+            # Só o escritor é dono do bloco; sem isso o resource_tracker do leitor faria unlink ao sair
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+            except Exception:
+                pass
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        if int(header[H_MAGIC]) != MAGIC:
+            del header
+            shm.close()
+            return None
+        del header
+        return cls(shm)
+
+    @property
+    def closed(self):
+        return bool(self.header[H_CLOSED])
+
+    @property
+    def frame_seq(self):
+        return int(self.header[H_FRAME_SEQ])
+
+    @property
+    def state_seq(self):
+        """ Muda a cada write_state: permite detectar estado novo sem decodificar o JSON """
+        return int(self.header[H_STATE_SEQ])
+
+    def latest_frame(self):
+        slot = int(self.header[H_LATEST])
+        if slot < 0:
+            return None
+        seq = int(self.slot_seq[slot])
+        if seq % 2 == 1:
+            return None
+        return FrameView(self, slot, seq, int(self.header[H_FRAME_SEQ]))
+
+    def wait_frame(self, last_seq=0, timeout=1.0, poll=0.005):
+        """ Espera um frame mais novo que `last_seq`. Retorna FrameView ou None no timeout. """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.frame_seq > last_seq:
+                view = self.latest_frame()
+                if view is not None:
+                    return view
+            time.sleep(poll)
+        return None
+
+    def read_state(self, retries=5):
+        """ Último estado publicado (dict) ou None """
+        for _ in range(retries):
+            seq = int(self.header[H_STATE_SEQ])
+            if seq == 0:
+                return None
+            if seq % 2 == 1:
+                time.sleep(0.001)
+                continue
+            length = int(self.header[H_STATE_LEN])
+            data = self.state_buf[:length].tobytes()
+            if int(self.header[H_STATE_SEQ]) == seq:
+                return json.loads(data.decode("utf-8"))
+        return None
+
+    def close(self):
+        del self.header, self.slot_seq, self.state_buf, self.frames
+        self.shm.close()
+
+
+class FrameView:
+    """ View sem cópia de um slot do anel, com verificação de validade pelo seqlock """
+
+    __slots__ = ("reader", "slot", "seq", "frame_seq")
+
+    def __init__(self, reader, slot, seq, frame_seq):
+        self.reader = reader
+        self.slot = slot
+        self.seq = seq
+        self.frame_seq = frame_seq
+
+    @property
+    def array(self):
+        return self.reader.frames[self.slot]
+
+    def valid(self):
+        return int(self.reader.slot_seq[self.slot]) == self.seq
+
+    def copy(self):
+        """ Cópia estável do frame, ou None se o slot foi sobrescrito durante a cópia """
+        img = self.array.copy()
+        return img if self.valid() else None
@@ -13,12 +13,14 @@ async function startSystem() {
     const conf = document.getElementById('conf').value / 100;
     const source = document.getElementById('camera').value;
     const model = document.getElementById('model').value;
+    const worker = document.getElementById('worker').checked;
+    const evidence = document.getElementById('evidence').checked ? 'count' : 'off';
 
     try {
         const response = await fetch(`${API_URL}/start-system`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ source, model, conf })
+            body: JSON.stringify({ source, model, conf, worker, evidence })
         });
         const data = await response.json();
 
@@ -75,6 +77,23 @@ async function stopSystem() {
     }
 }
 
+async function updateConf() {
+    // Resident worker only: applied on the next frame, no restart
+    if (!document.getElementById('worker').checked) return;
+    if (document.getElementById('btn-stop-system').style.display === 'none') return;
+
+    const conf = document.getElementById('conf').value / 100;
+    try {
+        await fetch(`${API_URL}/system/params`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ conf })
+        });
+    } catch (e) {
+        // Next change will try again
+    }
+}
+
 async function startCapture() {
     const statusEl = document.getElementById('status-capture');
     statusEl.innerText = "Abrindo...";
@@ -133,30 +152,122 @@ async function startTrain() {
     }
 }
 
-// Polling to check system status and update UI
-setInterval(async () => {
-    try {
-        const response = await fetch(`${API_URL}/status`);
-        const status = await response.json();
-
-        // Check system status
-        if (status.system === 'stopped') {
-            const startBtn = document.getElementById('btn-start-system');
-            const stopBtn = document.getElementById('btn-stop-system');
-            const statusEl = document.getElementById('status-system');
-
-            if (stopBtn.style.display !== 'none') {
-                // Process ended externally, reset UI
-                statusEl.innerText = "Offline";
-                statusEl.classList.remove('active');
-
-                stopBtn.style.display = 'none';
-                startBtn.style.display = 'block';
-                startBtn.disabled = false;
-                startBtn.innerText = "INICIAR SISTEMA";
-            }
+function updateProcessStatus(status) {
+    // Check system status
+    if (status.system === 'stopped') {
+        const startBtn = document.getElementById('btn-start-system');
+        const stopBtn = document.getElementById('btn-stop-system');
+        const statusEl = document.getElementById('status-system');
+
+        if (stopBtn.style.display !== 'none') {
+            // Process ended externally, reset UI
+            statusEl.innerText = "Offline";
+            statusEl.classList.remove('active');
+
+            stopBtn.style.display = 'none';
+            startBtn.style.display = 'block';
+            startBtn.disabled = false;
+            startBtn.innerText = "INICIAR SISTEMA";
         }
+    }
+}
+
+function renderLiveMetrics(streams) {
+    const container = document.getElementById('live-metrics');
+    const names = Object.keys(streams);
+    if (names.length === 0) {
+        container.style.display = 'none';
+        return;
+    }
+    container.style.display = 'block';
+    container.replaceChildren();
+
+    for (const name of names) {
+        const state = streams[name];
+        const block = document.createElement('div');
+        block.className = 'live-stream';
+
+        const header = document.createElement('div');
+        header.className = 'live-header';
+        const tracks = state.tracks ? state.tracks.live : 0;
+        const skipped = state.gate ? ` | pulados ${(state.gate.skip_ratio * 100).toFixed(0)}%` : '';
+        const a = state.adaptive;
+        const adaptive = a ? ` | adaptativo ${a.imgsz}px 1/${a.stride} render 1/${a.render_every} (alvo ${a.target_fps} FPS)` : '';
+        header.textContent = `${state.source}: ${state.fps.toFixed(1)} FPS | IA ${state.infer_fps.toFixed(1)}/s | ${tracks} tracks${skipped}${adaptive}`;
+        block.appendChild(header);
+
+        const stages = document.createElement('div');
+        stages.className = 'live-stages';
+        stages.textContent = (state.stages || [])
+            .map(s => `${s.stage}: ${s.avg_ms.toFixed(1)}ms q=${s.queue_depth} drop=${s.dropped}`)
+            .join(' | ');
+        block.appendChild(stages);
+
+        const counters = document.createElement('div');
+        counters.className = 'live-counters';
+        for (const [cls, count] of Object.entries(state.counters || {})) {
+            const item = document.createElement('span');
+            item.textContent = `${cls}: ${count}`;
+            counters.appendChild(item);
+        }
+        block.appendChild(counters);
+
+        const e = state.evidence;
+        if (e) {
+            const evidence = document.createElement('div');
+            evidence.className = 'live-stages';
+            evidence.textContent = `evidência: buffer ${e.buffer_seconds.toFixed(1)}s ${(e.buffer_bytes / 1e6).toFixed(1)} MB | ` +
+                `fila ${e.encode_backlog} | ${e.clips_written} clipes | disco ${(e.disk_bytes / 1e6).toFixed(0)} MB `;
+            const clipBtn = document.createElement('button');
+            clipBtn.className = 'btn btn-warning';
+            clipBtn.textContent = 'SALVAR CLIPE';
+            // pointerdown: the block is rebuilt on every event, a click could land on a replaced button
+            clipBtn.onpointerdown = () => requestClip(state.source);
+            evidence.appendChild(clipBtn);
+            block.appendChild(evidence);
+        }
+        container.appendChild(block);
+    }
+}
+
+async function requestClip(source) {
+    // main.py picks the request up within half a second and writes the clip in the background
+    try {
+        await fetch(`${API_URL}/evidence/clip`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ source: String(source) })
+        });
     } catch (e) {
-        // Silently fail if server is down
+        console.error("Clip request failed", e);
+    }
+}
+
+function updateLiveView(names) {
+    // One MJPEG <img> per publishing stream, kept across events so the connection is not reopened
+    const container = document.getElementById('live-view');
+    for (const img of [...container.children]) {
+        if (!names.includes(img.dataset.stream)) {
+            img.src = '';  // closes the MJPEG connection
+            img.remove();
+        }
+    }
+    for (const name of names) {
+        if (container.querySelector(`img[data-stream="${name}"]`)) continue;
+        const img = document.createElement('img');
+        img.dataset.stream = name;
+        img.alt = name;
+        img.src = `${API_URL}/live-view?stream=${encodeURIComponent(name)}&fps=10`;
+        container.appendChild(img);
     }
-}, 2000); // Check every 2 seconds
+}
+
+// Process status and live metrics pushed by the server (Server-Sent Events).
+// EventSource reconnects on its own if the server restarts.
+const liveEvents = new EventSource(`${API_URL}/live-events?hz=5`);
+liveEvents.onmessage = (event) => {
+    const data = JSON.parse(event.data);
+    updateProcessStatus(data.processes);
+    renderLiveMetrics(data.streams);
+    updateLiveView(Object.keys(data.streams));
+};
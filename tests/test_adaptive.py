@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+from adaptive import AdaptiveController
+
+
+def make_controller(**kwargs):
+    engines = [SimpleNamespace(imgsz=None, frame_stride=1)]
+    options = dict(target_fps=20, imgsz=320, min_imgsz=256, max_imgsz=320, down_patience=2, up_patience=3,
+                   cooldown=0, log=lambda *_: None)
+    options.update(kwargs)
+    return AdaptiveController(engines, **options), engines[0]
+
+
+def window(fps, infer_util=0.0, render_util=0.0, drops=0, latency_ms=0.0):
+    return {"fps": fps, "infer_util": infer_util, "render_util": render_util, "drops": drops, "latency_ms": latency_ms}
+
+
+def test_degrades_imgsz_after_patience():
+    controller, engine = make_controller()
+    slow = window(10, infer_util=0.95)
+    assert controller._decide(slow, 0) is False
+    assert controller._decide(slow, 1) is True
+    assert controller.imgsz == 288 and engine.imgsz == 288
+
+
+def test_degrade_order_imgsz_then_stride():
+    controller, engine = make_controller(max_stride=2)
+    slow = window(10, infer_util=0.95)
+    for t in range(10):
+        controller._decide(slow, t)
+    assert controller.imgsz == 256
+    assert controller.stride == 2 and engine.frame_stride == 2
+
+
+def test_render_bottleneck_spaces_out_render_first():
+    controller, _ = make_controller()
+    slow = window(10, infer_util=0.5, render_util=0.95)
+    controller._decide(slow, 0)
+    controller._decide(slow, 1)
+    assert controller.render_every == 2 and controller.imgsz == 320
+
+
+def test_within_hysteresis_does_not_degrade():
+    controller, _ = make_controller()
+    # 19 fps com alvo 20 e histerese 10%: ainda dentro da faixa
+    almost = window(19, infer_util=0.95)
+    for t in range(5):
+        assert controller._decide(almost, t) is False
+    assert controller.imgsz == 320
+
+
+def test_idle_pipeline_does_not_degrade():
+    controller, _ = make_controller()
+    # Abaixo do alvo mas sem thread ocupada (fonte lenta): nada a ganhar degradando
+    for t in range(5):
+        assert controller._decide(window(10, infer_util=0.3), t) is False
+    assert controller.imgsz == 320
+
+
+def test_upgrade_needs_patience_and_headroom():
+    controller, engine = make_controller()
+    controller.stride = 2
+    controller._apply()
+    now = controller._last_change
+    relaxed = window(20, infer_util=0.3)
+    assert controller._decide(relaxed, now) is False
+    assert controller._decide(relaxed, now + 1) is False
+    assert controller._decide(relaxed, now + 2) is True
+    assert controller.stride == 1 and engine.frame_stride == 1
+
+
+def test_no_upgrade_when_predicted_cost_does_not_fit():
+    controller, _ = make_controller(imgsz=256)
+    # 256 -> 288 custa ~27% a mais: 0.6 vira ~0.76, acima do up_util (0.7)
+    for t in range(10):
+        assert controller._decide(window(20, infer_util=0.6), controller._last_change + t) is False
+    assert controller.imgsz == 256
+
+
+def test_upgrade_respects_cooldown():
+    controller, _ = make_controller(imgsz=256, cooldown=100)
+    start = controller._last_change
+    relaxed = window(20, infer_util=0.2)
+    for t in range(10):
+        assert controller._decide(relaxed, start + t) is False
+    # Paciência já cumprida: sobe assim que o cooldown passa
+    assert controller._decide(relaxed, start + 100) is True
+    assert controller.imgsz == 288
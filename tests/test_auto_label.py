@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import auto_label
+from dataset_manifest import DatasetManifest, LABELED, UNLABELED, SOURCE_AUTO
+
+
+def write_image(path, with_object=True):
+    img = np.full((240, 320, 3), 230, dtype=np.uint8)
+    if with_object:
+        cv2.rectangle(img, (100, 60), (200, 160), (20, 20, 20), -1)
+    cv2.imwrite(path, img)
+
+
+def run_auto_label(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["auto_label.py", "--mode", "otsu", "--workers", "1", *args])
+    auto_label.auto_label()
+
+
+def test_otsu_prelabel_with_relative_dataset_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("dataset")
+    write_image(os.path.join("dataset", "peca_0001.jpg"))
+    write_image(os.path.join("dataset", "fundo_0001.jpg"), with_object=False)
+
+    run_auto_label(monkeypatch, "--source", "dataset")
+
+    with open(os.path.join("dataset", "peca_0001.json")) as f:
+        data = json.load(f)
+    assert data["imagePath"] == "peca_0001.jpg"
+    assert len(data["shapes"]) == 1 and data["shapes"][0]["label"] == "peca"
+    # Sem objeto não gera JSON (não vira "fundo" sem revisão)
+    assert not os.path.exists(os.path.join("dataset", "fundo_0001.json"))
+
+    with DatasetManifest("dataset") as manifest:
+        rows = {r["name"]: r for r in manifest.conn.execute("SELECT * FROM images")}
+    assert rows["peca_0001.jpg"]["label_status"] == LABELED
+    assert rows["peca_0001.jpg"]["label_source"] == SOURCE_AUTO
+    assert rows["fundo_0001.jpg"]["label_status"] == UNLABELED
+
+
+def test_overwrite_keeps_manual_labels(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("dataset")
+    for name in ("a.jpg", "b.jpg"):
+        write_image(os.path.join("dataset", name))
+    run_auto_label(monkeypatch, "--source", "dataset")
+
+    # b.json revisado no Labelme: o sync passa a origem para manual
+    with open(os.path.join("dataset", "b.json")) as f:
+        data = json.load(f)
+    data["shapes"][0]["points"][0] = [101.0, 61.0]
+    with open(os.path.join("dataset", "b.json"), "w") as f:
+        json.dump(data, f)
+    with DatasetManifest("dataset") as manifest:
+        manifest.sync(full=True)
+        pending, already = auto_label.find_unlabeled(manifest, overwrite=True)
+    assert [os.path.basename(p) for p in pending] == ["a.jpg"]
+    assert already == 1
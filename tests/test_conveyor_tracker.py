@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+import numpy as np
+from conveyor_tracker import ConveyorTracker, greedy_match
+
+INF = np.inf
+
+
+def test_greedy_match_takes_cheapest_pairs_first():
+    cost = np.array([[0.1, 0.2],
+                     [0.05, 0.9]])
+    matches, rows, cols = greedy_match(cost)
+    # (1, 0) é o mais barato e tira a coluna 0 da linha 0
+    assert matches == [(1, 0), (0, 1)]
+    assert len(rows) == 0 and len(cols) == 0
+
+
+def test_greedy_match_respects_forbidden_pairs():
+    cost = np.array([[INF, 0.3, INF],
+                     [INF, 0.1, INF]])
+    matches, rows, cols = greedy_match(cost)
+    assert matches == [(1, 1)]
+    assert list(rows) == [0]
+    assert list(cols) == [0, 2]
+
+
+def test_greedy_match_empty():
+    matches, rows, cols = greedy_match(np.zeros((0, 3)))
+    assert matches == [] and len(rows) == 0 and list(cols) == [0, 1, 2]
+
+
+def make_tracker(**overrides):
+    args = dict(track_high_thresh=0.5, track_low_thresh=0.1, new_track_thresh=0.6, match_thresh=0.8,
+                track_buffer=30, fuse_score=False, belt_axis="y", center_gate=0.5, velocity_alpha=0.5)
+    args.update(overrides)
+    return ConveyorTracker(SimpleNamespace(**args))
+
+
+def detections(*boxes, conf=0.9, cls=0):
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+    n = len(boxes)
+    return SimpleNamespace(xyxy=boxes, conf=np.full(n, conf, dtype=np.float32), cls=np.full(n, cls, dtype=np.float32))
+
+
+def ids(rows):
+    return [int(r[4]) for r in rows]
+
+
+def test_tracker_keeps_id_along_the_belt():
+    tracker = make_tracker()
+    img = np.zeros((480, 640, 3), dtype=np.uint8)
+    out = tracker.update(detections([100, 400, 140, 440]), img)
+    assert ids(out) == [1]
+    for y in range(390, 300, -10):
+        out = tracker.update(detections([100, y, 140, y + 40]), img)
+        assert ids(out) == [1]
+    # Velocidade só no eixo da esteira (belt_axis: y)
+    velocity = tracker.tracks[0].velocity
+    assert velocity[0] == 0 and np.isclose(velocity[1], -10)
+
+
+def test_new_track_shows_up_only_when_confirmed():
+    tracker = make_tracker()
+    tracker.update(detections([100, 400, 140, 440]))
+    out = tracker.update(detections([100, 390, 140, 430], [400, 100, 440, 140]))
+    assert ids(out) == [1]
+    out = tracker.update(detections([100, 380, 140, 420], [400, 95, 440, 135]))
+    assert sorted(ids(out)) == [1, 2]
+
+
+def test_lost_track_coasts_and_is_recovered():
+    tracker = make_tracker()
+    for y in (400, 390, 380):
+        tracker.update(detections([100, y, 140, y + 40]))
+    # Dois frames sem detecção: a caixa prevista segue a 10 px/frame
+    tracker.update(detections())
+    tracker.update(detections())
+    out = tracker.update(detections([100, 350, 140, 390]))
+    assert ids(out) == [1]
+
+
+def test_lost_track_leaving_the_frame_is_dropped():
+    tracker = make_tracker()
+    img = np.zeros((100, 200, 3), dtype=np.uint8)
+    for y in (40, 20, 0):
+        tracker.update(detections([50, y, 90, y + 30]), img)
+    for _ in range(5):
+        tracker.update(detections(), img)
+    assert tracker.tracks == []
+
+
+def test_weak_detection_only_extends_recent_tracks():
+    tracker = make_tracker()
+    tracker.update(detections([100, 400, 140, 440]))
+    # Fraca (entre low e high) continua o track, mas não abre um novo
+    out = tracker.update(detections([100, 392, 140, 432], [400, 100, 440, 140], conf=0.3))
+    assert ids(out) == [1]
+    assert len(tracker.tracks) == 1
@@ -0,0 +1,105 @@
+from counting import CountingEngine, CountLine, CountZone, DEFAULT_CAMERA_CONFIG
+
+CLASS_NAMES = {0: "peca", 1: "tampa"}
+
+
+def make_engine(config=DEFAULT_CAMERA_CONFIG):
+    engine = CountingEngine.from_config(config, CLASS_NAMES)
+    engine.resolve(100, 100)
+    return engine
+
+
+def step(engine, positions, classes=None):
+    """ Um frame: {track_id: (x, y)} -> eventos """
+    ids = list(positions)
+    classes = classes or [0] * len(ids)
+    events, *_ = engine.update(ids, [positions[i] for i in ids], classes)
+    return events
+
+
+def test_counts_after_crossing_entry_then_count_line():
+    # Linhas padrão: entrada em y=65, contagem em y=15, esteira subindo
+    engine = make_engine()
+    assert step(engine, {1: (50, 80)}) == []
+    assert step(engine, {1: (50, 60)}) == []
+    assert step(engine, {1: (50, 10)}) == [(1, "peca", "contagem")]
+    assert engine.counters == {"peca": 1}
+    assert engine.element_counters["contagem"] == {"peca": 1}
+
+
+def test_counts_once_even_crossing_back_and_forth():
+    engine = make_engine()
+    for y in (80, 60, 10, 20, 10, 20, 10):
+        step(engine, {1: (50, y)})
+    assert engine.counters == {"peca": 1}
+
+
+def test_wrong_direction_is_not_counted():
+    engine = make_engine()
+    for y in (10, 60, 80):
+        step(engine, {1: (50, y)})
+    assert engine.counters == {}
+
+
+def test_count_line_requires_entry():
+    config = {"lines": [
+        {"name": "entrada", "points": [[0.0, 0.65], [1.0, 0.65]], "direction": "up", "count": False},
+        {"name": "contagem", "points": [[0.0, 0.15], [1.0, 0.15]], "direction": "up", "requires": ["entrada"]},
+    ]}
+    engine = make_engine(config)
+    # Nasce depois da entrada (sem spawn_margin não arma) e cruza a contagem
+    step(engine, {1: (50, 40)})
+    assert step(engine, {1: (50, 10)}) == []
+    assert engine.counters == {}
+
+
+def test_spawn_margin_arms_track_born_past_entry():
+    # spawn_margin 50 px: nascer em y=40 (25 px depois da entrada) ainda vale
+    engine = make_engine()
+    step(engine, {1: (50, 40)})
+    assert step(engine, {1: (50, 10)}) == [(1, "peca", "contagem")]
+
+
+def test_spawn_margin_limit():
+    config = {"lines": [
+        {"name": "entrada", "points": [[0.0, 0.65], [1.0, 0.65]], "direction": "up", "count": False,
+         "spawn_margin": 10},
+        {"name": "contagem", "points": [[0.0, 0.15], [1.0, 0.15]], "direction": "up", "requires": ["entrada"]},
+    ]}
+    engine = make_engine(config)
+    step(engine, {1: (50, 60), 2: (50, 40)})
+    step(engine, {1: (50, 10), 2: (50, 10)})
+    assert engine.counters == {"peca": 1}
+
+
+def test_jump_over_line_between_frames_is_counted():
+    engine = make_engine()
+    step(engine, {1: (50, 90)})
+    assert step(engine, {1: (50, 5)}) == [(1, "peca", "contagem")]
+
+
+def test_class_is_locked_on_first_sight():
+    engine = make_engine()
+    step(engine, {1: (50, 80)}, classes=[1])
+    step(engine, {1: (50, 60)}, classes=[0])
+    assert step(engine, {1: (50, 10)}, classes=[0]) == [(1, "tampa", "contagem")]
+
+
+def test_zone_entry_and_pass_through():
+    zone = CountZone("caixa", [[0.4, 0.4], [0.6, 0.4], [0.6, 0.6], [0.4, 0.6]])
+    engine = CountingEngine([], [zone], CLASS_NAMES)
+    engine.resolve(100, 100)
+    step(engine, {1: (10, 50), 2: (10, 50)})
+    # 1 entra; 2 atravessa a zona inteira entre dois frames
+    events = step(engine, {1: (50, 50), 2: (90, 50)})
+    assert sorted(events) == [(1, "peca", "caixa"), (2, "peca", "caixa")]
+    assert engine.zone_occupancy == {"caixa": 1}
+
+
+def test_direction_filter_on_single_line():
+    line = CountLine("l", [[0.0, 0.5], [1.0, 0.5]], direction="down")
+    engine = CountingEngine([line], [], CLASS_NAMES)
+    engine.resolve(100, 100)
+    step(engine, {1: (50, 40), 2: (50, 60)})
+    events = step(engine, {1: (50, 60), 2: (50, 40)})
+    assert events == [(1, "peca", "l")]
@@ -0,0 +1,21 @@
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_manifest import DatasetManifest, CONVERTED
+
+
+def test_mark_converted_matches_uppercase_extension(tmp_path):
+    cv2.imwrite(str(tmp_path / "peca_0001.JPG"), np.zeros((40, 60, 3), dtype=np.uint8))
+    with DatasetManifest(str(tmp_path)) as manifest:
+        manifest.sync()
+        (tmp_path / "peca_0001.json").write_text(json.dumps({"shapes": []}))
+        manifest.mark_labeled("peca_0001.JPG", "manual")
+        (tmp_path / "peca_0001.txt").write_text("0 0.1 0.1 0.2 0.1 0.2 0.2\n")
+        manifest.mark_converted(["peca_0001.json"])
+        row = manifest.conn.execute("SELECT label_status, stratum FROM images").fetchone()
+    assert tuple(row) == (CONVERTED, "0:1")
@@ -0,0 +1,237 @@
+import json
+import os
+import threading
+import numpy as np
+
+# Colunas da tabela: nome -> (dtype, formato extra por linha)
+COLUMNS = {
+    "ids": (np.int64, ()),
+    "prev": (np.float32, (2,)),
+    "cls": (np.int64, ()),
+    "crossed": (np.int64, ()),
+    "counted": (np.int64, ()),
+    "frames": (np.int64, ()),
+    "first_seen": (np.int64, ()),
+    "last_seen": (np.int64, ()),
+}
+
+
+class TrackStore:
+    """
+    Tabela compacta de estado por track (colunas numpy, linhas densas 0..size-1).
+    Substitui os dicts `object_states`/`locked_classes` que cresciam para sempre:
+    tracks não vistos há mais de `ttl` frames são removidos e a tabela é compactada.
+
+    Os slots devolvidos por `lookup` só valem até a próxima `evict`.
+    """
+
+    def __init__(self, ttl=120, capacity=256, evict_every=30):
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.frame_no = 0
+        self.evicted_total = 0
+        self.peak_size = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self.size = 0
+        for name, (dtype, shape) in COLUMNS.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_slots = np.empty(0, dtype=np.int64)
+
+    def clear(self):
+        self._alloc(len(self.ids))
+
+    @property
+    def capacity(self):
+        return len(self.ids)
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        new_cap = max(needed, capacity * 2)
+        for name in COLUMNS:
+            old = getattr(self, name)
+            arr = np.zeros((new_cap,) + old.shape[1:], dtype=old.dtype)
+            arr[:capacity] = old
+            setattr(self, name, arr)
+
+    def _reindex(self):
+        order = np.argsort(self.ids[:self.size], kind="stable")
+        self._sorted_ids = self.ids[:self.size][order]
+        self._sorted_slots = order.astype(np.int64)
+
+    def lookup(self, ids):
+        """ Slots dos IDs do frame (cria os que faltam). Retorna (slots, is_new). """
+        ids = np.asarray(ids, dtype=np.int64)
+        n_known = len(self._sorted_ids)
+        if n_known:
+            pos = np.searchsorted(self._sorted_ids, ids)
+            pos_c = np.minimum(pos, n_known - 1)
+            found = self._sorted_ids[pos_c] == ids
+            slots = np.where(found, self._sorted_slots[pos_c], -1)
+        else:
+            found = np.zeros(len(ids), dtype=bool)
+            slots = np.full(len(ids), -1, dtype=np.int64)
+
+        is_new = ~found
+        n_new = int(is_new.sum())
+        if n_new:
+            new_slots = np.arange(self.size, self.size + n_new, dtype=np.int64)
+            self._grow(self.size + n_new)
+            self.size += n_new
+            self.peak_size = max(self.peak_size, self.size)
+            slots[is_new] = new_slots
+            for name, (dtype, shape) in COLUMNS.items():
+                getattr(self, name)[new_slots] = 0
+            self.ids[new_slots] = ids[is_new]
+            self.first_seen[new_slots] = self.frame_no
+            all_ids = np.concatenate([self._sorted_ids, ids[is_new]])
+            all_slots = np.concatenate([self._sorted_slots, new_slots])
+            order = np.argsort(all_ids, kind="stable")
+            self._sorted_ids = all_ids[order]
+            self._sorted_slots = all_slots[order]
+        return slots, is_new
+
+    def touch(self, slots):
+        self.last_seen[slots] = self.frame_no
+        self.frames[slots] += 1
+
+    def tick(self):
+        """ Fim de frame: avança o relógio e, a cada `evict_every` frames, remove tracks expirados """
+        self.frame_no += 1
+        if self.evict_every and self.frame_no % self.evict_every == 0:
+            return self.evict()
+        return 0
+
+    def evict(self):
+        """ Remove tracks com last_seen mais velho que `ttl` frames e compacta as linhas """
+        if self.size == 0:
+            return 0
+        keep = self.last_seen[:self.size] >= (self.frame_no - self.ttl)
+        n_keep = int(keep.sum())
+        removed = self.size - n_keep
+        if removed == 0:
+            return 0
+        for name in COLUMNS:
+            col = getattr(self, name)
+            col[:n_keep] = col[:self.size][keep]
+        self.size = n_keep
+        self.evicted_total += removed
+        # Devolve memória se a tabela ficou muito vazia depois de um pico
+        if self.capacity > 1024 and self.size < self.capacity // 4:
+            new_cap = max(256, self.size * 2)
+            for name in COLUMNS:
+                setattr(self, name, getattr(self, name)[:new_cap].copy())
+        self._reindex()
+        return removed
+
+    def metrics(self):
+        nbytes = sum(getattr(self, name).nbytes for name in COLUMNS)
+        return {
+            "live": self.size,
+            "capacity": self.capacity,
+            "peak": self.peak_size,
+            "evicted": self.evicted_total,
+            "ttl": self.ttl,
+            "bytes": nbytes,
+        }
+
+    def snapshot(self, extra=None):
+        """ Cópia da tabela + meta já serializado: pode ser gravada em outra thread enquanto os frames seguem """
+        arrays = {name: getattr(self, name)[:self.size].copy() for name in COLUMNS}
+        meta = {"frame_no": self.frame_no, "evicted_total": self.evicted_total, "extra": extra or {}}
+        arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+        return arrays
+
+    def checkpoint(self, path, extra=None):
+        """ Grava a tabela e `extra` (dict JSON) na hora """
+        write_checkpoint(path, self.snapshot(extra))
+
+    def restore(self, path, tracks=True):
+        """ Carrega um checkpoint. Retorna o `extra` gravado, ou None se não existe. """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if tracks:
+                size = len(data["ids"])
+                self._alloc(max(256, size))
+                for name in COLUMNS:
+                    getattr(self, name)[:size] = data[name]
+                self.size = size
+                self.frame_no = meta["frame_no"]
+                self.evicted_total = meta["evicted_total"]
+                self._reindex()
+        return meta["extra"]
+
+
+def write_checkpoint(path, snapshot):
+    """ Grava um `snapshot` de forma atômica: arquivo temporário + os.replace """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **snapshot)
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """
+    Grava checkpoints numa thread, fora do laço de inferência (np.savez + fsync do disco
+    podem levar dezenas de ms). Só o snapshot mais recente espera: um novo substitui o
+    que ainda não foi gravado. `close` grava o pendente e encerra a thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.errors = 0
+        self.last_error = None
+        self._pending = None
+        self._busy = False
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, snapshot):
+        with self._cond:
+            self._pending = snapshot
+            self._closing = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closing:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            try:
+                write_checkpoint(self.path, snapshot)
+                self.written += 1
+            except OSError as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"Erro gravando o checkpoint {self.path}: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def close(self, timeout=10):
+        """ Espera o snapshot pendente ir para o disco e encerra a thread """
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,57 @@
+import torch
+import yaml
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.trackers.byte_tracker import BYTETracker
+from conveyor_tracker import ConveyorTracker
+
+TRACKER_MAP = {"bytetrack": BYTETracker, "botsort": BOTSORT, "conveyor": ConveyorTracker}
+
+
+def load_tracker_cfg(tracker_yaml):
+    """ Lê o YAML do rastreador (arquivo local ou um dos YAMLs embutidos do ultralytics) """
+    with open(check_yaml(tracker_yaml), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+class StreamTracker:
+    """
+    Um rastreador por fluxo de vídeo, alimentado com o resultado de `model.predict`.
+    Faz o mesmo que `model.track(persist=True)`, mas sem amarrar o rastreador ao
+    predictor: assim vários fluxos podem dividir uma única chamada em lote do modelo
+    e cada um mantém os próprios IDs.
+    """
+
+    def __init__(self, tracker_yaml, frame_rate=30, device="cpu", overrides=None):
+        cfg = {**load_tracker_cfg(tracker_yaml), **(overrides or {})}
+        tracker_type = cfg.get("tracker_type")
+        if tracker_type not in TRACKER_MAP:
+            raise ValueError(f"Rastreador não suportado: '{tracker_type}' (opções: {sorted(TRACKER_MAP)})")
+        args = IterableSimpleNamespace(**cfg)
+        args.device = device
+        try:
+            self.tracker = TRACKER_MAP[tracker_type](args=args, frame_rate=frame_rate)
+        except TypeError:
+            # Versões novas do ultralytics não recebem frame_rate
+            self.tracker = TRACKER_MAP[tracker_type](args=args)
+        self.tracker_type = tracker_type
+
+    def update(self, result):
+        """ Associa as detecções do frame aos tracks. Devolve o Results com boxes.id preenchido. """
+        det = result.boxes.cpu().numpy()
+        tracks = self.tracker.update(det, result.orig_img)
+        if len(tracks) == 0:
+            # Sem track confirmado: boxes.id fica None e a contagem ignora o frame
+            return result[:0]
+        idx = tracks[:, -1].astype(int)
+        lazy = getattr(result, "lazy_masks", None)
+        result = result[idx]
+        if lazy is not None:
+            # Indexar o Results não leva atributos extras
+            result.lazy_masks = lazy.select(idx)
+        result.update(boxes=torch.as_tensor(tracks[:, :-1], device=result.boxes.data.device))
+        return result
+
+    def reset(self):
+        self.tracker.reset()
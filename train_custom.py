@@ -1,8 +1,54 @@
+import os
+import time
+import yaml
 from ultralytics import YOLO
 
+DATA_YAML = "dataset/data.yaml"            # val = validação rápida (por época)
+DATA_FULL_YAML = "dataset/data_full.yaml"  # val = split de validação inteiro (final)
+
+
+def count_list(data_yaml, key):
+    """ Imagens na lista `key` (train/val) de um data.yaml gerado pelo train_wrapper """
+    with open(data_yaml, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    path = os.path.join(data["path"], str(data[key]))
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def add_val_timing(model):
+    """
+    Mede a validação de cada época e mostra quanto ela custaria no esquema antigo
+    (val = pasta inteira = treino + validação completa).
+    """
+    n_quick = count_list(DATA_YAML, "val")
+    n_train = count_list(DATA_YAML, "train")
+    n_full = count_list(DATA_FULL_YAML, "val") if os.path.exists(DATA_FULL_YAML) else None
+    if not n_quick or n_train is None:
+        return
+    n_old = n_train + (n_full or n_quick)
+    state = {"t0": 0.0, "saved": 0.0}
+
+    def on_val_start(validator):
+        state["t0"] = time.perf_counter()
+
+    def on_val_end(validator):
+        elapsed = time.perf_counter() - state["t0"]
+        old = elapsed / n_quick * n_old
+        state["saved"] += old - elapsed
+        print(f"[VAL] rápida: {n_quick} imagens em {elapsed:.1f}s | antes (val = dataset inteiro, {n_old} imagens): "
+              f"~{old:.1f}s | economia ~{old - elapsed:.1f}s nesta época, ~{state['saved']:.0f}s no total")
+
+    model.add_callback("on_val_start", on_val_start)
+    model.add_callback("on_val_end", on_val_end)
+
+
 def train():
     # Carrega o modelo de SEGMENTAÇÃO (Nano Seg)
     model = YOLO("yolov8n-seg.pt") 
+    add_val_timing(model)
 
     # Inicia o treinamento
     # data: Caminho para o arquivo data.yaml configurado
@@ -10,7 +56,7 @@ def train():
     # imgsz: Tamanho 640 é padrão para YOLOv8
     print("Iniciando treinamento de SEGMENTAÇÃO...")
     results = model.train(
-        data="dataset/data.yaml",
+        data=DATA_YAML,
         epochs=50,
         imgsz=640,
         plots=True,
@@ -21,17 +67,25 @@ def train():
     print("Treinamento finalizado!")
     print(f"O modelo final foi salvo em: {results.save_dir}")
     
+    best_pt_path = os.path.join(results.save_dir, "weights", "best.pt")
+
+    # Validação completa só uma vez, no melhor modelo (as épocas usaram a validação rápida)
+    if os.path.exists(best_pt_path) and os.path.exists(DATA_FULL_YAML):
+        print("Validação completa do melhor modelo...")
+        metrics = YOLO(best_pt_path).val(data=DATA_FULL_YAML, batch=4, workers=2, device=0, plots=False)
+        print(f"Validação completa: mAP50-95(M) {metrics.seg.map:.3f} | mAP50(M) {metrics.seg.map50:.3f}")
+
     # --- AUTO EXPORT & DEPLOY ---
     import shutil
-    import os
-    
-    best_pt_path = os.path.join(results.save_dir, "weights", "best.pt")
+
     target_pt = "best_seg.pt"
     target_onnx = "best_seg.onnx"
     
     if os.path.exists(best_pt_path):
         print(f"Atualizando modelo em produção: {target_pt}")
-        shutil.copy(best_pt_path, target_pt)
+        # Cópia temporária + os.replace: quem vigia o arquivo (vision_worker.py) nunca lê um .pt pela metade
+        shutil.copy(best_pt_path, target_pt + ".tmp")
+        os.replace(target_pt + ".tmp", target_pt)
         
         # Expert to ONNX for CPU compatibility
         print("Exportando versão Universal (ONNX)...")
@@ -1,36 +1,68 @@
 import os
 import sys
+import time
+import argparse
 import subprocess
 from json2yolo import convert_labelme_json_to_yolo
+from dataset_manifest import DatasetManifest, QUICK_VAL_SIZE
 
 def main():
+    parser = argparse.ArgumentParser(description="Prepara o dataset e inicia o treinamento")
+    parser.add_argument("--no-sync", action="store_true",
+                        help="Confia no manifesto (sem listar a pasta); só quando nada foi rotulado/copiado fora das ferramentas")
+    parser.add_argument("--quick-val", type=int, default=QUICK_VAL_SIZE,
+                        help="Máximo de imagens da validação rápida usada a cada época (a validação completa roda no final)")
+    parser.add_argument("--include-auto", action="store_true",
+                        help="Treina também com as pré-rotulagens do auto_label ainda não revisadas no Labelme")
+    args = parser.parse_args()
+
     print("=== Iniciando Preparacao para Treinamento ===")
+    t0 = time.perf_counter()
     
     # 1. Convert JSON to YOLO
     dataset_dir = os.path.join(os.getcwd(), "dataset")
-    print(f"Convertendo arquivos Labelme JSON em {dataset_dir} para formato YOLO...")
     try:
-        convert_labelme_json_to_yolo(dataset_dir, dataset_dir)
-        print("Conversao concluida com sucesso.")
-        
-        # 1.5 Generate data.yaml
-        yaml_path = os.path.join(dataset_dir, "data.yaml")
-        print(f"Gerando {yaml_path}...")
+        with DatasetManifest(dataset_dir) as manifest:
+            # Reconcilia com a pasta por padrão, de propósito: o Labelme grava JSON sem passar pelo
+            # manifesto, então confiar só nele deixaria de fora os rótulos feitos à mão. O sync é
+            # incremental (só o que mudou desde a última varredura); --no-sync pula até isso
+            if not args.no_sync:
+                print(f"Manifesto: {manifest.sync()}")
+
+            print(f"Convertendo arquivos Labelme JSON em {dataset_dir} para formato YOLO...")
+            convert_labelme_json_to_yolo(dataset_dir, dataset_dir, manifest=manifest,
+                                         include_auto=args.include_auto)
+            print("Conversao concluida com sucesso.")
+
+            # Split estratificado e estável (hash do conteúdo) + listas a partir do manifesto
+            strata = manifest.assign_splits(include_auto=args.include_auto)
+            lists = manifest.write_split_lists(quick_val_size=args.quick_val, include_auto=args.include_auto)
+        for stratum, (n_tr, n_va) in sorted(strata.items()):
+            print(f"  estrato {stratum:<10} treino {n_tr:>6} | validação {n_va:>5}")
+        (train_list, n_train), (val_list, n_val), (quick_list, n_quick) = lists["train"], lists["val"], lists["quick_val"]
+        if n_val == 0:
+            print("AVISO: nenhuma imagem no split de validação; validando no próprio treino.")
+            val_list = quick_list = train_list
+        print(f"Treino: {n_train} imagens | Validação: {n_val} imagens ({n_quick} na validação rápida) | "
+              f"preparo em {time.perf_counter() - t0:.2f}s")
         
+        # 1.5 Generate data.yaml (validação rápida por época) e data_full.yaml (validação final)
         # Absolute path to dataset to avoid confusion
         abs_dataset_dir = os.path.abspath(dataset_dir)
         
-        # Simple YAML content for flat directory structure (images and labels in same folder)
-        # Note: 'train' and 'val' point to the same folder for this simple usage
-        yaml_content = f"""
+        # Flat directory (images and labels in same folder); train/val are the manifest lists
+        for yaml_name, val_name in (("data.yaml", quick_list), ("data_full.yaml", val_list)):
+            yaml_path = os.path.join(dataset_dir, yaml_name)
+            print(f"Gerando {yaml_path}...")
+            yaml_content = f"""
 path: {abs_dataset_dir}
-train: .
-val: .
+train: {os.path.basename(train_list)}
+val: {os.path.basename(val_name)}
 names:
   0: peca
 """
-        with open(yaml_path, "w") as f:
-            f.write(yaml_content.strip())
+            with open(yaml_path, "w") as f:
+                f.write(yaml_content.strip())
             
     except Exception as e:
         print(f"ERRO CRITICO na preparacao: {e}")
@@ -0,0 +1,324 @@
+import os
+import time
+import numpy as np
+import yaml
+from counting import CountingEngine, load_counting_config
+from track_store import CheckpointWriter
+from tracking import StreamTracker
+from roi import RoiCropper
+from renderer import HudRenderer
+from lazy_masks import LazyMaskPredictor, mask_areas
+
+
+def resolve_tracker_yaml(yaml_path="custom_tracker.yaml"):
+    if not os.path.exists(yaml_path):
+        yaml_path = "botsort.yaml"
+    return yaml_path
+
+
+def read_track_buffer(yaml_path, default=30):
+    """ track_buffer do YAML do rastreador (frames que um track perdido ainda é lembrado) """
+    if not os.path.exists(yaml_path):
+        return default
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    return int(cfg.get("track_buffer", default))
+
+
+class VisionEngine:
+    """
+    Estágios de inferência/rastreamento, contagem e renderização do main.py.
+    `process` roda na thread de inferência e `render` na thread de exibição;
+    o pacote trocado entre as duas carrega uma cópia do placar, então o render
+    nunca lê estado que a inferência está alterando.
+    """
+
+    def __init__(self, model, conf, imgsz=None, tracker_yaml=None, counting_config=None,
+                 checkpoint_path=None, checkpoint_interval=10, frame_rate=30, device="cpu", roi=None, gate=None,
+                 masks="lazy"):
+        self.model = model
+        self.conf = conf
+        self.imgsz = imgsz
+        # "lazy": modelo -seg sem decodificar máscaras a cada frame (só a área de quem é contado)
+        self.mask_mode = masks
+        self.tracker_yaml = tracker_yaml or resolve_tracker_yaml()
+        self.class_names = model.names
+
+        # Recorte da região útil antes da inferência (padrão: frame inteiro)
+        self.roi = roi or RoiCropper("off")
+
+        # Portão de movimento (MotionGate): esteira parada pula o modelo; None = infere sempre
+        self.gate = gate
+        self._coast_dets = []
+        self._coast_vel = np.zeros((0, 2), dtype=np.float32)
+        self._coasted = 0
+        self._last_centroids = {}
+        # Passo de frames (controle adaptativo): 1 a cada N frames vai ao modelo, os outros seguem em coast
+        self.frame_stride = 1
+
+        # Rastreador próprio deste fluxo (vários fluxos dividem o mesmo modelo)
+        self.tracker = StreamTracker(self.tracker_yaml, frame_rate=frame_rate, device=device)
+
+        # --- CONFIGURAÇÕES: linhas/zonas vindas do counting.yaml ---
+        # Estado de um track expira junto com o track_buffer do rastreador
+        self.counting = CountingEngine.from_config(counting_config or load_counting_config(), self.class_names,
+                                                   ttl=read_track_buffer(self.tracker_yaml))
+
+        # HUD com a camada estática (linhas, legendas, ROI) composta uma vez por resolução
+        self.renderer = HudRenderer(self.counting, self.roi)
+
+        # Checkpoint periódico do placar para sobreviver a um reinício do processo
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_writer = CheckpointWriter(checkpoint_path) if checkpoint_path else None
+        self._last_checkpoint = time.time()
+        if checkpoint_path and self.counting.restore(checkpoint_path):
+            print(f"♻️ Placar restaurado de {checkpoint_path}: {self.counting.counters}")
+
+        self.start_time = time.time()
+        self._reset_requested = False
+        self._prev_process_time = 0
+        self.infer_fps = 0
+        # Latência (ms) de cada estágio no último frame: infer, track, count (mask só em frame com contagem)
+        self.stage_ms = {}
+        # Contagens deste frame: [{"track_id", "class", "element", "confidence", "area_px"}]
+        self._events = []
+        # False: não imprime cada contagem (processamento em lote)
+        self.verbose = True
+
+    @property
+    def counters(self):
+        return self.counting.counters
+
+    def request_reset(self):
+        """ Pedido de reset vindo da thread de exibição; aplicado no próximo frame da inferência """
+        self._reset_requested = True
+
+    def reset(self):
+        self.counting.reset(); self.start_time = time.time()
+        print(">> RESETADO TUDO")
+
+    def checkpoint(self, background=False):
+        """ Snapshot do placar aqui; o disco fica com o CheckpointWriter. Sem `background` espera a gravação (saída). """
+        if self._checkpoint_writer is None:
+            return
+        self._checkpoint_writer.submit(self.counting.snapshot())
+        self._last_checkpoint = time.time()
+        if not background:
+            self._checkpoint_writer.close()
+
+    def swap_model(self, model):
+        """ Troca o modelo entre dois frames; rastreador e placar continuam (chamar na thread de inferência) """
+        self.model = model
+        self.class_names = model.names
+        self.counting.class_names = model.names
+
+    def prepare(self, frame):
+        """ Resolve linhas/zonas e ROI para a resolução do frame (só recalcula se ela mudar) """
+        self.counting.resolve(frame.shape[1], frame.shape[0])
+        self.roi.resolve(frame.shape, self.counting)
+
+    def gate_open(self, frame):
+        """ Portão de movimento dentro do ROI: False = frame sem atividade, pode pular a inferência """
+        if self.gate is None:
+            return True
+        t0 = time.perf_counter()
+        self.prepare(frame)
+        is_open = self.gate.check(frame, self.roi.rect)
+        self.stage_ms["gate"] = (time.perf_counter() - t0) * 1000
+        return is_open
+
+    def should_infer(self, frame):
+        """ Passo de frames e portão de movimento: False = frame só em coast, sem modelo """
+        if self.frame_stride > 1 and self._coasted + 1 < self.frame_stride:
+            return False
+        return self.gate_open(frame)
+
+    def predict(self, frames, engines=None):
+        """
+        Inferência em lote: uma chamada do modelo para a lista de frames.
+        `engines` diz a qual fluxo pertence cada frame (multi-câmera); cada fluxo aplica
+        o próprio ROI e recebe as detecções de volta em coordenadas do frame inteiro.
+        """
+        engines = engines or [self] * len(frames)
+        inputs = []
+        for engine, frame in zip(engines, frames):
+            engine.prepare(frame)
+            inputs.append(engine.roi.crop(frame))
+
+        # Com ROI, o imgsz acompanha o tamanho do recorte (o maior do lote)
+        imgsz = max((engine.roi.imgsz(self.imgsz) for engine in engines), key=lambda v: v or 0)
+        kwargs = predictor_kwargs(self.model, self.mask_mode)
+        if imgsz:
+            # Em CPU, reduzimos a resolução de inferência para manter o FPS
+            # 320px é suficiente para contagem e muito mais rápido
+            results = self.model.predict(inputs, conf=self.conf, verbose=False, imgsz=imgsz, **kwargs)
+        else:
+            # Em GPU, usamos 640 ou tamanho nativo (padrão)
+            results = self.model.predict(inputs, conf=self.conf, verbose=False, **kwargs)
+        return [engine.roi.restore(r, frame) for engine, r, frame in zip(engines, results, frames)]
+
+    def infer(self, frame):
+        """ Inferência + rastreamento de um frame (equivale ao antigo model.track persist=True) """
+        return self.tracker.update(self.predict([frame])[0])
+
+    def process(self, item):
+        """ Estágio de inferência + contagem. Recebe (idx, timestamp, frame) e devolve o pacote para o render. """
+        if not self.should_infer(item[2]):
+            return self.coast(item)
+        t0 = time.perf_counter()
+        result = self.predict([item[2]])[0]
+        self.stage_ms["infer"] = (time.perf_counter() - t0) * 1000
+        return self.finish(item, result)
+
+    def coast(self, item):
+        """
+        Frame barrado pelo portão (ou pulado pelo passo de frames): sem modelo, rastreador e contagem parados.
+        As caixas do último frame inferido seguem pela velocidade de cada track só no desenho.
+        A contagem não perde cruzamentos: quando a inferência volta, o segmento entre a
+        última posição vista e a nova é testado contra as linhas normalmente.
+        """
+        idx, timestamp, frame = item
+        if self._reset_requested:
+            self._reset_requested = False
+            self.reset()
+        self._coasted += 1
+        self.stage_ms["infer"] = self.stage_ms["track"] = self.stage_ms["count"] = self.stage_ms["mask"] = 0.0
+        self._events = []
+
+        shift = np.rint(self._coast_vel * self._coasted).astype(int)
+        detections = []
+        for (x1, y1, x2, y2, cx, cy, track_id, class_name, status), (dx, dy) in zip(self._coast_dets, shift):
+            detections.append((x1 + dx, y1 + dy, x2 + dx, y2 + dy, cx + dx, cy + dy, track_id, class_name, status))
+        return self._packet(idx, timestamp, frame, detections)
+
+    def finish(self, item, result):
+        """ Rastreamento + contagem sobre o resultado bruto do modelo para este fluxo """
+        idx, timestamp, frame = item
+        if self._reset_requested:
+            self._reset_requested = False
+            self.reset()
+
+        now = time.time()
+        self.infer_fps = 1 / (now - self._prev_process_time) if self._prev_process_time > 0 else 0
+        self._prev_process_time = now
+
+        height, width, _ = frame.shape
+        self.counting.resolve(width, height)
+        # Só os frames com contagem decodificam máscara; nos outros o tempo é zero, não o último
+        self.stage_ms["mask"] = 0.0
+
+        t0 = time.perf_counter()
+        result = self.tracker.update(result)
+        t1 = time.perf_counter()
+        detections = self.count(result)
+        self.stage_ms["track"] = (t1 - t0) * 1000
+        self.stage_ms["count"] = (time.perf_counter() - t1) * 1000
+
+        if self.checkpoint_path and self.checkpoint_interval and now - self._last_checkpoint > self.checkpoint_interval:
+            self.checkpoint(background=True)
+
+        return self._packet(idx, timestamp, frame, detections)
+
+    def _packet(self, idx, timestamp, frame, detections):
+        return {
+            "idx": idx,
+            "timestamp": timestamp,
+            "frame": frame,
+            "detections": detections,
+            "counters": dict(self.counters),
+            "start_time": self.start_time,
+            "infer_fps": self.infer_fps,
+            "tracks": self.counting.tracks.metrics(),
+            "stage_ms": dict(self.stage_ms),
+            "gate": self.gate.metrics() if self.gate is not None else None,
+            "events": self._events,
+        }
+
+    def count(self, result):
+        """ Atualiza estados e placar. Retorna a lista de detecções para desenhar. """
+        # Frames entre esta inferência e a anterior (> 1 se o portão pulou frames)
+        gap = self._coasted + 1
+        self._coasted = 0
+        self._events = []
+        if result is None or result.boxes.id is None:
+            self.counting.update([], [], [])
+            self._coast_dets, self._coast_vel, self._last_centroids = [], np.zeros((0, 2), dtype=np.float32), {}
+            return []
+
+        boxes = result.boxes.xyxy.cpu().numpy()
+        track_ids = result.boxes.id.cpu().numpy().astype(int)
+        class_ids = result.boxes.cls.cpu().numpy().astype(int)
+        centroids = (boxes[:, :2] + boxes[:, 2:4]) / 2
+
+        # --- Lógica de CLASSE FIXA ("Congelar IA") fica dentro do CountingEngine ---
+        events, final_cls, counted, is_new = self.counting.update(track_ids, centroids, class_ids)
+        if events:
+            # Máscara só de quem foi contado agora (no modo lazy é a única decodificação)
+            t0 = time.perf_counter()
+            row = {int(t): i for i, t in enumerate(track_ids)}
+            areas = mask_areas(result, [row[int(track_id)] for track_id, _, _ in events])
+            self.stage_ms["mask"] = (time.perf_counter() - t0) * 1000
+            confs = result.boxes.conf.cpu().numpy()
+            for k, (track_id, class_name, element) in enumerate(events):
+                area = int(areas[k]) if areas is not None else None
+                self._events.append({"track_id": int(track_id), "class": class_name, "element": element,
+                                     "confidence": float(confs[row[int(track_id)]]), "area_px": area})
+                if self.verbose:
+                    print(f"[ID {track_id}] CONTADO: {class_name} ({element})" + (f" área {area} px" if area is not None else ""))
+
+        detections = []
+        boxes_px = boxes.astype(int)
+        for i in range(len(track_ids)):
+            x1, y1, x2, y2 = boxes_px[i]
+            cx, cy = int(centroids[i, 0]), int(centroids[i, 1])
+            if counted[i]:
+                status = "CHECK"
+            elif not is_new[i]:
+                status = "LOCK"
+            else:
+                status = "NEW"
+            detections.append((x1, y1, x2, y2, cx, cy, int(track_ids[i]), self.class_names[int(final_cls[i])], status))
+
+        # Velocidade (px/frame) de cada track para o desenho seguir durante frames pulados
+        if self.gate is not None:
+            prev = np.array([self._last_centroids.get(int(t), c) for t, c in zip(track_ids, centroids)], dtype=np.float32).reshape(-1, 2)
+            self._coast_vel = (centroids - prev) / gap
+            self._coast_dets = detections
+            self._last_centroids = {int(t): c for t, c in zip(track_ids, centroids)}
+        return detections
+
+    def render(self, packet, fps, stats_line=None):
+        """ Estágio de renderização: HUD, linhas, caixas e placar sobre o frame do pacote """
+        return self.renderer.render(packet, fps, stats_line)
+
+
+def predictor_kwargs(model, masks="lazy"):
+    """
+    Classe do predictor para o model.predict. O ultralytics recria o predictor (e o
+    backend/sessão ONNX) quando a classe muda, então o warm-up precisa usar a mesma.
+    """
+    if masks == "lazy" and getattr(model, "task", None) == "segment":
+        return {"predictor": LazyMaskPredictor}
+    return {}
+
+
+def process_batch(engines, items):
+    """
+    Multi-câmera: um único `predict` em lote para os frames de vários fluxos,
+    depois rastreamento e contagem separados em cada engine.
+    Todos os engines compartilham o mesmo modelo e parâmetros de inferência.
+    """
+    # Fluxos barrados pelo portão de movimento (ou fora do passo de frames) ficam fora do lote
+    is_open = [engine.should_infer(item[2]) for engine, item in zip(engines, items)]
+    run = [i for i, ok in enumerate(is_open) if ok]
+    results = {}
+    if run:
+        t0 = time.perf_counter()
+        batch = engines[run[0]].predict([items[i][2] for i in run], [engines[i] for i in run])
+        infer_ms = (time.perf_counter() - t0) * 1000
+        for i, result in zip(run, batch):
+            engines[i].stage_ms["infer"] = infer_ms
+            results[i] = result
+    return [engine.finish(item, results[i]) if is_open[i] else engine.coast(item)
+            for i, (engine, item) in enumerate(zip(engines, items))]
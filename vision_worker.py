@@ -0,0 +1,329 @@
+import os
+import time
+import argparse
+import threading
+import cv2
+from pipeline import FrameQueue, FrameGrabber, StageStats, END_OF_STREAM, resolve_drop_policy, format_stats
+from shared_frames import FrameRingWriter, DEFAULT_SHM_NAME
+from event_journal import EventJournal
+from main import load_model, load_autotune, warm_up, open_capture, add_engine_args, build_engine, stream_state
+
+# Sistema de visão residente no app.py: o modelo é carregado uma vez e fica aquecido entre
+# um start/stop e outro. Publica frames e placar na mesma memória compartilhada do
+# main.py --headless, então /api/live-state, /api/live-events e /metrics funcionam igual.
+
+# Vigia do modelo: o arquivo precisa ficar parado este tempo antes da troca
+# (cópia ou export do ONNX ainda em andamento)
+WATCH_INTERVAL_S = 1.0
+SETTLE_S = 3.0
+
+
+def default_engine_args(**overrides):
+    """ Opções de add_engine_args com os padrões do main.py """
+    parser = argparse.ArgumentParser()
+    add_engine_args(parser)
+    args = parser.parse_args([])
+    for key, value in overrides.items():
+        setattr(args, key, value)
+    return args
+
+
+def model_files(model_name):
+    """ Arquivos que o load_model pode escolher para este modelo (.pt, .onnx, .engine) """
+    root = os.path.splitext(model_name)[0]
+    return [root + ext for ext in (".pt", ".onnx", ".engine")]
+
+
+def files_signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class WorkerSession:
+    """ Uma execução (fonte aberta): captura, fila, engine e publicação """
+
+    def __init__(self, source, cap, engine, policy, queue_size, shm_name, shm_slots):
+        self.source = source
+        self.cap = cap
+        self.engine = engine
+        self.stop_event = threading.Event()
+        self.grab_queue = FrameQueue(queue_size, policy)
+        self.grabber = FrameGrabber(cap, self.grab_queue, self.stop_event)
+        self.infer_stats = StageStats("inferencia", self.grab_queue)
+        self.render_stats = StageStats("render")
+        self.shm_name = shm_name
+        self.shm_slots = shm_slots
+        self.shm_writer = None
+        self.thread = None
+        self.finished = False
+        # Resolução da fonte, vista no primeiro frame (warm-up do modelo novo na troca a quente)
+        self.frame_shape = None
+        self.fps = 0.0
+
+    def snapshots(self):
+        return [self.grabber.snapshot(), self.infer_stats.snapshot(), self.render_stats.snapshot()]
+
+
+class VisionWorker:
+    """
+    Mantém o modelo carregado dentro do app.py. start/stop só abrem e fecham a fonte;
+    conf e fonte mudam sem recarregar o modelo.
+
+    Troca a quente: um vigia observa best_seg.pt/.onnx/.engine; quando o train_custom.py
+    publica uma versão nova, ela é carregada e aquecida em paralelo enquanto o modelo
+    antigo continua inferindo, e entra entre dois frames no mesmo engine (rastreador e
+    placar intactos). Se o modelo novo não carregar, o antigo segue rodando.
+    """
+
+    def __init__(self, model_name="best_seg.pt", shm_name=DEFAULT_SHM_NAME, shm_slots=3, queue_size=2,
+                 checkpoint_path=os.path.join("state", "contagem.npz"), engine_args=None,
+                 journal_path=os.path.join("state", "eventos.sqlite")):
+        self.args = engine_args or default_engine_args()
+        self.args.model = model_name
+        # imgsz pedido explicitamente; sem ele vale o do autotune (se houver) ou o padrão do main.py
+        self._base_imgsz = self.args.imgsz
+        self.model_name = model_name
+        self.shm_name = shm_name
+        self.shm_slots = shm_slots
+        self.queue_size = queue_size
+        self.checkpoint_path = checkpoint_path
+        # Diário de contagens: vive com o worker, atravessa sessões e trocas de modelo
+        self.journal = EventJournal(journal_path) if journal_path else None
+
+        self.model = None
+        self.device = None
+        self.adaptive_mode = None
+        self.model_version = 0
+        self.loaded_at = None
+        self.reloading = False
+        self.last_error = None
+        self.session = None
+
+        # _lock: start/stop/params; _load_lock: um carregamento de modelo por vez
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._signature = None
+        self._watch_stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="vigia-modelo", daemon=True)
+        self._watcher.start()
+
+    # --- Modelo ---
+
+    def load(self, model_name=None):
+        """
+        Carrega e aquece o modelo (bloqueante). A sessão em andamento continua com o
+        modelo antigo e troca para o novo no próximo frame.
+        """
+        with self._load_lock:
+            model_name = model_name or self.model_name
+            signature = files_signature(model_files(model_name))
+            self.reloading = True
+            try:
+                t0 = time.perf_counter()
+                tuned = load_autotune(model_name)
+                if tuned is not None and self._base_imgsz and self._base_imgsz != tuned["imgsz"] and tuned["backend"] != "pytorch":
+                    tuned = None
+                model, device, adaptive_mode = load_model(model_name, tuned=tuned)
+                imgsz = self._base_imgsz or (tuned["imgsz"] if tuned is not None else None)
+                # Mesmo predictor (modo de máscaras) e resolução do engine: o primeiro frame depois
+                # da troca não monta predictor/backend novo na thread de inferência
+                warm_up(model, imgsz or (320 if adaptive_mode else None), shape=self._frame_shape(),
+                        masks=self.args.masks)
+                print(f"Modelo {model_name} pronto em {time.perf_counter() - t0:.1f}s")
+            except Exception as e:
+                self.last_error = f"Falha ao carregar {model_name}: {e}"
+                print(self.last_error)
+                # Não tenta de novo até o arquivo mudar outra vez
+                if model_name == self.model_name:
+                    self._signature = signature
+                raise
+            finally:
+                self.reloading = False
+            with self._lock:
+                # imgsz antes do modelo: a thread de inferência troca os dois ao ver o modelo novo
+                self.args.imgsz = imgsz
+                self.adaptive_mode, self.device = adaptive_mode, device
+                self.model = model
+                self.model_name = self.args.model = model_name
+                self._signature = signature
+                self.model_version += 1
+                self.loaded_at = time.time()
+                self.last_error = None
+
+    def _frame_shape(self):
+        """ Resolução da fonte aberta (warm-up no tamanho real); padrão do warm_up sem sessão """
+        session = self.session
+        if session is not None and session.frame_shape is not None:
+            return session.frame_shape
+        return (480, 640, 3)
+
+    def reload_async(self):
+        """ Recarrega o modelo atual em segundo plano (mesmo caminho do vigia) """
+        thread = threading.Thread(target=self._safe_load, name="recarga-modelo", daemon=True)
+        thread.start()
+
+    def _safe_load(self, model_name=None):
+        try:
+            self.load(model_name)
+        except Exception:
+            pass
+
+    def _watch(self):
+        candidate, since = None, 0.0
+        while not self._watch_stop.wait(WATCH_INTERVAL_S):
+            if self.model is None or self._load_lock.locked():
+                continue
+            signature = files_signature(model_files(self.model_name))
+            if signature == self._signature:
+                candidate = None
+                continue
+            if signature != candidate:
+                # Mudou agora: espera o arquivo assentar
+                candidate, since = signature, time.monotonic()
+                continue
+            if time.monotonic() - since >= SETTLE_S:
+                print(f"Novo modelo detectado em {self.model_name}: recarregando sem parar a esteira...")
+                candidate = None
+                self._safe_load()
+
+    # --- Execução ---
+
+    @property
+    def running(self):
+        session = self.session
+        return session is not None and not session.finished
+
+    def start(self, source, conf=None, model_name=None):
+        # Carrega fora do _lock: o vigia pode estar terminando uma troca
+        if model_name and model_name != self.model_name:
+            self.load(model_name)
+        elif self.model is None:
+            self.load()
+        with self._lock:
+            if self.running:
+                raise RuntimeError("System already running")
+            if self.session is not None:
+                self._close_session()
+            if conf is not None:
+                self.args.conf = conf
+
+            cap = open_capture(source)
+            if cap is None:
+                raise RuntimeError(f"Could not open source {source}")
+            frame_rate = int(round(cap.get(cv2.CAP_PROP_FPS) or 30)) or 30
+            engine = build_engine(self.args, self.model, self.device, self.adaptive_mode, source,
+                                  frame_rate=frame_rate, checkpoint_path=self.checkpoint_path or None)
+            session = WorkerSession(source, cap, engine, resolve_drop_policy("auto", source), self.queue_size,
+                                    self.shm_name, self.shm_slots)
+            session.thread = threading.Thread(target=self._run, args=(session,), name="inferencia-residente", daemon=True)
+            self.session = session
+            session.grabber.start()
+            session.thread.start()
+
+    def stop(self):
+        """ Fecha a fonte e grava o placar; o modelo continua carregado """
+        with self._lock:
+            if self.session is None:
+                return False
+            was_running = self.running
+            self._close_session()
+            return was_running
+
+    def _close_session(self):
+        session, self.session = self.session, None
+        session.stop_event.set()
+        session.grabber.join(timeout=2)
+        session.thread.join(timeout=5)
+        session.engine.checkpoint()
+        session.cap.release()
+        if session.shm_writer is not None:
+            session.shm_writer.close()
+
+    def update(self, conf=None, source=None):
+        """ Muda parâmetros sem recarregar o modelo. Nova fonte = nova sessão (placar da câmera restaurado). """
+        restart = False
+        with self._lock:
+            if conf is not None:
+                self.args.conf = conf
+                if self.session is not None:
+                    # Lido a cada predict; atribuição simples, sem parar a inferência
+                    self.session.engine.conf = conf
+            if source is not None and (self.session is None or source != self.session.source):
+                if self.session is not None:
+                    self._close_session()
+                restart = True
+        if restart:
+            self.start(source)
+
+    def _run(self, session):
+        engine = session.engine
+        prev_time = 0.0
+        try:
+            while not session.stop_event.is_set():
+                # Troca a quente: entre dois frames, no próprio thread de inferência
+                model = self.model
+                if engine.model is not model:
+                    engine.swap_model(model)
+                    # Exportação estática (autotune) só aceita o próprio imgsz
+                    engine.imgsz = self.args.imgsz or (320 if self.adaptive_mode else None)
+                    print(f"Modelo trocado (versão {self.model_version}) sem reiniciar a contagem: {engine.counters}")
+
+                item = session.grab_queue.get(timeout=0.1)
+                if item is END_OF_STREAM:
+                    break
+                if item is None:
+                    continue
+
+                session.frame_shape = item[2].shape
+
+                t0 = time.perf_counter()
+                packet = engine.process(item)
+                t1 = time.perf_counter()
+                if self.journal is not None and packet["events"]:
+                    self.journal.append(session.source, packet["events"], packet["timestamp"])
+                session.infer_stats.record(t1 - t0)
+
+                now = time.time()
+                session.fps = 1 / (now - prev_time) if prev_time > 0 else 0
+                prev_time = now
+                snapshots = session.snapshots()
+                frame = engine.render(packet, session.fps, format_stats(snapshots))
+                if session.shm_writer is None:
+                    session.shm_writer = FrameRingWriter(session.shm_name, frame.shape, session.shm_slots)
+                frame_seq = session.shm_writer.write_frame(frame)
+                session.shm_writer.write_state(stream_state(session.source, frame_seq, packet, session.fps, snapshots))
+                session.render_stats.record(time.perf_counter() - t1)
+        except Exception as e:
+            self.last_error = f"Erro na inferência: {e}"
+            print(self.last_error)
+        finally:
+            session.finished = True
+
+    def status(self):
+        session = self.session
+        return {
+            "running": self.running,
+            "source": session.source if session is not None else None,
+            "conf": self.args.conf,
+            "model": self.model_name,
+            "device": self.device,
+            "model_version": self.model_version,
+            "loaded_at": self.loaded_at,
+            "reloading": self.reloading,
+            "fps": session.fps if session is not None else 0.0,
+            "counters": dict(session.engine.counters) if session is not None else {},
+            "error": self.last_error,
+            "journal": self.journal.metrics() if self.journal is not None else None,
+        }
+
+    def shutdown(self):
+        self._watch_stop.set()
+        self.stop()
+        if self.journal is not None:
+            self.journal.close()